@@ -0,0 +1,5 @@
+from django.contrib import admin
+
+from analytics.models import RollupWatermark
+
+admin.site.register(RollupWatermark)
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from analytics.rollups import refresh_rollups
+
+
+class Command(BaseCommand):
+    """
+    Django command to refresh the daily analytics rollups, incrementally
+    by default or from scratch with `--full`.
+    """
+
+    help = "Refresh the daily revenue and borrowing rollup tables"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--full",
+            action="store_true",
+            help="Rebuild every day instead of the ones changed since the last run.",
+        )
+
+    def handle(self, *args, **options) -> None:
+        stats = refresh_rollups(full=options["full"])
+        self.stdout.write(
+            ", ".join(f"{name}: {value}" for name, value in stats.items())
+        )
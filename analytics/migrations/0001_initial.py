@@ -0,0 +1,104 @@
+# Generated by Django 4.0.4 on 2026-10-18 07:09
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    initial = True
+
+    dependencies = [
+        ("book_service", "0006_inventoryreservation_and_more"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="BookBorrowingsDaily",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("day", models.DateField()),
+                ("borrowings", models.PositiveIntegerField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name="BorrowDurationDaily",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("day", models.DateField(unique=True)),
+                ("returned", models.PositiveIntegerField()),
+                ("total_days", models.PositiveIntegerField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name="RevenueDaily",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("day", models.DateField()),
+                ("type", models.CharField(max_length=20)),
+                ("status", models.CharField(max_length=20)),
+                ("payments", models.PositiveIntegerField()),
+                ("amount", models.DecimalField(decimal_places=2, max_digits=14)),
+            ],
+        ),
+        migrations.CreateModel(
+            name="RollupWatermark",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("name", models.CharField(max_length=50, unique=True)),
+                ("value", models.DateTimeField(null=True)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name="revenuedaily",
+            constraint=models.UniqueConstraint(
+                fields=("day", "type", "status"), name="revenue_daily_unique"
+            ),
+        ),
+        migrations.AddField(
+            model_name="bookborrowingsdaily",
+            name="book",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="daily_borrowings",
+                to="book_service.book",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="bookborrowingsdaily",
+            constraint=models.UniqueConstraint(
+                fields=("day", "book"), name="book_borrowings_daily_unique"
+            ),
+        ),
+    ]
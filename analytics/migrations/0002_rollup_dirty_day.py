@@ -0,0 +1,44 @@
+# Generated by Django 4.0.4 on 2026-10-18 07:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("analytics", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="RollupDirtyDay",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "rollup",
+                    models.CharField(
+                        choices=[
+                            ("revenue", "Revenue"),
+                            ("book_borrowings", "Book Borrowings"),
+                            ("durations", "Durations"),
+                        ],
+                        max_length=20,
+                    ),
+                ),
+                ("day", models.DateField()),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name="rollupdirtyday",
+            constraint=models.UniqueConstraint(
+                fields=("rollup", "day"), name="rollup_dirty_day_unique"
+            ),
+        ),
+    ]
@@ -0,0 +1,89 @@
+from django.db import models
+
+from book_service.models import Book
+
+
+class RevenueDaily(models.Model):
+    """Payments created on a day, per type and current status."""
+
+    day = models.DateField()
+    type = models.CharField(max_length=20)
+    status = models.CharField(max_length=20)
+    payments = models.PositiveIntegerField()
+    amount = models.DecimalField(max_digits=14, decimal_places=2)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["day", "type", "status"], name="revenue_daily_unique"
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.day} {self.type}/{self.status}: {self.amount}"
+
+
+class BookBorrowingsDaily(models.Model):
+    """Borrowings of a book started on a day."""
+
+    day = models.DateField()
+    book = models.ForeignKey(
+        Book, on_delete=models.CASCADE, related_name="daily_borrowings"
+    )
+    borrowings = models.PositiveIntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["day", "book"], name="book_borrowings_daily_unique"
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.day} {self.book_id}: {self.borrowings}"
+
+
+class BorrowDurationDaily(models.Model):
+    """Borrowings returned on a day and the days they were out in total."""
+
+    day = models.DateField(unique=True)
+    returned = models.PositiveIntegerField()
+    total_days = models.PositiveIntegerField()
+
+    def __str__(self):
+        return f"{self.day}: {self.returned} returned"
+
+
+class RollupDirtyDay(models.Model):
+    """
+    A rollup day to rebuild on the next run although no row changed on it,
+    because a row moved from it to another day or was deleted.
+    """
+
+    class RollupChoices(models.TextChoices):
+        REVENUE = "revenue"
+        BOOK_BORROWINGS = "book_borrowings"
+        DURATIONS = "durations"
+
+    rollup = models.CharField(max_length=20, choices=RollupChoices.choices)
+    day = models.DateField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["rollup", "day"], name="rollup_dirty_day_unique"
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.rollup} {self.day}"
+
+
+class RollupWatermark(models.Model):
+    """How far the rollups have followed `updated_at` of the source tables."""
+
+    name = models.CharField(max_length=50, unique=True)
+    value = models.DateTimeField(null=True)
+
+    def __str__(self):
+        return f"{self.name}: {self.value}"
@@ -0,0 +1,224 @@
+import datetime
+import logging
+import time
+from itertools import islice
+
+from django.db import transaction
+from django.db.models import Count, DurationField, ExpressionWrapper, F, Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from analytics.models import (
+    BookBorrowingsDaily,
+    BorrowDurationDaily,
+    RevenueDaily,
+    RollupDirtyDay,
+    RollupWatermark,
+)
+from borrowing_service.models import Borrowing
+from payment_service.models import Payment
+
+logger = logging.getLogger(__name__)
+
+WATERMARK = "daily-rollups"
+DAY_BATCH_SIZE = 31
+INSERT_BATCH_SIZE = 1000
+# Rows committed shortly after the previous run can carry an `updated_at`
+# older than its watermark; rebuilding a day twice is harmless.
+OVERLAP = datetime.timedelta(minutes=5)
+
+
+def refresh_rollups(now=None, full=False):
+    """
+    Bring the daily rollup tables up to date with payments and borrowings.
+
+    Rows changed since the watermark (through the indexed `updated_at`
+    columns) decide which days are stale, together with the days rows were
+    moved away from or deleted on (`RollupDirtyDay`, marked by signals);
+    only those days are recomputed from the source tables, so a run costs
+    the size of the change, not of the history. The first run, or
+    `full=True`, rebuilds everything.
+
+    Runs in one transaction holding the watermark row lock, so concurrent
+    runs queue up instead of interleaving.
+
+    Returns:
+    - dict: Rollup rows written per table and the run duration.
+    """
+    started = time.perf_counter()
+    now = now or timezone.now()
+    with transaction.atomic():
+        watermark, _ = RollupWatermark.objects.select_for_update().get_or_create(
+            name=WATERMARK
+        )
+        since = None if full or watermark.value is None else watermark.value - OVERLAP
+        dirty = list(RollupDirtyDay.objects.values_list("id", "rollup", "day"))
+
+        if since is None:
+            stats = {
+                "revenue": rebuild_revenue(),
+                "book_borrowings": rebuild_book_borrowings(),
+                "durations": rebuild_durations(),
+            }
+        else:
+            payments = Payment.objects.filter(updated_at__gte=since)
+            borrowings = Borrowing.objects.filter(updated_at__gte=since)
+            moved = {rollup: set() for rollup in RollupDirtyDay.RollupChoices}
+            for _, rollup, day in dirty:
+                moved[rollup].add(day)
+            stats = {
+                "revenue": rebuild_revenue(
+                    _distinct_days(payments.annotate(day=TruncDate("created_at")))
+                    | moved[RollupDirtyDay.RollupChoices.REVENUE]
+                ),
+                "book_borrowings": rebuild_book_borrowings(
+                    _distinct_days(borrowings.annotate(day=F("borrow_date")))
+                    | moved[RollupDirtyDay.RollupChoices.BOOK_BORROWINGS]
+                ),
+                "durations": rebuild_durations(
+                    _distinct_days(
+                        borrowings.filter(actual_return__isnull=False).annotate(
+                            day=F("actual_return")
+                        )
+                    )
+                    | moved[RollupDirtyDay.RollupChoices.DURATIONS]
+                ),
+            }
+
+        if dirty:
+            RollupDirtyDay.objects.filter(
+                pk__in=[dirty_id for dirty_id, _, _ in dirty]
+            ).delete()
+        watermark.value = now
+        watermark.save(update_fields=["value"])
+
+    stats["full"] = since is None
+    stats["duration_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    logger.info("Analytics rollups refreshed: %s", stats)
+    return stats
+
+
+def payment_day(created_at):
+    """The revenue rollup day of a payment, as `TruncDate` computes it."""
+    return timezone.localdate(created_at)
+
+
+def mark_days_dirty(days):
+    """
+    Have the next run rebuild these rollup days.
+
+    Args:
+    - days (iterable): (RollupDirtyDay.RollupChoices, date) pairs.
+    """
+    RollupDirtyDay.objects.bulk_create(
+        (RollupDirtyDay(rollup=rollup, day=day) for rollup, day in days if day),
+        ignore_conflicts=True,
+    )
+
+
+def _distinct_days(queryset):
+    return set(queryset.order_by().values_list("day", flat=True).distinct())
+
+
+def _batched(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def _rebuild(rollup, days, aggregate):
+    """
+    Replace the rollup rows of `days` (all rows if None) with fresh
+    aggregates, one DELETE and a few INSERTs per batch of days.
+
+    Returns:
+    - int: Number of rollup rows written.
+    """
+    if days is None:
+        rollup.objects.all().delete()
+        day_batches = [None]
+    else:
+        day_batches = _batched(sorted(days), DAY_BATCH_SIZE)
+
+    written = 0
+    for day_batch in day_batches:
+        if day_batch is not None:
+            rollup.objects.filter(day__in=day_batch).delete()
+        for rows in _batched(aggregate(day_batch), INSERT_BATCH_SIZE):
+            rollup.objects.bulk_create(rollup(**row) for row in rows)
+            written += len(rows)
+    return written
+
+
+def _day_ranges(field, days):
+    # Range lookups per day keep the `created_at` index usable, unlike
+    # filtering on a truncated date.
+    condition = Q()
+    for day in days:
+        start = timezone.make_aware(datetime.datetime.combine(day, datetime.time()))
+        condition |= Q(
+            **{
+                f"{field}__gte": start,
+                f"{field}__lt": start + datetime.timedelta(days=1),
+            }
+        )
+    return condition
+
+
+def rebuild_revenue(days=None):
+    def aggregate(batch):
+        payments = Payment.objects.all()
+        if batch is not None:
+            payments = payments.filter(_day_ranges("created_at", batch))
+        return (
+            payments.annotate(day=TruncDate("created_at"))
+            .order_by()
+            .values("day", "type", "status")
+            .annotate(payments=Count("id"), amount=Sum("money_to_pay"))
+            .iterator()
+        )
+
+    return _rebuild(RevenueDaily, days, aggregate)
+
+
+def rebuild_book_borrowings(days=None):
+    def aggregate(batch):
+        borrowings = Borrowing.objects.all()
+        if batch is not None:
+            borrowings = borrowings.filter(borrow_date__in=batch)
+        return (
+            borrowings.order_by()
+            .values("book_id", day=F("borrow_date"))
+            .annotate(borrowings=Count("id"))
+            .iterator()
+        )
+
+    return _rebuild(BookBorrowingsDaily, days, aggregate)
+
+
+def rebuild_durations(days=None):
+    def aggregate(batch):
+        borrowings = Borrowing.objects.filter(actual_return__isnull=False)
+        if batch is not None:
+            borrowings = borrowings.filter(actual_return__in=batch)
+        rows = (
+            borrowings.order_by()
+            .values(day=F("actual_return"))
+            .annotate(
+                returned=Count("id"),
+                duration=Sum(
+                    ExpressionWrapper(
+                        F("actual_return") - F("borrow_date"),
+                        output_field=DurationField(),
+                    )
+                ),
+            )
+        )
+        for row in rows.iterator():
+            yield {
+                "day": row["day"],
+                "returned": row["returned"],
+                "total_days": max(row["duration"].days, 0),
+            }
+
+    return _rebuild(BorrowDurationDaily, days, aggregate)
@@ -0,0 +1,83 @@
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+
+from analytics.models import RollupDirtyDay
+from analytics.rollups import mark_days_dirty, payment_day
+from borrowing_service.models import Borrowing
+from payment_service.models import Payment
+
+Rollup = RollupDirtyDay.RollupChoices
+BORROWING_DATES = ("borrow_date", "actual_return")
+PAYMENT_DATES = ("created_at",)
+
+
+def _remember_dates(instance, fields):
+    # Read from `__dict__`, so deferred fields are not loaded; a date that
+    # wasn't loaded is None and never marks a day.
+    instance._rollup_dates = {field: instance.__dict__.get(field) for field in fields}
+
+
+def _moved_from(instance, field):
+    old = instance._rollup_dates.get(field)
+    return old if old and old != getattr(instance, field) else None
+
+
+@receiver(post_init, sender=Borrowing)
+def remember_borrowing_dates(sender, instance, **kwargs):
+    """
+    Signal receiver function triggered when a Borrowing is instantiated,
+    keeping the dates its rollup rows were computed from.
+    """
+    _remember_dates(instance, BORROWING_DATES)
+
+
+@receiver(post_save, sender=Borrowing)
+def mark_borrowing_old_days(sender, instance, created, **kwargs):
+    """
+    Signal receiver function triggered after a Borrowing is saved.
+
+    `updated_at` only leads the rollups to the new days of a changed row,
+    so the days its dates moved away from are marked for rebuilding here,
+    compared with the dates it was loaded with instead of queried again.
+    """
+    if not created:
+        mark_days_dirty(
+            [
+                (Rollup.BOOK_BORROWINGS, _moved_from(instance, "borrow_date")),
+                (Rollup.DURATIONS, _moved_from(instance, "actual_return")),
+            ]
+        )
+    _remember_dates(instance, BORROWING_DATES)
+
+
+@receiver(post_init, sender=Payment)
+def remember_payment_date(sender, instance, **kwargs):
+    """Signal receiver function triggered when a Payment is instantiated."""
+    _remember_dates(instance, PAYMENT_DATES)
+
+
+@receiver(post_save, sender=Payment)
+def mark_payment_old_day(sender, instance, created, **kwargs):
+    """Signal receiver function triggered after a Payment is saved."""
+    old = None if created else _moved_from(instance, "created_at")
+    if old is not None:
+        mark_days_dirty([(Rollup.REVENUE, payment_day(old))])
+    _remember_dates(instance, PAYMENT_DATES)
+
+
+@receiver(post_delete, sender=Borrowing)
+def mark_deleted_borrowing_days(sender, instance, **kwargs):
+    """
+    Signal receiver function triggered after a Borrowing is deleted,
+    including by cascade from its user or book.
+    """
+    days = [(Rollup.BOOK_BORROWINGS, instance.borrow_date)]
+    if instance.actual_return:
+        days.append((Rollup.DURATIONS, instance.actual_return))
+    mark_days_dirty(days)
+
+
+@receiver(post_delete, sender=Payment)
+def mark_deleted_payment_day(sender, instance, **kwargs):
+    """Signal receiver function triggered after a Payment is deleted."""
+    mark_days_dirty([(Rollup.REVENUE, payment_day(instance.created_at))])
@@ -0,0 +1,12 @@
+from celery import shared_task
+
+from analytics.rollups import refresh_rollups
+
+
+@shared_task
+def refresh_analytics_rollups():
+    """
+    Periodic task folding payments and borrowings changed since the last
+    run into the daily analytics rollups.
+    """
+    return refresh_rollups()
@@ -0,0 +1,268 @@
+import datetime
+from decimal import Decimal
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from analytics.models import (
+    BookBorrowingsDaily,
+    BorrowDurationDaily,
+    RevenueDaily,
+    RollupDirtyDay,
+    RollupWatermark,
+)
+from analytics.rollups import OVERLAP, refresh_rollups
+from book_service.models import Book
+from borrowing_service.models import Borrowing
+from payment_service.models import Payment
+from payment_service.transitions import pay_sessions
+
+DAY = datetime.date(2024, 3, 1)
+
+
+def at(day, hour=12):
+    return timezone.make_aware(datetime.datetime.combine(day, datetime.time(hour)))
+
+
+@mock.patch("borrowing_service.signals.send_admin_borrowing_message")
+@mock.patch("borrowing_service.signals.send_user_payment_message")
+class RollupTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user("test@user.com", "pass1234")
+        self.books = [
+            Book.objects.create(
+                title=f"Book {index}", author="Author", inventory=5, daily_fee=1
+            )
+            for index in range(2)
+        ]
+
+    def borrow(self, book, day, returned_after=None):
+        borrowing = Borrowing.objects.create(
+            book_id=book, user_id=self.user, expected_return_date=day
+        )
+        borrowing.borrow_date = day
+        if returned_after is not None:
+            borrowing.actual_return = day + datetime.timedelta(days=returned_after)
+        borrowing.save()
+        return borrowing
+
+    def pay(
+        self,
+        borrowing,
+        day,
+        amount,
+        payment_status=Payment.StatusChoices.PENDING,
+        payment_type=Payment.TypeChoices.PAYMENT,
+        session_id="cs_test",
+    ):
+        return Payment.objects.create(
+            borrowing=borrowing,
+            status=payment_status,
+            type=payment_type,
+            money_to_pay=amount,
+            session_url="http://testurl.com",
+            session_id=session_id,
+            created_at=at(day),
+        )
+
+    def settle(self):
+        """Refresh, then age all rows so they predate the watermark."""
+        refresh_rollups()
+        an_hour_ago = timezone.now() - datetime.timedelta(hours=1)
+        Payment.objects.update(updated_at=an_hour_ago - 2 * OVERLAP)
+        Borrowing.objects.update(updated_at=an_hour_ago - 2 * OVERLAP)
+        RollupWatermark.objects.update(value=an_hour_ago)
+
+    def test_full_rebuild(self, *mocks):
+        first = self.borrow(self.books[0], DAY, returned_after=3)
+        second = self.borrow(self.books[0], DAY, returned_after=6)
+        self.borrow(self.books[1], DAY + datetime.timedelta(days=1))
+        self.pay(first, DAY, "3.00")
+        self.pay(second, DAY, "6.50")
+
+        stats = refresh_rollups()
+
+        self.assertTrue(stats["full"])
+        revenue = RevenueDaily.objects.get()
+        self.assertEqual(
+            (revenue.day, revenue.payments, revenue.amount),
+            (DAY, 2, Decimal("9.50")),
+        )
+        self.assertEqual(
+            BookBorrowingsDaily.objects.get(day=DAY, book=self.books[0]).borrowings, 2
+        )
+        duration = BorrowDurationDaily.objects.get(day=DAY + datetime.timedelta(days=3))
+        self.assertEqual((duration.returned, duration.total_days), (1, 3))
+        self.assertEqual(BorrowDurationDaily.objects.count(), 2)
+
+    def test_incremental_run_only_rebuilds_changed_days(self, *mocks):
+        old = self.borrow(self.books[0], DAY)
+        payment = self.pay(old, DAY, "5.00")
+        self.settle()
+
+        # Drifted rollup rows of untouched days are left alone.
+        RevenueDaily.objects.filter(day=DAY).update(payments=99)
+        later = DAY + datetime.timedelta(days=10)
+        self.pay(self.borrow(self.books[1], later), later, "2.00")
+
+        stats = refresh_rollups()
+
+        self.assertFalse(stats["full"])
+        self.assertEqual(RevenueDaily.objects.get(day=DAY).payments, 99)
+        self.assertEqual(RevenueDaily.objects.get(day=later).amount, Decimal("2.00"))
+
+        # A status change moves the payment to another (type, status) row.
+        Payment.objects.filter(pk=payment.pk).update(
+            status=Payment.StatusChoices.PAID, updated_at=timezone.now()
+        )
+        refresh_rollups()
+        self.assertEqual(
+            list(
+                RevenueDaily.objects.filter(day=DAY).values_list("status", "payments")
+            ),
+            [(Payment.StatusChoices.PAID, 1)],
+        )
+
+    def test_paid_sessions_keep_their_amount_and_type(self, *mocks):
+        borrowing = self.borrow(self.books[0], DAY, returned_after=9)
+        self.pay(borrowing, DAY, "3.00", session_id="cs_payment")
+        self.pay(
+            borrowing,
+            DAY,
+            "2.50",
+            payment_type=Payment.TypeChoices.FINE,
+            session_id="cs_fine",
+        )
+        self.pay(self.borrow(self.books[1], DAY), DAY, "1.00", session_id="cs_open")
+
+        pay_sessions(["cs_payment", "cs_fine"])
+        refresh_rollups()
+
+        self.assertEqual(
+            set(RevenueDaily.objects.values_list("type", "status", "amount")),
+            {
+                (Payment.TypeChoices.PAYMENT, Payment.StatusChoices.PAID, 3),
+                (Payment.TypeChoices.FINE, Payment.StatusChoices.PAID, Decimal("2.50")),
+                (Payment.TypeChoices.PAYMENT, Payment.StatusChoices.PENDING, 1),
+            },
+        )
+
+    def test_saves_do_not_query_for_the_old_dates(self, *mocks):
+        payment = self.pay(self.borrow(self.books[0], DAY), DAY, "1.00")
+        payment = Payment.objects.get(pk=payment.pk)
+        RollupDirtyDay.objects.all().delete()
+
+        with self.assertNumQueries(1):
+            payment.save(update_fields=["session_url"])
+        self.assertFalse(RollupDirtyDay.objects.exists())
+
+    def test_deleted_rows_leave_their_days(self, *mocks):
+        returned = self.borrow(self.books[0], DAY, returned_after=2)
+        self.pay(returned, DAY, "4.00")
+        self.pay(self.borrow(self.books[1], DAY), DAY, "1.00")
+        self.settle()
+
+        # Deletes the borrowing and, by cascade, its payment.
+        returned.delete()
+        refresh_rollups()
+
+        self.assertEqual(
+            list(RevenueDaily.objects.values_list("day", "amount")),
+            [(DAY, Decimal("1.00"))],
+        )
+        self.assertFalse(
+            BookBorrowingsDaily.objects.filter(book=self.books[0]).exists()
+        )
+        self.assertFalse(BorrowDurationDaily.objects.exists())
+
+    def test_moved_dates_rebuild_the_old_days(self, *mocks):
+        borrowing = self.borrow(self.books[0], DAY, returned_after=2)
+        payment = self.pay(borrowing, DAY, "4.00")
+        self.settle()
+
+        later = DAY + datetime.timedelta(days=5)
+        borrowing.borrow_date = later
+        borrowing.actual_return = later + datetime.timedelta(days=1)
+        borrowing.save()
+        payment.created_at = at(later)
+        payment.save()
+        refresh_rollups()
+
+        self.assertEqual(
+            list(RevenueDaily.objects.values_list("day", flat=True)), [later]
+        )
+        self.assertEqual(
+            list(BookBorrowingsDaily.objects.values_list("day", flat=True)), [later]
+        )
+        self.assertEqual(
+            list(BorrowDurationDaily.objects.values_list("day", "total_days")),
+            [(later + datetime.timedelta(days=1), 1)],
+        )
+        self.assertFalse(RollupDirtyDay.objects.exists())
+
+    def test_incremental_run_without_changes_writes_nothing(self, *mocks):
+        self.pay(self.borrow(self.books[0], DAY), DAY, "1.00")
+        self.settle()
+
+        with self.assertNumQueries(8):
+            stats = refresh_rollups()
+        self.assertEqual(
+            (stats["revenue"], stats["book_borrowings"], stats["durations"]),
+            (0, 0, 0),
+        )
+
+
+class AnalyticsAPITests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.admin = get_user_model().objects.create_superuser(
+            "admin@test.com", "pass1234"
+        )
+        self.client.force_authenticate(self.admin)
+        book = Book.objects.create(
+            title="Popular", author="Author", inventory=5, daily_fee=1
+        )
+        for offset in range(3):
+            day = DAY + datetime.timedelta(days=offset)
+            RevenueDaily.objects.create(
+                day=day, type="Payment", status="Paid", payments=2, amount="4.00"
+            )
+            BookBorrowingsDaily.objects.create(day=day, book=book, borrowings=offset)
+            BorrowDurationDaily.objects.create(
+                day=day, returned=2, total_days=5 + offset
+            )
+        self.params = {"from": DAY.isoformat(), "to": "2024-03-02"}
+
+    def test_admin_only(self):
+        user = get_user_model().objects.create_user("user@test.com", "pass1234")
+        self.client.force_authenticate(user)
+        response = self.client.get(reverse("analytics:revenue"))
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_revenue(self):
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse("analytics:revenue"), self.params)
+        self.assertEqual(len(response.data["days"]), 2)
+        self.assertEqual(response.data["totals"][0]["payments"], 4)
+        self.assertEqual(response.data["totals"][0]["amount"], Decimal("8.00"))
+
+    def test_books(self):
+        response = self.client.get(reverse("analytics:books"), self.params)
+        self.assertEqual(response.data["books"][0]["title"], "Popular")
+        self.assertEqual(response.data["books"][0]["borrowings"], 1)
+
+    def test_borrow_duration(self):
+        response = self.client.get(reverse("analytics:borrow-duration"), self.params)
+        self.assertEqual(response.data["returned"], 4)
+        self.assertEqual(response.data["average_days"], 2.75)
+
+    def test_invalid_range(self):
+        response = self.client.get(
+            reverse("analytics:revenue"), {"from": "2024-03-05", "to": "2024-03-01"}
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
@@ -0,0 +1,11 @@
+from django.urls import path
+
+from analytics.views import BookBorrowingsView, BorrowDurationView, RevenueView
+
+urlpatterns = [
+    path("revenue/", RevenueView.as_view(), name="revenue"),
+    path("books/", BookBorrowingsView.as_view(), name="books"),
+    path("borrow-duration/", BorrowDurationView.as_view(), name="borrow-duration"),
+]
+
+app_name = "analytics"
@@ -0,0 +1,133 @@
+import datetime
+
+from django.db.models import Sum
+from drf_spectacular.utils import OpenApiParameter, extend_schema
+from rest_framework.exceptions import ValidationError
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from analytics.models import BookBorrowingsDaily, BorrowDurationDaily, RevenueDaily
+
+DEFAULT_PERIOD = datetime.timedelta(days=30)
+RANGE_PARAMETERS = [
+    OpenApiParameter("from", type=str, description="First day (YYYY-MM-DD)"),
+    OpenApiParameter(
+        "to", type=str, description="Last day (YYYY-MM-DD), today by default"
+    ),
+]
+
+
+def date_range(request):
+    """
+    Read the inclusive `from`/`to` day range of an analytics query,
+    the last 30 days by default.
+    """
+    try:
+        end = request.query_params.get("to")
+        end = datetime.date.fromisoformat(end) if end else datetime.date.today()
+        start = request.query_params.get("from")
+        start = datetime.date.fromisoformat(start) if start else end - DEFAULT_PERIOD
+    except ValueError:
+        raise ValidationError({"error": "from and to must be YYYY-MM-DD dates."})
+    if start > end:
+        raise ValidationError({"error": "from must not be after to."})
+    return start, end
+
+
+def average(total, count):
+    return round(total / count, 2) if count else None
+
+
+class AnalyticsView(APIView):
+    """Read-only dashboard query answered from the daily rollup tables."""
+
+    permission_classes = (IsAdminUser,)
+
+
+class RevenueView(AnalyticsView):
+    @extend_schema(parameters=RANGE_PARAMETERS)
+    def get(self, request):
+        """
+        Payments and their amounts per day, type and status, with totals
+        per type and status over the range.
+        """
+        start, end = date_range(request)
+        rows = RevenueDaily.objects.filter(day__range=(start, end))
+        return Response(
+            {
+                "from": start,
+                "to": end,
+                "days": list(
+                    rows.order_by("day", "type", "status").values(
+                        "day", "type", "status", "payments", "amount"
+                    )
+                ),
+                "totals": list(
+                    rows.order_by("type", "status")
+                    .values("type", "status")
+                    .annotate(payments=Sum("payments"), amount=Sum("amount"))
+                ),
+            }
+        )
+
+
+class BookBorrowingsView(AnalyticsView):
+    @extend_schema(
+        parameters=RANGE_PARAMETERS
+        + [OpenApiParameter("limit", type=int, description="Number of books")]
+    )
+    def get(self, request):
+        """Most borrowed books over the range."""
+        start, end = date_range(request)
+        try:
+            limit = max(int(request.query_params.get("limit", 10)), 0)
+        except ValueError:
+            raise ValidationError({"error": "limit must be an integer."})
+        books = (
+            BookBorrowingsDaily.objects.filter(day__range=(start, end))
+            .values("book_id", "book__title")
+            .annotate(borrowings=Sum("borrowings"))
+            .order_by("-borrowings", "book_id")[:limit]
+        )
+        return Response(
+            {
+                "from": start,
+                "to": end,
+                "books": [
+                    {
+                        "book_id": book["book_id"],
+                        "title": book["book__title"],
+                        "borrowings": book["borrowings"],
+                    }
+                    for book in books
+                ],
+            }
+        )
+
+
+class BorrowDurationView(AnalyticsView):
+    @extend_schema(parameters=RANGE_PARAMETERS)
+    def get(self, request):
+        """Average borrowing duration in days of books returned in the range."""
+        start, end = date_range(request)
+        rows = list(
+            BorrowDurationDaily.objects.filter(day__range=(start, end)).order_by("day")
+        )
+        returned = sum(row.returned for row in rows)
+        return Response(
+            {
+                "from": start,
+                "to": end,
+                "returned": returned,
+                "average_days": average(sum(row.total_days for row in rows), returned),
+                "days": [
+                    {
+                        "day": row.day,
+                        "returned": row.returned,
+                        "average_days": average(row.total_days, row.returned),
+                    }
+                    for row in rows
+                ],
+            }
+        )
@@ -7,4 +7,4 @@ from book_service.models import Book
 class BookAdmin(admin.ModelAdmin):
     list_display = ("title", "author", "cover", "inventory", "daily_fee")
     list_filter = ("cover",)
-    search_fields = ("title",)
+    search_fields = ("title", "author")
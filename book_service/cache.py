@@ -0,0 +1,159 @@
+import hashlib
+import json
+import time
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from rest_framework import status
+from rest_framework.response import Response
+
+from book_service.search import normalize_query
+
+GENERATION_KEY = "books:generation"
+HITS_KEY = "books:cache:hits"
+MISSES_KEY = "books:cache:misses"
+SEARCH_PARAMS = ("title", "search")
+
+
+def get_generation():
+    """
+    Return the current catalog generation.
+
+    Every cached response is keyed by the generation it was rendered in, so
+    bumping the generation invalidates all of them at once without having to
+    know which keys exist. A missing counter (evicted or flushed) restarts
+    from the current time so it can never go back to a generation that still
+    has entries in the cache.
+    """
+    generation = cache.get(GENERATION_KEY)
+    if generation is None:
+        cache.add(GENERATION_KEY, time.time_ns(), timeout=None)
+        generation = cache.get(GENERATION_KEY)
+    return generation
+
+
+def invalidate_book_cache():
+    """
+    Bump the catalog generation now and again once the transaction commits.
+
+    The immediate bump hides the change from readers in this transaction,
+    the second one drops anything a concurrent reader cached from the
+    pre-commit state in between.
+    """
+    _bump_generation()
+    transaction.on_commit(_bump_generation)
+
+
+def _bump_generation():
+    try:
+        cache.incr(GENERATION_KEY)
+    except ValueError:
+        cache.set(GENERATION_KEY, time.time_ns(), timeout=None)
+
+
+def make_cache_key(request, action, pk=None):
+    """
+    Build a cache key from the action and normalized query params.
+
+    Params are sorted, blank values dropped and search terms reduced to
+    their tokens, so `?title=Witcher ` and `?title=witcher` share an entry.
+    """
+    params = []
+    for key in sorted(request.query_params):
+        for value in request.query_params.getlist(key):
+            value = value.strip()
+            if key in SEARCH_PARAMS:
+                value = " ".join(normalize_query(value))
+            if value:
+                params.append((key, value))
+
+    digest = hashlib.md5(
+        f"{request.get_host()}?{urlencode(params)}".encode()
+    ).hexdigest()
+    return f"books:{get_generation()}:{action}:{pk or ''}:{digest}"
+
+
+def cached_response(request, action, render, pk=None, last_modified=None):
+    """
+    Serve a book response from the cache, rendering and storing it on a miss.
+
+    Cached entries carry a content ETag and a Last-Modified time, so a client
+    revalidating with `If-None-Match`/`If-Modified-Since` gets a 304 without
+    any serialization, and on a cache hit without touching the database.
+
+    Args:
+    - request: DRF request being handled.
+    - action (str): View action name, part of the cache key.
+    - render (callable): Produces the uncached Response.
+    - pk: Object id for detail actions.
+    - last_modified (callable): Returns the datetime the data last changed,
+      only called on a miss.
+
+    Returns:
+    - Response with `ETag`, `Last-Modified` and `X-Cache: HIT|MISS` headers.
+    """
+    key = make_cache_key(request, action, pk)
+    entry = cache.get(key)
+    if entry is not None:
+        _count(HITS_KEY)
+        cache_status = "HIT"
+    else:
+        _count(MISSES_KEY)
+        cache_status = "MISS"
+        response = render()
+        if response.status_code != status.HTTP_200_OK:
+            return response
+        modified = last_modified() if last_modified else None
+        entry = {
+            "data": response.data,
+            "etag": _content_etag(response.data),
+            "last_modified": modified.timestamp() if modified else None,
+        }
+        cache.set(key, entry, timeout=settings.BOOK_CACHE_TIMEOUT)
+
+    headers = {"ETag": entry["etag"], "X-Cache": cache_status}
+    if entry["last_modified"] is not None:
+        headers["Last-Modified"] = http_date(int(entry["last_modified"]))
+
+    not_modified = get_conditional_response(
+        request,
+        etag=entry["etag"],
+        last_modified=entry["last_modified"] and int(entry["last_modified"]),
+    )
+    if not_modified is not None:
+        for header, value in headers.items():
+            not_modified[header] = value
+        return not_modified
+
+    return Response(entry["data"], headers=headers)
+
+
+def _content_etag(data):
+    payload = json.dumps(data, cls=DjangoJSONEncoder, sort_keys=True)
+    return f'"{hashlib.md5(payload.encode()).hexdigest()}"'
+
+
+def _count(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, 0, timeout=None)
+        cache.incr(key)
+
+
+def cache_stats():
+    """Return hit/miss counters and the current generation."""
+    counters = cache.get_many([HITS_KEY, MISSES_KEY])
+    hits, misses = counters.get(HITS_KEY, 0), counters.get(MISSES_KEY, 0)
+    total = hits + misses
+    return {
+        "hits": hits,
+        "misses": misses,
+        "hit_ratio": round(hits / total, 4) if total else None,
+        "generation": get_generation(),
+    }
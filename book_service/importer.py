@@ -0,0 +1,255 @@
+import csv
+import io
+import json
+import time
+from dataclasses import dataclass, field
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from book_service.cache import invalidate_book_cache
+from book_service.models import Book
+
+DEFAULT_BATCH_SIZE = 1000
+MAX_STORED_ERRORS = 10_000
+UPSERT_ATTEMPTS = 3
+UPDATE_FIELDS = ("cover", "inventory", "daily_fee", "updated_at")
+COVERS = {choice.lower(): choice for choice in Book.CoverChoices.values}
+
+
+@dataclass
+class ImportReport:
+    rows: int = 0
+    created: int = 0
+    updated: int = 0
+    failed: int = 0
+    errors: list = field(default_factory=list)
+    started: float = field(default_factory=time.perf_counter)
+    finished: float = None
+
+    @property
+    def seconds(self):
+        return (self.finished or time.perf_counter()) - self.started
+
+    @property
+    def rows_per_second(self):
+        return round(self.rows / self.seconds, 1) if self.seconds else 0.0
+
+    def as_dict(self, max_errors=100):
+        return {
+            "rows": self.rows,
+            "created": self.created,
+            "updated": self.updated,
+            "failed": self.failed,
+            "seconds": round(self.seconds, 3),
+            "rows_per_second": self.rows_per_second,
+            "errors": self.errors[:max_errors],
+        }
+
+
+def read_rows(stream, file_format):
+    """
+    Lazily yield rows from a CSV or JSONL text stream.
+
+    Only one line is held in memory at a time, so the size of the supplier
+    file does not matter.
+    """
+    if file_format == "csv":
+        yield from csv.DictReader(stream)
+    elif file_format == "jsonl":
+        for line_number, line in enumerate(stream, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as error:
+                row = {"__error__": f"Invalid JSON on line {line_number}: {error}"}
+            if not isinstance(row, dict):
+                row = {"__error__": f"Line {line_number} is not a JSON object"}
+            yield row
+    else:
+        raise ValueError(f"Unsupported format: {file_format}")
+
+
+def text_stream(binary_file, encoding="utf-8"):
+    """Wrap an uploaded (binary) file so `read_rows` can consume it line by line."""
+    return io.TextIOWrapper(binary_file, encoding=encoding, newline="")
+
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def validate_batch(rows, first_row_number):
+    """
+    Validate and coerce a batch of raw rows column by column.
+
+    Each column is checked in its own pass over the batch, which keeps the
+    per-row work to a handful of tight loops instead of running a
+    serializer per row.
+
+    Returns:
+    - tuple: (list of clean row dicts, list of {"row", "errors"} dicts)
+    """
+    row_errors = [[] for _ in rows]
+
+    for index, row in enumerate(rows):
+        if "__error__" in row:
+            row_errors[index].append(row["__error__"])
+
+    titles = [str(row.get("title") or "").strip() for row in rows]
+    authors = [str(row.get("author") or "").strip() for row in rows]
+    for column, values in (("title", titles), ("author", authors)):
+        for index, value in enumerate(values):
+            if not value:
+                row_errors[index].append(f"{column}: This field is required.")
+            elif len(value) > 255:
+                row_errors[index].append(f"{column}: Ensure at most 255 characters.")
+
+    covers = [COVERS.get(str(row.get("cover") or "").strip().lower()) for row in rows]
+    for index, value in enumerate(covers):
+        if value is None:
+            row_errors[index].append(
+                f"cover: Must be one of {', '.join(COVERS.values())}."
+            )
+
+    inventories = [_to_int(row.get("inventory")) for row in rows]
+    for index, value in enumerate(inventories):
+        if value is None or value < 0:
+            row_errors[index].append("inventory: Must be a non-negative integer.")
+
+    fees = [_to_fee(row.get("daily_fee")) for row in rows]
+    for index, value in enumerate(fees):
+        if value is None:
+            row_errors[index].append(
+                "daily_fee: Must be a non-negative amount with 2 decimal places."
+            )
+
+    clean, errors = [], []
+    for index, messages in enumerate(row_errors):
+        if messages:
+            errors.append({"row": first_row_number + index, "errors": messages})
+            continue
+        clean.append(
+            {
+                "title": titles[index],
+                "author": authors[index],
+                "cover": covers[index],
+                "inventory": inventories[index],
+                "daily_fee": fees[index],
+            }
+        )
+    return clean, errors
+
+
+def _to_int(value):
+    try:
+        return int(str(value).strip())
+    except (TypeError, ValueError):
+        return None
+
+
+def _to_fee(value):
+    try:
+        fee = Decimal(str(value).strip())
+    except (InvalidOperation, ValueError):
+        return None
+    if not fee.is_finite() or fee < 0 or fee.as_tuple().exponent < -2:
+        return None
+    if fee.adjusted() >= 8:
+        return None
+    return fee
+
+
+def upsert_batch(rows):
+    """
+    Insert new books and update existing ones matched on (title, author).
+
+    One SELECT finds existing rows, then one bulk_create and one bulk_update
+    write the batch inside a single transaction. Duplicate keys inside the
+    batch collapse to the last occurrence.
+
+    The `book_title_author_unique` constraint makes a concurrent import
+    that inserted one of the new books fail the bulk_create; the batch is
+    then rolled back and matched again, updating that book instead.
+
+    Returns:
+    - tuple: (created count, updated count)
+    """
+    by_key = {(row["title"], row["author"]): row for row in rows}
+    for attempt in range(1, UPSERT_ATTEMPTS + 1):
+        try:
+            return _upsert(by_key)
+        except IntegrityError:
+            if attempt == UPSERT_ATTEMPTS:
+                raise
+
+
+def _upsert(by_key):
+    titles = {title for title, _ in by_key}
+    now = timezone.now()
+    with transaction.atomic():
+        existing = {
+            (book.title, book.author): book
+            for book in Book.objects.filter(title__in=titles).only(
+                "id", "title", "author"
+            )
+        }
+        to_create, to_update = [], []
+        for key, row in by_key.items():
+            book = existing.get(key)
+            if book is None:
+                to_create.append(Book(**row))
+                continue
+            book.cover = row["cover"]
+            book.inventory = row["inventory"]
+            book.daily_fee = row["daily_fee"]
+            book.updated_at = now
+            to_update.append(book)
+
+        Book.objects.bulk_create(to_create)
+        Book.objects.bulk_update(to_update, UPDATE_FIELDS)
+    return len(to_create), len(to_update)
+
+
+def import_books(rows, batch_size=DEFAULT_BATCH_SIZE, progress=None):
+    """
+    Stream rows into the catalog in batches.
+
+    Invalid rows are reported and skipped; the rest of their batch is still
+    written. Bulk writes bypass model signals, so the book response cache is
+    invalidated once at the end.
+
+    Args:
+    - rows (iterable): Raw row dicts, e.g. from `read_rows`.
+    - batch_size (int): Rows validated and written per transaction.
+    - progress (callable): Optional callback receiving the report after
+      every batch.
+
+    Returns:
+    - ImportReport: Counts, per-row errors and throughput.
+    """
+    report = ImportReport()
+    row_number = 1
+    for batch in batched(rows, batch_size):
+        clean, errors = validate_batch(batch, row_number)
+        report.failed += len(errors)
+        report.errors.extend(errors[: MAX_STORED_ERRORS - len(report.errors)])
+        if clean:
+            created, updated = upsert_batch(clean)
+            report.created += created
+            report.updated += updated
+        report.rows += len(batch)
+        row_number += len(batch)
+        if progress:
+            progress(report)
+
+    report.finished = time.perf_counter()
+    if report.created or report.updated:
+        invalidate_book_cache()
+    return report
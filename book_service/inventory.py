@@ -0,0 +1,137 @@
+from collections import Counter
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from book_service.cache import invalidate_book_cache
+from book_service.models import Book, InventoryReservation
+
+
+def take_copy(book_id):
+    """
+    Atomically take one copy of a book off the shelf.
+
+    A single conditional `UPDATE ... SET inventory = inventory - 1
+    WHERE id = %s AND inventory > 0` replaces the old read-modify-write, so
+    concurrent takes can neither oversell nor lose updates, and the row lock
+    is held only for that statement. The `book_inventory_non_negative` check
+    constraint backs this up at the database level.
+
+    Args:
+    - book_id (int): ID of the book.
+
+    Returns:
+    - bool: False if no copy was left.
+    """
+    taken = Book.objects.filter(pk=book_id, inventory__gt=0).update(
+        inventory=F("inventory") - 1, updated_at=timezone.now()
+    )
+    if taken:
+        invalidate_book_cache()
+    return bool(taken)
+
+
+def return_copy(book_id, count=1):
+    """
+    Atomically put copies of a book back on the shelf.
+
+    Args:
+    - book_id (int): ID of the book.
+    - count (int): Number of copies returned.
+    """
+    Book.objects.filter(pk=book_id).update(
+        inventory=F("inventory") + count, updated_at=timezone.now()
+    )
+    invalidate_book_cache()
+
+
+def reservations_enabled():
+    return bool(getattr(settings, "INVENTORY_RESERVATION_TTL", None))
+
+
+def reserve_copy(borrowing):
+    """
+    Hold a copy for a new borrowing until its payment succeeds.
+
+    Only used when `INVENTORY_RESERVATION_TTL` is set. The copy leaves the
+    shelf right away, so two users can't both pay for the last one.
+
+    Returns:
+    - bool: False if no copy was left.
+    """
+    if not take_copy(borrowing.book_id_id):
+        return False
+    InventoryReservation.objects.create(
+        book_id=borrowing.book_id_id,
+        borrowing=borrowing,
+        expires_at=timezone.now() + settings.INVENTORY_RESERVATION_TTL,
+    )
+    return True
+
+
+def checkout_copy(borrowing):
+    """
+    Hand out the copy for a paid borrowing.
+
+    Consumes the borrowing's reservation if it still holds one, otherwise
+    takes a copy from the shelf.
+
+    Returns:
+    - bool: False if the reservation expired and no copy was left.
+    """
+    released, _ = InventoryReservation.objects.filter(borrowing=borrowing).delete()
+    if released:
+        return True
+    return take_copy(borrowing.book_id_id)
+
+
+def release_reservation(borrowing_id):
+    """
+    Put the copy held for a borrowing back on the shelf, if it holds one.
+
+    Returns:
+    - bool: True if a copy was released.
+    """
+    reservation = (
+        InventoryReservation.objects.select_for_update()
+        .filter(borrowing_id=borrowing_id)
+        .values_list("id", "book_id")
+        .first()
+    )
+    if reservation is None:
+        return False
+    InventoryReservation.objects.filter(pk=reservation[0]).delete()
+    return_copy(reservation[1])
+    return True
+
+
+def release_expired_reservations(batch_size=500):
+    """
+    Put copies held by expired reservations back on the shelf.
+
+    Expired rows are claimed with `SKIP LOCKED` so parallel runs never
+    release the same reservation twice, and inventory is restored with one
+    UPDATE per book rather than per reservation.
+
+    Returns:
+    - int: Number of reservations released.
+    """
+    released = 0
+    while True:
+        with transaction.atomic():
+            expired = list(
+                InventoryReservation.objects.select_for_update(skip_locked=True)
+                .filter(expires_at__lte=timezone.now())
+                .values_list("id", "book_id")[:batch_size]
+            )
+            if not expired:
+                return released
+
+            InventoryReservation.objects.filter(
+                id__in=[reservation_id for reservation_id, _ in expired]
+            ).delete()
+            for book_id, count in Counter(book for _, book in expired).items():
+                return_copy(book_id, count)
+        released += len(expired)
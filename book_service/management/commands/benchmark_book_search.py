@@ -0,0 +1,90 @@
+import random
+import statistics
+import string
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from book_service.models import Book
+from book_service.search import search_books
+
+
+class Command(BaseCommand):
+    """
+    Django command to measure catalog search latency against catalog size.
+
+    Seeds synthetic books inside a transaction that is rolled back at the end,
+    so it is safe to run against a dev database.
+    """
+
+    help = "Benchmark ranked book search vs. title__icontains + distinct()"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sizes",
+            nargs="+",
+            type=int,
+            default=[1_000, 10_000, 100_000],
+            help="Catalog sizes to benchmark (cumulative).",
+        )
+        parser.add_argument(
+            "--queries", type=int, default=50, help="Queries per size."
+        )
+        parser.add_argument("--seed", type=int, default=42)
+
+    def handle(self, *args, **options) -> None:
+        rng = random.Random(options["seed"])
+        words = ["".join(rng.choices(string.ascii_lowercase, k=7)) for _ in range(2000)]
+
+        self.stdout.write(
+            f"{'books':>10} {'search p50':>12} {'search p95':>12} "
+            f"{'icontains p50':>14} {'icontains p95':>14}"
+        )
+        with transaction.atomic():
+            seeded = 0
+            for size in sorted(options["sizes"]):
+                self._seed(rng, words, size - seeded)
+                seeded = size
+                terms = [rng.choice(words)[:5] for _ in range(options["queries"])]
+
+                ranked = self._measure(
+                    lambda term: list(search_books(Book.objects.all(), term)[:20]),
+                    terms,
+                )
+                naive = self._measure(
+                    lambda term: list(
+                        Book.objects.filter(title__icontains=term).distinct()[:20]
+                    ),
+                    terms,
+                )
+                self.stdout.write(
+                    f"{size:>10} {ranked[0]:>10.2f}ms {ranked[1]:>10.2f}ms "
+                    f"{naive[0]:>12.2f}ms {naive[1]:>12.2f}ms"
+                )
+            transaction.set_rollback(True)
+
+    @staticmethod
+    def _seed(rng, words, count, batch_size=5_000):
+        for start in range(0, count, batch_size):
+            Book.objects.bulk_create(
+                Book(
+                    title=" ".join(rng.choices(words, k=3)).title(),
+                    author=" ".join(rng.choices(words, k=2)).title(),
+                    cover=Book.CoverChoices.HARD,
+                    inventory=rng.randint(0, 10),
+                    daily_fee=rng.randint(10, 500) / 100,
+                )
+                for _ in range(min(batch_size, count - start))
+            )
+
+    @staticmethod
+    def _measure(run_query, terms):
+        timings = []
+        for term in terms:
+            started = time.perf_counter()
+            run_query(term)
+            timings.append((time.perf_counter() - started) * 1000)
+        timings.sort()
+        p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+        return statistics.median(timings), p95
@@ -0,0 +1,84 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import DatabaseError, connection
+
+from book_service.inventory import take_copy
+from book_service.models import Book
+
+
+def naive_take(book_id):
+    """The old read-modify-write, kept here only as a baseline."""
+    book = Book.objects.get(pk=book_id)
+    if book.inventory < 1:
+        return False
+    book.inventory -= 1
+    book.save()
+    return True
+
+
+class Command(BaseCommand):
+    """
+    Django command to hammer a single hot book from many workers.
+
+    Reports throughput and how many copies were oversold, i.e. successful
+    takes beyond the initial inventory. The benchmark book is deleted at the
+    end.
+    """
+
+    help = "Concurrency benchmark for book inventory decrements"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=16)
+        parser.add_argument("--attempts", type=int, default=2000)
+        parser.add_argument("--inventory", type=int, default=500)
+        parser.add_argument(
+            "--mode", choices=("atomic", "naive", "both"), default="both"
+        )
+
+    def handle(self, *args, **options) -> None:
+        modes = ("naive", "atomic") if options["mode"] == "both" else (options["mode"],)
+        for mode in modes:
+            self.run(
+                mode, options["workers"], options["attempts"], options["inventory"]
+            )
+
+    def run(self, mode, workers, attempts, inventory):
+        take = take_copy if mode == "atomic" else naive_take
+        book = Book.objects.create(
+            title="Inventory benchmark",
+            author="benchmark",
+            cover=Book.CoverChoices.HARD,
+            inventory=inventory,
+            daily_fee=1,
+        )
+        counters = {"taken": 0, "sold_out": 0, "errors": 0}
+        lock = threading.Lock()
+
+        def attempt(_):
+            try:
+                outcome = "taken" if take(book.pk) else "sold_out"
+            except DatabaseError:
+                outcome = "errors"
+            finally:
+                connection.close()
+            with lock:
+                counters[outcome] += 1
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            list(pool.map(attempt, range(attempts)))
+        elapsed = time.perf_counter() - started
+
+        book.refresh_from_db()
+        oversold = max(0, counters["taken"] - inventory)
+        lost_updates = inventory - counters["taken"] - book.inventory
+        self.stdout.write(
+            f"{mode:>7}: {attempts / elapsed:8.1f} attempts/s, "
+            f"taken={counters['taken']} sold_out={counters['sold_out']} "
+            f"errors={counters['errors']} final_inventory={book.inventory} "
+            f"oversold={oversold} lost_updates={abs(lost_updates)}"
+        )
+        book.delete()
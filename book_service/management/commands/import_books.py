@@ -0,0 +1,56 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from book_service.importer import DEFAULT_BATCH_SIZE, import_books, read_rows
+
+
+class Command(BaseCommand):
+    """Django command to bulk import a supplier catalog from CSV or JSONL"""
+
+    help = "Stream books from a CSV/JSONL file and upsert them on (title, author)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Path to the catalog file.")
+        parser.add_argument(
+            "--format",
+            choices=("csv", "jsonl"),
+            help="File format, guessed from the extension when omitted.",
+        )
+        parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+        parser.add_argument("--encoding", default="utf-8")
+        parser.add_argument(
+            "--max-errors", type=int, default=20, help="Row errors to print."
+        )
+
+    def handle(self, *args, **options) -> None:
+        path = options["path"]
+        file_format = options["format"] or path.rsplit(".", 1)[-1].lower()
+        if file_format not in ("csv", "jsonl"):
+            raise CommandError("Cannot guess the format, pass --format csv|jsonl")
+
+        def progress(report):
+            self.stdout.write(
+                f"{report.rows} rows, {report.created} created, "
+                f"{report.updated} updated, {report.failed} failed "
+                f"({report.rows_per_second} rows/s)"
+            )
+
+        try:
+            with open(path, encoding=options["encoding"], newline="") as stream:
+                report = import_books(
+                    read_rows(stream, file_format),
+                    batch_size=options["batch_size"],
+                    progress=progress,
+                )
+        except OSError as error:
+            raise CommandError(error)
+
+        for error in report.errors[: options["max_errors"]]:
+            self.stderr.write(f"Row {error['row']}: {'; '.join(error['errors'])}")
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Imported {report.rows} rows in {report.seconds:.2f}s "
+                f"({report.rows_per_second} rows/s): {report.created} created, "
+                f"{report.updated} updated, {report.failed} failed"
+            )
+        )
@@ -0,0 +1,46 @@
+# Generated by Django 4.0.4 on 2026-10-18 09:12
+
+from django.db import migrations
+
+POSTGRES_FORWARD = (
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX IF NOT EXISTS book_search_vector_gin ON book_service_book "
+    "USING gin ((setweight(to_tsvector('simple', coalesce(title, '')), 'A') || "
+    "setweight(to_tsvector('simple', coalesce(author, '')), 'B')))",
+    "CREATE INDEX IF NOT EXISTS book_title_trgm_gin ON book_service_book "
+    "USING gin (title gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS book_author_trgm_gin ON book_service_book "
+    "USING gin (author gin_trgm_ops)",
+)
+
+POSTGRES_BACKWARD = (
+    "DROP INDEX IF EXISTS book_author_trgm_gin",
+    "DROP INDEX IF EXISTS book_title_trgm_gin",
+    "DROP INDEX IF EXISTS book_search_vector_gin",
+)
+
+
+def create_search_indexes(apps, schema_editor):
+    # SQLite gets its FTS5 table from book_service.signals.ensure_search_index,
+    # which has to rerun after every migrate anyway.
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    for statement in POSTGRES_FORWARD:
+        schema_editor.execute(statement)
+
+
+def drop_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    for statement in POSTGRES_BACKWARD:
+        schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("book_service", "0002_alter_book_options_alter_book_cover"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 4.0.4 on 2026-10-18 06:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("book_service", "0003_book_search_indexes"),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name="book",
+            options={"ordering": ["title", "id"]},
+        ),
+        migrations.AddIndex(
+            model_name="book",
+            index=models.Index(fields=["title", "id"], name="book_title_id_idx"),
+        ),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 4.0.4 on 2026-10-18 06:32
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("borrowing_service", "0003_alter_borrowing_options_and_more"),
+        ("book_service", "0005_bookdeletion_book_updated_at"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="InventoryReservation",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("expires_at", models.DateTimeField(db_index=True)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name="book",
+            constraint=models.CheckConstraint(
+                check=models.Q(("inventory__gte", 0)),
+                name="book_inventory_non_negative",
+            ),
+        ),
+        migrations.AddField(
+            model_name="inventoryreservation",
+            name="book",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="reservations",
+                to="book_service.book",
+            ),
+        ),
+        migrations.AddField(
+            model_name="inventoryreservation",
+            name="borrowing",
+            field=models.OneToOneField(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="reservation",
+                to="borrowing_service.borrowing",
+            ),
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 4.0.4 on 2026-10-18 07:47
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def disambiguate_duplicates(apps, schema_editor):
+    """
+    Give books sharing a title and author distinct titles.
+
+    The oldest copy keeps its title, the others get their id appended, so
+    the unique constraint can be added without deleting books that may
+    have borrowings.
+    """
+    Book = apps.get_model("book_service", "Book")
+    duplicates = (
+        Book.objects.values("title", "author")
+        .annotate(count=Count("id"))
+        .filter(count__gt=1)
+    )
+    for duplicate in duplicates:
+        books = Book.objects.filter(
+            title=duplicate["title"], author=duplicate["author"]
+        ).order_by("id")[1:]
+        for book in books:
+            suffix = f" ({book.id})"
+            book.title = book.title[: 255 - len(suffix)] + suffix
+            book.save(update_fields=["title"])
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("book_service", "0006_inventoryreservation_and_more"),
+    ]
+
+    operations = [
+        migrations.RunPython(disambiguate_duplicates, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name="book",
+            constraint=models.UniqueConstraint(
+                fields=("title", "author"), name="book_title_author_unique"
+            ),
+        ),
+    ]
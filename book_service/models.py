@@ -11,6 +11,7 @@ class Book(models.Model):
     cover = models.CharField(max_length=20, choices=CoverChoices.choices)
     inventory = models.PositiveIntegerField()
     daily_fee = models.DecimalField(max_digits=10, decimal_places=2)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
     def __str__(self):
         return self.title
@@ -18,4 +19,45 @@ class Book(models.Model):
     class Meta:
         ordering = [
             "title",
+            "id",
         ]
+        indexes = [
+            models.Index(fields=["title", "id"], name="book_title_id_idx"),
+        ]
+        constraints = [
+            models.CheckConstraint(
+                check=models.Q(inventory__gte=0),
+                name="book_inventory_non_negative",
+            ),
+            # Books are identified by title and author, e.g. by the importer.
+            models.UniqueConstraint(
+                fields=["title", "author"], name="book_title_author_unique"
+            ),
+        ]
+
+
+class BookDeletion(models.Model):
+    """Tombstone kept for delta sync clients after a Book row is deleted."""
+
+    book_id = models.BigIntegerField()
+    deleted_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return f"Book {self.book_id} deleted at {self.deleted_at}"
+
+
+class InventoryReservation(models.Model):
+    """A copy held for a borrowing until its payment succeeds or the hold expires."""
+
+    book = models.ForeignKey(
+        Book, on_delete=models.CASCADE, related_name="reservations"
+    )
+    borrowing = models.OneToOneField(
+        "borrowing_service.Borrowing",
+        on_delete=models.CASCADE,
+        related_name="reservation",
+    )
+    expires_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return f"{self.book} held until {self.expires_at}"
@@ -0,0 +1,182 @@
+import re
+
+from django.db import connections
+from django.db.models import BooleanField, FloatField, Q
+from django.db.models.expressions import RawSQL
+
+BOOK_TABLE = "book_service_book"
+FTS_TABLE = "book_service_book_fts"
+
+# Must stay byte-for-byte identical to the expression indexed by
+# book_service/migrations/0003_book_search_indexes.py, otherwise Postgres
+# will not pick the GIN index.
+PG_SEARCH_VECTOR = (
+    "(setweight(to_tsvector('simple', coalesce({table}.title, '')), 'A') || "
+    "setweight(to_tsvector('simple', coalesce({table}.author, '')), 'B'))"
+).format(table=f'"{BOOK_TABLE}"')
+
+SEARCH_FIELDS = ("title", "author")
+TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+SQLITE_FTS_STATEMENTS = (
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+    f"title, author, content='{BOOK_TABLE}', content_rowid='id', "
+    f"tokenize='unicode61 remove_diacritics 2')",
+    f"CREATE TRIGGER IF NOT EXISTS {BOOK_TABLE}_fts_ai AFTER INSERT ON {BOOK_TABLE} "
+    f"BEGIN INSERT INTO {FTS_TABLE}(rowid, title, author) "
+    f"VALUES (new.id, new.title, new.author); END",
+    f"CREATE TRIGGER IF NOT EXISTS {BOOK_TABLE}_fts_ad AFTER DELETE ON {BOOK_TABLE} "
+    f"BEGIN INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, author) "
+    f"VALUES ('delete', old.id, old.title, old.author); END",
+    f"CREATE TRIGGER IF NOT EXISTS {BOOK_TABLE}_fts_au AFTER UPDATE ON {BOOK_TABLE} "
+    f"BEGIN INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, author) "
+    f"VALUES ('delete', old.id, old.title, old.author); "
+    f"INSERT INTO {FTS_TABLE}(rowid, title, author) "
+    f"VALUES (new.id, new.title, new.author); END",
+)
+
+
+def normalize_query(query):
+    """
+    Collapse a raw user query into lowercase word tokens.
+
+    Args:
+    - query (str): Text typed by the user.
+
+    Returns:
+    - list[str]: Word tokens, punctuation and FTS operators stripped.
+    """
+    return TOKEN_RE.findall((query or "").lower())
+
+
+def search_books(queryset, query, fields=SEARCH_FIELDS, rank=True):
+    """
+    Filter and rank a Book queryset by a free-text query.
+
+    Postgres uses the tsvector and pg_trgm GIN indexes (ranked, typo
+    tolerant), SQLite uses the FTS5 shadow table (ranked, prefix matching).
+    FTS5 only matches word prefixes, so SQLite keeps the plain substring
+    match of the original title filter for searches on a subset of the
+    fields. Any other backend falls back to an unranked icontains filter.
+
+    Args:
+    - queryset: Book queryset to search in.
+    - query (str): Text typed by the user.
+    - fields (tuple): Subset of ("title", "author") to match against.
+    - rank (bool): False to only filter, leaving the annotation and ordering
+      to another search on the same queryset.
+
+    Returns:
+    - queryset: Matching books annotated with `search_rank`, best first.
+    """
+    tokens = normalize_query(query)
+    if not tokens:
+        return queryset
+
+    connection = connections[queryset.db]
+    if connection.vendor == "postgresql":
+        return _postgres_search(queryset, " ".join(tokens), fields, rank)
+    if (
+        connection.vendor == "sqlite"
+        and set(fields) == set(SEARCH_FIELDS)
+        and sqlite_fts_available(connection)
+    ):
+        return _sqlite_search(queryset, tokens, fields, rank)
+    return _fallback_search(queryset, " ".join(tokens), fields, rank)
+
+
+def _postgres_search(queryset, text, fields, rank):
+    table = f'"{BOOK_TABLE}"'
+    # Word similarity compares the query with the best matching part of the
+    # field, so a typo in one word of a long title still matches.
+    trigram_match = " OR ".join(f"%s <%% {table}.{field}" for field in fields)
+    trigram_rank = ", ".join(
+        f"word_similarity(%s, {table}.{field})" for field in fields
+    )
+    trigram_params = (text,) * len(fields)
+
+    if set(fields) == set(SEARCH_FIELDS):
+        tsquery = "plainto_tsquery('simple', %s)"
+        match_sql = f"({PG_SEARCH_VECTOR} @@ {tsquery} OR {trigram_match})"
+        match_params = (text,) + trigram_params
+        rank_sql = f"GREATEST(ts_rank({PG_SEARCH_VECTOR}, {tsquery}), {trigram_rank})"
+        rank_params = (text,) + trigram_params
+    else:
+        ilike_match = " OR ".join(f"{table}.{field} ILIKE %s" for field in fields)
+        match_sql = f"({ilike_match} OR {trigram_match})"
+        match_params = (f"%{text}%",) * len(fields) + trigram_params
+        rank_sql = f"GREATEST({trigram_rank})"
+        rank_params = trigram_params
+
+    queryset = queryset.filter(
+        RawSQL(match_sql, match_params, output_field=BooleanField())
+    )
+    if not rank:
+        return queryset
+    return queryset.annotate(
+        search_rank=RawSQL(rank_sql, rank_params, output_field=FloatField())
+    ).order_by("-search_rank", "id")
+
+
+def _sqlite_search(queryset, tokens, fields, rank):
+    terms = " ".join(f'"{token}"*' for token in tokens)
+    match = f"{{{' '.join(fields)}}} : ({terms})"
+    rank_sql = (
+        f"SELECT -{FTS_TABLE}.rank FROM {FTS_TABLE} "
+        f"WHERE {FTS_TABLE} MATCH %s AND {FTS_TABLE}.rowid = {BOOK_TABLE}.id"
+    )
+    matched_ids = RawSQL(
+        f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", (match,)
+    )
+    queryset = queryset.filter(id__in=matched_ids)
+    if not rank:
+        return queryset
+    return queryset.annotate(
+        search_rank=RawSQL(rank_sql, (match,), output_field=FloatField())
+    ).order_by("-search_rank", "id")
+
+
+def _fallback_search(queryset, text, fields, rank):
+    condition = Q()
+    for field in fields:
+        condition |= Q(**{f"{field}__icontains": text})
+    queryset = queryset.filter(condition)
+    if not rank:
+        return queryset
+    return queryset.order_by("title", "id")
+
+
+def sqlite_fts_available(connection):
+    """Return True if the FTS5 shadow table exists on this SQLite database."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s",
+            [FTS_TABLE],
+        )
+        return cursor.fetchone() is not None
+
+
+def ensure_sqlite_fts(connection):
+    """
+    Create (or repair) the FTS5 shadow table and its sync triggers.
+
+    SQLite drops triggers whenever Django remakes the book table during a
+    migration, so this runs after every `migrate` and rebuilds the index
+    if any trigger had to be recreated.
+    """
+    if connection.vendor != "sqlite":
+        return
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT count(*) FROM sqlite_master WHERE type = 'trigger' "
+            "AND name LIKE %s",
+            [f"{BOOK_TABLE}_fts_%"],
+        )
+        existing_triggers = cursor.fetchone()[0]
+
+        for statement in SQLITE_FTS_STATEMENTS:
+            cursor.execute(statement)
+
+        if existing_triggers < 3:
+            cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
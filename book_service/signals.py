@@ -0,0 +1,37 @@
+from django.db import connections
+from django.db.models.signals import post_delete, post_migrate, post_save
+from django.dispatch import receiver
+
+from book_service.cache import invalidate_book_cache
+from book_service.models import Book, BookDeletion
+from book_service.search import ensure_sqlite_fts
+
+
+@receiver(post_migrate)
+def ensure_search_index(sender, using="default", **kwargs):
+    """
+    Signal receiver function triggered after `migrate` finishes for an app.
+
+    Keeps the SQLite FTS5 search table and its triggers in place for the dev
+    settings. Postgres indexes are created by regular migrations instead.
+    """
+    if sender.name == "book_service":
+        ensure_sqlite_fts(connections[using])
+
+
+@receiver(post_save, sender=Book)
+@receiver(post_delete, sender=Book)
+def invalidate_book_responses(sender, instance, **kwargs):
+    """
+    Signal receiver function triggered after a Book is saved or deleted.
+
+    Drops every cached book list/detail response, including the inventory
+    changes made through `Book.save()` by the payment and return flows.
+    """
+    invalidate_book_cache()
+
+
+@receiver(post_delete, sender=Book)
+def record_book_deletion(sender, instance, **kwargs):
+    """Leave a tombstone so delta-sync clients learn about the deletion."""
+    BookDeletion.objects.create(book_id=instance.pk)
@@ -0,0 +1,12 @@
+from celery import shared_task
+
+from book_service.inventory import release_expired_reservations
+
+
+@shared_task
+def release_expired_inventory_reservations():
+    """
+    Asynchronous task to put copies held by unpaid, expired reservations
+    back on the shelf.
+    """
+    return release_expired_reservations()
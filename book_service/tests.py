@@ -1,12 +1,35 @@
+import datetime
+import io
+import json
+import tempfile
+from decimal import Decimal
+from unittest import mock
+
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import IntegrityError
+from django.test import TestCase, override_settings
+from django.utils import timezone
 from django.urls import reverse
 
 from rest_framework.test import APIClient
 from rest_framework import status
 
 
-from book_service.models import Book
+from book_service import sync
+from book_service.importer import upsert_batch
+from book_service.inventory import (
+    checkout_copy,
+    release_expired_reservations,
+    reserve_copy,
+    return_copy,
+    take_copy,
+)
+from book_service.models import Book, BookDeletion, InventoryReservation
+from borrowing_service.models import Borrowing
+from config.testing import QueryBudgetMixin
 from book_service.serializers import (
     BookListSerializer,
     BookDetailSerializer,
@@ -34,6 +57,7 @@ def book_detail_url(book_id):
 
 class UnAuthenticatedBookApiTests(TestCase):
     def setUp(self):
+        cache.clear()
         self.client = APIClient()
         self.book1 = sample_book()
         self.book2 = sample_book(title="FilterBook")
@@ -43,15 +67,94 @@ class UnAuthenticatedBookApiTests(TestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         serializer1 = BookListSerializer(self.book1)
         serializer2 = BookListSerializer(self.book2)
-        self.assertIn(serializer2.data, response.data)
-        self.assertNotIn(serializer1.data, response.data)
+        self.assertIn(serializer2.data, response.data["results"])
+        self.assertNotIn(serializer1.data, response.data["results"])
+
+    def test_filter_books_by_title_matches_inside_words(self):
+        response = self.client.get(BOOK_URL, {"title": "terbo"})
+        self.assertEqual(
+            [book["id"] for book in response.data["results"]], [self.book2.id]
+        )
+
+    def test_search_books_by_author(self):
+        book3 = sample_book(title="The Last Wish", author="Andrzej Sapkowski")
+        response = self.client.get(BOOK_URL, {"search": "sapkow"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([book["id"] for book in response.data["results"]], [book3.id])
+
+    def test_search_books_ranks_title_matches_first(self):
+        by_author = sample_book(title="Unrelated", author="Witcher Fan")
+        by_title = sample_book(title="Witcher", author="Someone")
+        response = self.client.get(BOOK_URL, {"search": "witcher"})
+        self.assertEqual(
+            [book["id"] for book in response.data["results"]], [by_title.id, by_author.id]
+        )
+
+    def test_search_with_title_filter_keeps_the_search_ranking(self):
+        by_author = sample_book(title="Witcher Tales", author="Witcher Fan")
+        by_title = sample_book(title="Witcher Witcher", author="Someone")
+        sample_book(title="Unrelated", author="Witcher Fan")
+        response = self.client.get(BOOK_URL, {"search": "fan", "title": "witch"})
+        self.assertEqual(
+            [book["id"] for book in response.data["results"]], [by_author.id]
+        )
+
+        response = self.client.get(BOOK_URL, {"search": "witcher", "title": "witch"})
+        self.assertEqual(
+            [book["id"] for book in response.data["results"]],
+            [by_title.id, by_author.id],
+        )
+
+    def test_search_books_ignores_fts_syntax(self):
+        response = self.client.get(BOOK_URL, {"search": 'filter" *:'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([book["id"] for book in response.data["results"]], [self.book2.id])
 
     def test_list_books(self):
         result = self.client.get(BOOK_URL)
         books = Book.objects.all()
         serializer = BookListSerializer(books, many=True)
         self.assertEqual(result.status_code, status.HTTP_200_OK)
-        self.assertEqual(result.data, serializer.data)
+        self.assertEqual(result.data["results"], serializer.data)
+
+    def test_list_books_keyset_pagination(self):
+        books = [sample_book(title=f"Paged{number:02}") for number in range(5)]
+        books.append(sample_book(title="Paged00", author="Another Author"))
+        expected = [
+            book.id for book in Book.objects.filter(title__startswith="Paged")
+        ]
+
+        seen = []
+        url = BOOK_URL
+        params = {"title": "paged", "page_size": 2}
+        while url:
+            response = self.client.get(url, params)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertLessEqual(len(response.data["results"]), 2)
+            seen.extend(book["id"] for book in response.data["results"])
+            url, params = response.data["next"], None
+
+        self.assertCountEqual(seen, expected)
+        self.assertEqual(len(seen), len(set(seen)))
+
+    def test_list_books_previous_page(self):
+        for number in range(4):
+            sample_book(title=f"Book{number}")
+        first = self.client.get(BOOK_URL, {"page_size": 2})
+        second = self.client.get(first.data["next"])
+        back = self.client.get(second.data["previous"])
+
+        self.assertIsNone(first.data["previous"])
+        self.assertEqual(back.data["results"], first.data["results"])
+
+    def test_list_books_page_size_is_capped(self):
+        with self.settings(KEYSET_PAGINATION_MAX_PAGE_SIZE=1):
+            response = self.client.get(BOOK_URL, {"page_size": 50})
+        self.assertEqual(len(response.data["results"]), 1)
+
+    def test_list_books_invalid_cursor(self):
+        response = self.client.get(BOOK_URL, {"cursor": "not-a-cursor"})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
 
     def test_retrieve_book(self):
         url = book_detail_url(self.book1.id)
@@ -60,6 +163,109 @@ class UnAuthenticatedBookApiTests(TestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(response.data, serializer.data)
 
+    def test_list_books_served_from_cache(self):
+        first = self.client.get(BOOK_URL, {"title": "Filter"})
+        second = self.client.get(BOOK_URL, {"title": " filter"})
+
+        self.assertEqual(first["X-Cache"], "MISS")
+        self.assertEqual(second["X-Cache"], "HIT")
+        self.assertEqual(first.data, second.data)
+
+    def test_book_change_invalidates_cache(self):
+        self.client.get(book_detail_url(self.book1.id))
+        self.book1.inventory = 1
+        self.book1.save()
+
+        response = self.client.get(book_detail_url(self.book1.id))
+        self.assertEqual(response["X-Cache"], "MISS")
+        self.assertEqual(response.data["inventory"], 1)
+
+    def test_list_books_not_modified(self):
+        first = self.client.get(BOOK_URL)
+        response = self.client.get(BOOK_URL, HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        sample_book(title="NewBook")
+        response = self.client.get(BOOK_URL, HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_retrieve_book_if_modified_since(self):
+        url = book_detail_url(self.book1.id)
+        first = self.client.get(url)
+        response = self.client.get(
+            url, HTTP_IF_MODIFIED_SINCE=first["Last-Modified"]
+        )
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    @mock.patch("book_service.sync.SYNC_LAG", datetime.timedelta(0))
+    def test_changes_feed(self):
+        url = reverse("books:book-changes")
+        full = self.client.get(url)
+        self.assertCountEqual(
+            [book["id"] for book in full.data["changed"]],
+            [self.book1.id, self.book2.id],
+        )
+
+        self.book1.inventory = 5
+        self.book1.save()
+        book2_id = self.book2.id
+        self.book2.delete()
+
+        delta = self.client.get(url, {"since": full.data["token"]})
+        self.assertEqual([book["id"] for book in delta.data["changed"]], [self.book1.id])
+        self.assertEqual(delta.data["deleted"], [book2_id])
+
+        empty = self.client.get(url, {"since": delta.data["token"]})
+        self.assertEqual(empty.data["changed"], [])
+        self.assertEqual(empty.data["deleted"], [])
+
+    def test_changes_feed_waits_for_late_commits(self):
+        url = reverse("books:book-changes")
+        long_ago = timezone.now() - datetime.timedelta(hours=1)
+        Book.objects.update(updated_at=long_ago)
+        first = self.client.get(url)
+        self.assertEqual(len(first.data["changed"]), 2)
+
+        # Stamped before a later write but committed after it was served.
+        recent = timezone.now() - sync.SYNC_LAG / 2
+        Book.objects.filter(pk=self.book2.pk).update(updated_at=recent)
+        self.assertEqual(
+            self.client.get(url, {"since": first.data["token"]}).data["changed"], []
+        )
+        Book.objects.filter(pk=self.book1.pk).update(updated_at=recent)
+
+        lag_later = timezone.now() + sync.SYNC_LAG
+        with mock.patch("book_service.sync.timezone.now", return_value=lag_later):
+            later = self.client.get(url, {"since": first.data["token"]})
+        self.assertCountEqual(
+            [book["id"] for book in later.data["changed"]],
+            [self.book1.id, self.book2.id],
+        )
+
+    def test_changes_feed_pages_tombstones(self):
+        long_ago = timezone.now() - datetime.timedelta(hours=1)
+        BookDeletion.objects.bulk_create(
+            BookDeletion(book_id=book_id) for book_id in range(1000, 1005)
+        )
+        BookDeletion.objects.update(deleted_at=long_ago)
+        Book.objects.update(updated_at=long_ago)
+
+        deleted, token, pages = [], None, 0
+        while True:
+            changes = sync.get_changes(token, limit=2)
+            self.assertLessEqual(len(changes["deleted"]), 2)
+            deleted += changes["deleted"]
+            token, pages = changes["token"], pages + 1
+            if not changes["has_more"]:
+                break
+
+        self.assertEqual(deleted, list(range(1000, 1005)))
+        self.assertEqual(pages, 3)
+
+    def test_changes_feed_invalid_token(self):
+        response = self.client.get(reverse("books:book-changes"), {"since": "x"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
     def test_create_book_unauthorized(self):
         payload = {
             "title": "SampleBook15",
@@ -178,8 +384,192 @@ class AdminAirplaneApiTests(TestCase):
         for key in payload:
             self.assertEqual(payload[key], getattr(book, key))
 
+    def test_cache_stats(self):
+        cache.clear()
+        self.client.get(BOOK_URL)
+        self.client.get(BOOK_URL)
+
+        response = self.client.get(reverse("books:book-cache-stats"))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["hits"], 1)
+        self.assertEqual(response.data["misses"], 1)
+
     def test_delete_book(self):
         book = sample_book()
         url = book_detail_url(book.id)
         response = self.client.delete(url)
-        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
\ No newline at end of file
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+
+
+class BookImportTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_superuser(
+            "admin@myproject.com", "password"
+        )
+        self.client.force_authenticate(self.user)
+        self.existing = sample_book(title="Dune", author="Frank Herbert", inventory=1)
+
+    def test_concurrently_created_book_is_updated_not_duplicated(self):
+        filter_books = Book.objects.filter
+        calls = []
+
+        def stale_filter(*args, **kwargs):
+            # The first lookup misses "Dune", as if another import had just
+            # inserted it.
+            calls.append(kwargs)
+            if len(calls) == 1:
+                return Book.objects.none()
+            return filter_books(*args, **kwargs)
+
+        rows = [
+            {
+                "title": "Dune",
+                "author": "Frank Herbert",
+                "cover": "Soft",
+                "inventory": 9,
+                "daily_fee": Decimal("1.50"),
+            }
+        ]
+        with mock.patch.object(Book.objects, "filter", stale_filter):
+            self.assertEqual(upsert_batch(rows), (0, 1))
+
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(Book.objects.get(title="Dune").inventory, 9)
+
+    def test_import_csv_upserts_and_reports_errors(self):
+        content = (
+            "title,author,cover,inventory,daily_fee\n"
+            "Dune,Frank Herbert,Soft,7,1.50\n"
+            "Solaris,Stanislaw Lem,hard,3,0.99\n"
+            ",Nobody,Hard,1,1.00\n"
+            "Bad Fee,Someone,Hard,-1,abc\n"
+        )
+        upload = SimpleUploadedFile("catalog.csv", content.encode(), "text/csv")
+        response = self.client.post(
+            reverse("books:book-bulk-import"),
+            {"file": upload, "batch_size": 2},
+            format="multipart",
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["rows"], 4)
+        self.assertEqual(response.data["created"], 1)
+        self.assertEqual(response.data["updated"], 1)
+        self.assertEqual(response.data["failed"], 2)
+        self.assertEqual([error["row"] for error in response.data["errors"]], [3, 4])
+        self.assertEqual(len(response.data["errors"][1]["errors"]), 2)
+
+        self.existing.refresh_from_db()
+        self.assertEqual(self.existing.inventory, 7)
+        self.assertEqual(self.existing.cover, "Soft")
+        self.assertEqual(Book.objects.get(title="Solaris").cover, "Hard")
+
+    def test_import_forbidden_for_regular_user(self):
+        user = get_user_model().objects.create_user("user@myproject.com", "password")
+        self.client.force_authenticate(user)
+        upload = SimpleUploadedFile("catalog.csv", b"title\n", "text/csv")
+        response = self.client.post(
+            reverse("books:book-bulk-import"), {"file": upload}, format="multipart"
+        )
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_import_books_command_jsonl(self):
+        rows = [
+            {
+                "title": "Dune",
+                "author": "Frank Herbert",
+                "cover": "Hard",
+                "inventory": 2,
+                "daily_fee": "2.00",
+            },
+            {
+                "title": "Ubik",
+                "author": "Philip K. Dick",
+                "cover": "Soft",
+                "inventory": 4,
+                "daily_fee": "1.25",
+            },
+        ]
+        stdout, stderr = io.StringIO(), io.StringIO()
+        with tempfile.NamedTemporaryFile("w", suffix=".jsonl") as catalog:
+            catalog.write("\n".join(json.dumps(row) for row in rows) + "\n{oops\n")
+            catalog.flush()
+            call_command("import_books", catalog.name, stdout=stdout, stderr=stderr)
+
+        self.assertIn("1 created, 1 updated, 1 failed", stdout.getvalue())
+        self.assertIn("Row 3", stderr.getvalue())
+        self.assertEqual(Book.objects.count(), 2)
+        self.assertEqual(Book.objects.get(title="Dune").inventory, 2)
+
+
+class InventoryTests(TestCase):
+    def setUp(self):
+        self.book = sample_book(inventory=1)
+        self.user = get_user_model().objects.create_user(
+            "reader@myproject.com", "password"
+        )
+
+    def borrow(self):
+        return Borrowing.objects.create(
+            book_id=self.book,
+            user_id=self.user,
+            expected_return_date=timezone.now().date(),
+        )
+
+    def test_take_copy_never_oversells(self):
+        self.assertTrue(take_copy(self.book.id))
+        self.assertFalse(take_copy(self.book.id))
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.inventory, 0)
+
+        return_copy(self.book.id, count=2)
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.inventory, 2)
+
+    def test_inventory_check_constraint(self):
+        with self.assertRaises(IntegrityError):
+            Book.objects.filter(pk=self.book.id).update(inventory=-1)
+
+    @override_settings(INVENTORY_RESERVATION_TTL=datetime.timedelta(minutes=15))
+    def test_reservation_is_consumed_on_checkout(self):
+        borrowing = self.borrow()
+        self.assertTrue(reserve_copy(borrowing))
+        self.assertFalse(reserve_copy(self.borrow()))
+
+        self.assertTrue(checkout_copy(borrowing))
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.inventory, 0)
+        self.assertFalse(InventoryReservation.objects.exists())
+
+    @override_settings(INVENTORY_RESERVATION_TTL=datetime.timedelta(minutes=15))
+    def test_expired_reservations_are_released(self):
+        reserve_copy(self.borrow())
+        InventoryReservation.objects.update(
+            expires_at=timezone.now() - datetime.timedelta(seconds=1)
+        )
+
+        self.assertEqual(release_expired_reservations(), 1)
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.inventory, 1)
+
+
+class BookQueryBudgetTests(QueryBudgetMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.book = sample_book()
+
+    def add_books(self, count):
+        start = Book.objects.count()
+        Book.objects.bulk_create(
+            Book(title=f"Book {index}", author="Author", inventory=1, daily_fee=1)
+            for index in range(start, start + count)
+        )
+        cache.clear()
+
+    def test_list(self):
+        self.assertQueryBudget(3, lambda: self.client.get(BOOK_URL), grow=self.add_books)
+
+    def test_retrieve(self):
+        self.assertQueryBudget(1, lambda: self.client.get(book_detail_url(self.book.id)))
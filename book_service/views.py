@@ -1,7 +1,16 @@
 from drf_spectacular.utils import extend_schema, OpenApiParameter
-from rest_framework import viewsets
+from rest_framework import status, viewsets
+from rest_framework.decorators import action
+from rest_framework.parsers import MultiPartParser
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+
+from book_service.cache import cache_stats, cached_response
+from book_service.importer import import_books, read_rows, text_stream
 from book_service.models import Book
 from book_service.permissions import IsAdminOrReadOnly
+from book_service.search import search_books
+from book_service.sync import InvalidSyncToken, catalog_last_modified, get_changes
 from book_service.serializers import (
     BookListSerializer,
     BookDetailSerializer,
@@ -10,7 +19,10 @@ from book_service.serializers import (
 
 
 class BookViewSet(viewsets.ModelViewSet):
-    """Provides CRUD functionality for books with additional filtering by title."""
+    """
+    Provides CRUD functionality for books, with a ranked full-text search
+    and a substring title filter.
+    """
 
     queryset = Book.objects.all()
     serializer_class = BookSerializer
@@ -19,11 +31,16 @@ class BookViewSet(viewsets.ModelViewSet):
     def get_queryset(self):
         """Receive the books with filters"""
         title = self.request.query_params.get("title")
+        search = self.request.query_params.get("search")
         queryset = self.queryset
 
+        # With both, the title only narrows the results and `search` ranks
+        # them, so the two orderings don't compete.
         if title:
-            queryset = queryset.filter(title__icontains=title)
-        return queryset.distinct()
+            queryset = search_books(queryset, title, fields=("title",), rank=not search)
+        if search:
+            queryset = search_books(queryset, search)
+        return queryset
 
     def get_serializer_class(self):
         if self.action == "list":
@@ -39,7 +56,130 @@ class BookViewSet(viewsets.ModelViewSet):
                 type=str,
                 description="Filter by title(ex. ?title=Witcher)",
             ),
+            OpenApiParameter(
+                "search",
+                type=str,
+                description=(
+                    "Ranked search by title and author(ex. ?search=sapkowski)"
+                ),
+            ),
         ]
     )
     def list(self, request, *args, **kwargs):
-        return super().list(request, *args, **kwargs)
+        return cached_response(
+            request,
+            "list",
+            lambda: super(BookViewSet, self).list(request, *args, **kwargs),
+            last_modified=catalog_last_modified,
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        return cached_response(
+            request,
+            "retrieve",
+            lambda: super(BookViewSet, self).retrieve(request, *args, **kwargs),
+            pk=kwargs.get("pk"),
+            last_modified=lambda: self.get_object().updated_at,
+        )
+
+    def get_object(self):
+        # A cache miss needs the book twice, to render and for Last-Modified.
+        if not hasattr(self, "_object"):
+            self._object = super().get_object()
+        return self._object
+
+    @extend_schema(
+        parameters=[
+            OpenApiParameter(
+                "since",
+                type=str,
+                description="Token returned by the previous sync, omit for a full sync",
+            ),
+        ]
+    )
+    @action(methods=["GET"], detail=False, url_path="changes")
+    def changes(self, request):
+        """
+        Delta-sync feed of the catalog.
+
+        Returns books created or changed and ids of books deleted since the
+        `since` token, plus the token to use next time. Keep calling with the
+        new token while `has_more` is true.
+        """
+        try:
+            changes = get_changes(request.query_params.get("since"))
+        except InvalidSyncToken as error:
+            return Response({"error": str(error)}, status=status.HTTP_400_BAD_REQUEST)
+
+        changes["changed"] = BookListSerializer(changes["changed"], many=True).data
+        return Response(changes)
+
+    @action(
+        methods=["GET"],
+        detail=False,
+        url_path="cache-stats",
+        permission_classes=[IsAdminUser],
+    )
+    def cache_stats(self, request):
+        """Hit/miss counters of the book response cache."""
+        return Response(cache_stats())
+
+    @extend_schema(
+        request={
+            "multipart/form-data": {
+                "type": "object",
+                "properties": {
+                    "file": {"type": "string", "format": "binary"},
+                    "format": {"type": "string", "enum": ["csv", "jsonl"]},
+                    "batch_size": {"type": "integer"},
+                },
+            }
+        },
+    )
+    @action(
+        methods=["POST"],
+        detail=False,
+        url_path="import",
+        permission_classes=[IsAdminUser],
+        parser_classes=[MultiPartParser],
+    )
+    def bulk_import(self, request):
+        """
+        Bulk upsert books from an uploaded CSV or JSONL file.
+
+        Rows are matched on (title, author). Invalid rows are reported
+        without aborting the rest of the import.
+        """
+        upload = request.FILES.get("file")
+        if upload is None:
+            return Response(
+                {"error": "A CSV or JSONL file is required."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        file_format = request.data.get("format") or upload.name.rsplit(".", 1)[-1]
+        if file_format not in ("csv", "jsonl"):
+            return Response(
+                {"error": "Format must be csv or jsonl."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        try:
+            batch_size = max(1, int(request.data.get("batch_size", 1000)))
+        except ValueError:
+            return Response(
+                {"error": "batch_size must be an integer."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        try:
+            report = import_books(
+                read_rows(text_stream(upload.file), file_format),
+                batch_size=batch_size,
+            )
+        except UnicodeDecodeError:
+            return Response(
+                {"error": "The file must be UTF-8 encoded."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        return Response(report.as_dict(), status=status.HTTP_200_OK)
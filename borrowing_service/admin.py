@@ -1,6 +1,6 @@
 from django.contrib import admin
 
-from borrowing_service.models import Borrowing
+from borrowing_service.models import Borrowing, OverdueReminder
 
 
 @admin.register(Borrowing)
@@ -14,3 +14,10 @@ class BookAdmin(admin.ModelAdmin):
         "user_id",
     )
     list_filter = ("expected_return_date", "book_id", "user_id")
+
+
+@admin.register(OverdueReminder)
+class OverdueReminderAdmin(admin.ModelAdmin):
+    list_display = ("borrowing", "level", "last_notified_at")
+    list_filter = ("level",)
+    raw_id_fields = ("borrowing",)
@@ -0,0 +1,29 @@
+# Generated by Django 4.0.4 on 2026-10-18 06:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("borrowing_service", "0002_alter_borrowing_options_alter_borrowing_book_id"),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name="borrowing",
+            options={"ordering": ("-borrow_date", "id")},
+        ),
+        migrations.AddIndex(
+            model_name="borrowing",
+            index=models.Index(
+                fields=["-borrow_date", "id"], name="borrowing_date_id_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="borrowing",
+            index=models.Index(
+                fields=["user_id", "-borrow_date", "id"],
+                name="borrowing_user_date_id_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 4.0.4 on 2026-10-18 06:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("borrowing_service", "0003_alter_borrowing_options_and_more"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="borrowing",
+            index=models.Index(
+                condition=models.Q(("actual_return__isnull", True)),
+                fields=["expected_return_date"],
+                name="borrowing_overdue_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 4.0.4 on 2026-10-18 07:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("borrowing_service", "0004_borrowing_borrowing_overdue_idx"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="borrowing",
+            name="updated_at",
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+        migrations.AddIndex(
+            model_name="borrowing",
+            index=models.Index(fields=["actual_return"], name="borrowing_returned_idx"),
+        ),
+    ]
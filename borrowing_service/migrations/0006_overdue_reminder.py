@@ -0,0 +1,37 @@
+# Generated by Django 4.0.4 on 2026-10-18 07:36
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("borrowing_service", "0005_borrowing_updated_at"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="OverdueReminder",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("level", models.PositiveSmallIntegerField(default=0)),
+                ("last_notified_at", models.DateTimeField()),
+                (
+                    "borrowing",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="overdue_reminder",
+                        to="borrowing_service.borrowing",
+                    ),
+                ),
+            ],
+        ),
+    ]
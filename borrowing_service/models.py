@@ -16,9 +16,44 @@ class Borrowing(models.Model):
         on_delete=models.CASCADE,
         related_name="borrowings",
     )
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
     class Meta:
-        ordering = ("-borrow_date",)
+        ordering = ("-borrow_date", "id")
+        indexes = [
+            models.Index(
+                fields=["-borrow_date", "id"], name="borrowing_date_id_idx"
+            ),
+            models.Index(
+                fields=["user_id", "-borrow_date", "id"],
+                name="borrowing_user_date_id_idx",
+            ),
+            models.Index(
+                fields=["expected_return_date"],
+                condition=models.Q(actual_return__isnull=True),
+                name="borrowing_overdue_idx",
+            ),
+            models.Index(fields=["actual_return"], name="borrowing_returned_idx"),
+        ]
 
     def __str__(self):
         return f"Borrowing of {self.user_id.email} on {self.borrow_date}"
+
+
+class OverdueReminder(models.Model):
+    """
+    What the user was last told about an overdue borrowing.
+
+    Created with the first reminder, then moved along with each digest so
+    the overdue check only messages users when something changed or a
+    reminder is due again.
+    """
+
+    borrowing = models.OneToOneField(
+        Borrowing, on_delete=models.CASCADE, related_name="overdue_reminder"
+    )
+    level = models.PositiveSmallIntegerField(default=0)
+    last_notified_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"Level {self.level} reminder for borrowing {self.borrowing_id}"
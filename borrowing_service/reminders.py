@@ -0,0 +1,209 @@
+from collections import namedtuple
+from datetime import timedelta
+from itertools import groupby, islice
+
+from django.db import transaction
+from django.utils import timezone
+
+from borrowing_service.models import Borrowing, OverdueReminder
+from notifications import outbox
+from payment_service.pricing import fee_cents_expression, fine_cents, from_cents
+
+OVERDUE_CHUNK_SIZE = 2000
+DIGEST_BATCH_SIZE = 500
+DIGEST_MAX_BOOKS = 20
+
+# (days overdue, reminder repeated every): the gentle level-1 reminder is
+# repeated weekly, and more than a month late it comes every 3 days.
+ESCALATION = (
+    (1, timedelta(days=7)),
+    (7, timedelta(days=7)),
+    (30, timedelta(days=3)),
+)
+# No user gets two digests closer than this, whatever changed in between.
+QUIET_PERIOD = timedelta(hours=20)
+
+LEVEL_INTROS = {
+    1: "A friendly reminder: these books are past their return date at BuzzingPages:",
+    2: "These books are more than a week overdue at BuzzingPages, "
+    "and their fines grow every day:",
+    3: "These books are more than a month overdue at BuzzingPages. "
+    "Please return them as soon as possible to stop the fines from growing:",
+}
+
+OverdueBook = namedtuple(
+    "OverdueBook",
+    "borrowing_id reminder_id title expected_return_date days_overdue "
+    "fine_cents level last_notified_at",
+)
+
+
+def escalation_level(days_overdue):
+    return sum(1 for days, _ in ESCALATION if days_overdue >= days)
+
+
+def overdue_users(today):
+    """
+    Stream (user_id, chat_id, telegram_username, [OverdueBook]) per user
+    with overdue borrowings.
+
+    One server-side cursor over a single query joined with `Notification`
+    and the reminder state, served by the partial `borrowing_overdue_idx`
+    index. Fines are what the user would pay if they returned the book
+    today.
+
+    Args:
+    - today (date): Borrowings expected back before this are overdue.
+    """
+    rows = (
+        Borrowing.objects.filter(
+            expected_return_date__lt=today, actual_return__isnull=True
+        )
+        .annotate(fee_cents=fee_cents_expression())
+        .order_by("user_id", "expected_return_date", "id")
+        .values_list(
+            "user_id",
+            "user_id__notification__chat_id",
+            "user_id__notification__telegram_username",
+            "id",
+            "overdue_reminder__id",
+            "book_id__title",
+            "expected_return_date",
+            "fee_cents",
+            "overdue_reminder__level",
+            "overdue_reminder__last_notified_at",
+        )
+        .iterator(chunk_size=OVERDUE_CHUNK_SIZE)
+    )
+    for user, borrowings in groupby(rows, key=lambda row: row[:3]):
+        books = []
+        for row in borrowings:
+            (
+                borrowing_id,
+                reminder_id,
+                title,
+                expected_return,
+                fee,
+                level,
+                last_notified_at,
+            ) = row[3:]
+            books.append(
+                OverdueBook(
+                    borrowing_id,
+                    reminder_id,
+                    title,
+                    expected_return,
+                    (today - expected_return).days,
+                    fine_cents(fee, expected_return, today),
+                    level or 0,
+                    last_notified_at,
+                )
+            )
+        yield (*user, books)
+
+
+def is_due(books, now):
+    """
+    Whether a user should get a digest about their overdue books.
+
+    Only when a book became overdue, reached a higher escalation level or
+    has its reminder due again, and never within `QUIET_PERIOD` of the
+    previous digest.
+    """
+    notified = [book.last_notified_at for book in books if book.last_notified_at]
+    if notified and now - max(notified) < QUIET_PERIOD:
+        return False
+    for book in books:
+        level = escalation_level(book.days_overdue)
+        if (
+            book.last_notified_at is None
+            or level > book.level
+            or now - book.last_notified_at >= ESCALATION[level - 1][1]
+        ):
+            return True
+    return False
+
+
+def build_digest(telegram_username, books):
+    """
+    One message listing all overdue books of a user with their fines.
+
+    Returns:
+    - str: The message, worded for the highest escalation level reached.
+    """
+    level = max(escalation_level(book.days_overdue) for book in books)
+    lines = [
+        f"   - '{book.title}': due {book.expected_return_date}, "
+        f"{book.days_overdue} day{'s' if book.days_overdue != 1 else ''} late, "
+        f"fine so far {from_cents(book.fine_cents)}$"
+        for book in books[:DIGEST_MAX_BOOKS]
+    ]
+    if len(books) > DIGEST_MAX_BOOKS:
+        lines.append(f"   - and {len(books) - DIGEST_MAX_BOOKS} more")
+    total = from_cents(sum(book.fine_cents for book in books))
+    return (
+        f"Hello {telegram_username}! 📚⏰\n\n"
+        f"{LEVEL_INTROS[level]}\n\n" + "\n".join(lines) + "\n\n"
+        f"Fines accrued so far: {total}$\n"
+        f"If you've already returned them, please accept our apologies. 🙏📚"
+    )
+
+
+def record_digests(digests, now):
+    """
+    Queue the digests and move their borrowings' reminder state, together.
+
+    Args:
+    - digests (list): (chat_id, text, [OverdueBook]) items.
+    """
+    reminders, new_reminders = [], []
+    for _, _, books in digests:
+        for book in books:
+            reminder = OverdueReminder(
+                id=book.reminder_id,
+                borrowing_id=book.borrowing_id,
+                level=escalation_level(book.days_overdue),
+                last_notified_at=now,
+            )
+            (reminders if book.reminder_id else new_reminders).append(reminder)
+
+    with transaction.atomic():
+        outbox.enqueue_many(
+            ((chat_id, text) for chat_id, text, _ in digests), kind="overdue_digest"
+        )
+        OverdueReminder.objects.bulk_create(new_reminders)
+        OverdueReminder.objects.bulk_update(reminders, ["level", "last_notified_at"])
+
+
+def send_overdue_digests(now=None, batch_size=DIGEST_BATCH_SIZE):
+    """
+    Queue one digest per overdue user whose reminder is due.
+
+    Returns:
+    - dict: Borrowing, user and digest counts.
+    """
+    now = now or timezone.now()
+    stats = {
+        "borrowings": 0,
+        "users": 0,
+        "without_telegram": 0,
+        "digests": 0,
+        "suppressed": 0,
+    }
+
+    users = overdue_users(now.date())
+    while batch := list(islice(users, batch_size)):
+        digests = []
+        for _, chat_id, username, books in batch:
+            stats["borrowings"] += len(books)
+            stats["users"] += 1
+            if chat_id is None:
+                stats["without_telegram"] += 1
+            elif is_due(books, now):
+                digests.append((chat_id, build_digest(username, books), books))
+            else:
+                stats["suppressed"] += 1
+        if digests:
+            record_digests(digests, now)
+            stats["digests"] += len(digests)
+    return stats
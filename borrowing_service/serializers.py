@@ -1,18 +1,18 @@
-import os
+from decimal import Decimal
 
-import stripe
 from django.db import transaction
 from rest_framework import serializers
 from django.utils import timezone
 
 from dotenv import load_dotenv
 
-from book_service.models import Book
+from book_service.inventory import reservations_enabled, reserve_copy
 from book_service.serializers import BookSerializer
 from borrowing_service.models import Borrowing
 from payment_service.models import Payment
+from payment_service.outbox import schedule_checkout_session
 from payment_service.serializers import PaymentListSerializer
-from payment_service.stripe_helper import create_initial_session
+from payment_service.stripe_helper import checkout_urls, initial_payment_amount
 from user.serializers import UserSerializer
 
 load_dotenv()
@@ -29,12 +29,13 @@ class BorrowingSerializer(serializers.ModelSerializer):
     def validate(self, data):
         super().validate(data)
 
-        book_id = data["book_id"].id
-        book = Book.objects.get(pk=book_id)
+        book = data["book_id"]
 
         expected_return_date = data["expected_return_date"]
         current_time = timezone.now()
 
+        # Fast path only: the copy is actually taken with an atomic
+        # conditional UPDATE on reservation or payment, not here.
         if book.inventory < 1:
             raise serializers.ValidationError(
                 "This book is not available for borrowing now"
@@ -48,13 +49,11 @@ class BorrowingSerializer(serializers.ModelSerializer):
 
     @transaction.atomic
     def create(self, validated_data):
-        stripe.api_key = os.environ.get("STRIPE_SECRET_API_KEY")
-
         user = self.context["request"].user
         validated_data["user_id"] = user
 
         unpaid_payments = Payment.objects.filter(
-            borrowing__user_id=user,
+            user=user,
             status=Payment.StatusChoices.PENDING,
         )
         if unpaid_payments.exists():
@@ -62,15 +61,28 @@ class BorrowingSerializer(serializers.ModelSerializer):
 
         borrowing = Borrowing.objects.create(**validated_data)
 
-        session = create_initial_session(borrowing, self.context["request"])
+        if reservations_enabled() and not reserve_copy(borrowing):
+            raise serializers.ValidationError(
+                "This book is not available for borrowing now"
+            )
 
-        Payment.objects.create(
+        # The Stripe session is opened by a worker after commit, so this
+        # transaction never waits on the network. Clients poll
+        # `borrowings/<id>/checkout/` for the session URL.
+        unit_amount = initial_payment_amount(borrowing)
+        payment = Payment.objects.create(
             status=Payment.StatusChoices.PENDING,
             type=Payment.TypeChoices.PAYMENT,
             borrowing=borrowing,
-            session_url=session.url,
-            session_id=session.id,
-            money_to_pay=session.amount_total / 100,
+            session_url="",
+            session_id="",
+            money_to_pay=Decimal(unit_amount) / 100,
+        )
+        schedule_checkout_session(
+            payment,
+            borrowing.book_id.title,
+            unit_amount,
+            *checkout_urls(borrowing, self.context["request"]),
         )
 
         return borrowing
@@ -1,12 +1,12 @@
 from django.db.models.signals import post_save
 from django.dispatch import receiver
+from django.utils import timezone
 
 from borrowing_service.models import Borrowing
-from notifications.models import Notification
 from payment_service.models import Payment
 from notifications.messages import (
     send_user_payment_message,
-    send_admin_borrowing_message
+    send_admin_borrowing_message,
 )
 
 
@@ -15,10 +15,11 @@ def send_payment_message_user(sender, instance, created, **kwargs):
     """
     Signal receiver function triggered after a Payment object is saved.
 
-    This function sends a notification message to the user via Telegram
-    when a new Payment object is created. It fetches borrowing details related
-    to the payment, generates a short payment URL using pyshorteners, and sends
-    a formatted notification message including borrowing information and payment link.
+    This function queues a Telegram notification for the user once a
+    Payment has its checkout session URL, either on creation or when the
+    checkout session outbox fills it in later. The message, with the
+    borrowing details and a short payment link, is written to the
+    notification outbox in the same transaction and sent afterwards.
 
     Args:
     - sender: The sender of the signal.
@@ -29,15 +30,35 @@ def send_payment_message_user(sender, instance, created, **kwargs):
     Returns:
     - None
     """
-    if created:
+    update_fields = kwargs.get("update_fields") or ()
+    if (created and instance.session_url) or "session_url" in update_fields:
         if instance.type == "Payment":
-            try:
-                send_user_payment_message(instance)
-            except Notification.DoesNotExist:
-                print("No such user in Telegram.")
+            send_user_payment_message(instance)
 
 
 @receiver(post_save, sender=Borrowing)
 def send_borrow_message_admin(sender, instance, created, **kwargs):
+    """Queue the admins' Telegram notification about a new borrowing."""
     if created:
         send_admin_borrowing_message(instance)
+
+
+@receiver(post_save, sender=Borrowing)
+def sync_payment_user_and_borrow_date(sender, instance, created, **kwargs):
+    """
+    Keep the user and borrow date copied onto the borrowing's payments
+    in sync when they change on the borrowing.
+    """
+    update_fields = kwargs.get("update_fields")
+    if created or (
+        update_fields is not None
+        and not {"user_id", "borrow_date"} & set(update_fields)
+    ):
+        return
+    Payment.objects.filter(borrowing=instance).exclude(
+        user_id=instance.user_id_id, borrow_date=instance.borrow_date
+    ).update(
+        user_id=instance.user_id_id,
+        borrow_date=instance.borrow_date,
+        updated_at=timezone.now(),
+    )
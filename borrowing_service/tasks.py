@@ -1,28 +1,33 @@
-from borrowing_service.models import Borrowing
+import logging
+import time
+
+from borrowing_service.reminders import send_overdue_digests
 
 from celery import Celery
 from celery import shared_task
-from django.utils import timezone
-
-from notifications.messages import notify_overdue_borrowing
-
 
 app = Celery("tasks", backend="redis://localhost", broker="redis://localhost")
 
+logger = logging.getLogger(__name__)
+
 
 @shared_task
 def check_borrowings_overdue():
     """
-    Asynchronous task to check for overdue borrowings and notify users.
+    Asynchronous task to remind users about their overdue borrowings.
+
+    Each user with overdue borrowings gets at most one digest listing all
+    of them with the fines accrued so far, and only when one became overdue,
+    escalated or is due for a repeat reminder (see
+    `borrowing_service.reminders`). Digests are queued in the notification
+    outbox together with the reminder state, so a crash never sends them
+    twice or loses them.
 
-    This function retrieves borrowings with an `expected_return_date` in the past
-    and no actual return date set. It then notifies users about these overdue borrowings.
+    Returns:
+    - dict: Run duration and counts, also logged.
     """
-    current_date = timezone.now().date()
-    borrowings = list(
-        Borrowing.objects.filter(
-            expected_return_date__lt=current_date, actual_return__isnull=True
-        ).values()
-    )
-    for borrowing in borrowings:
-        notify_overdue_borrowing(borrowing["user_id_id"])
+    started = time.perf_counter()
+    stats = send_overdue_digests()
+    stats["duration_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    logger.info("Overdue borrowings scan finished: %s", stats)
+    return stats
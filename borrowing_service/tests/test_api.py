@@ -1,23 +1,24 @@
-import os
+import datetime
+from unittest import mock
 
 import stripe
+from django.test import override_settings
 from django.utils import timezone
 
 from django.urls import reverse
 from django.test import TestCase
-from dotenv import load_dotenv
 from rest_framework.test import APIClient
 from rest_framework import status
 from django.contrib.auth import get_user_model
 from borrowing_service.models import Borrowing
-from book_service.models import Book
+from book_service.models import Book, InventoryReservation
+from payment_service.models import Payment
+from payment_service.stripe_helper import create_fine_session
 from borrowing_service.serializers import (
     BorrowingListSerializer,
     BorrowingDetailSerializer,
 )
 
-load_dotenv()
-
 BORROWING_URL = reverse("borrowings:borrowing-list")
 
 
@@ -52,7 +53,7 @@ class AuthenticatedBorrowingApiTest(TestCase):
             daily_fee=10.03,
         )
         self.book2 = Book.objects.create(
-            title="testbook",
+            title="testbook2",
             author="testauthor",
             cover="HARD",
             inventory=0,
@@ -75,8 +76,8 @@ class AuthenticatedBorrowingApiTest(TestCase):
         response = self.client.get(BORROWING_URL)
         serializer1 = BorrowingListSerializer(self.borrowing1)
         serializer2 = BorrowingListSerializer(self.borrowing2)
-        self.assertIn(serializer1.data, response.data)
-        self.assertNotIn(serializer2.data, response.data)
+        self.assertIn(serializer1.data, response.data["results"])
+        self.assertNotIn(serializer2.data, response.data["results"])
 
     def test_create_borrowing(self):
         payload = {
@@ -84,10 +85,30 @@ class AuthenticatedBorrowingApiTest(TestCase):
             "book_id": self.book.id,
         }
         response = self.client.post(BORROWING_URL, payload)
-        book = Book.objects.first()
+        self.book.refresh_from_db()
         self.assertEqual(response.status_code, status.HTTP_201_CREATED)
-        self.assertEqual(book.inventory, 2)
         self.assertEqual(response.data["user_id"], self.user1.id)
+        # The copy is only taken once the payment succeeds.
+        self.assertEqual(self.book.inventory, 3)
+        payment = Payment.objects.get(borrowing_id=response.data["id"])
+        self.assertEqual(payment.status, Payment.StatusChoices.PENDING)
+        self.assertEqual(payment.session_id, "")
+
+    @override_settings(INVENTORY_RESERVATION_TTL=datetime.timedelta(minutes=30))
+    def test_create_borrowing_reserves_a_copy(self):
+        payload = {
+            "expected_return_date": timezone.now().date(),
+            "book_id": self.book.id,
+        }
+        response = self.client.post(BORROWING_URL, payload)
+        self.book.refresh_from_db()
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(self.book.inventory, 2)
+        self.assertTrue(
+            InventoryReservation.objects.filter(
+                borrowing_id=response.data["id"]
+            ).exists()
+        )
 
     def test_create_borrowing_with_invalid_date(self):
         payload = {
@@ -151,27 +172,27 @@ class AdminBorrowingApiTest(TestCase):
         response = self.client.get(BORROWING_URL)
         serializer = BorrowingListSerializer(self.borrowing1)
 
-        self.assertIn(serializer.data, response.data)
+        self.assertIn(serializer.data, response.data["results"])
 
     def test_filter_borrowing_by_user_id(self):
         response = self.client.get(BORROWING_URL, {"user_id": self.user2.id})
         serializer1 = BorrowingListSerializer(self.borrowing1)
         serializer2 = BorrowingListSerializer(self.borrowing2)
 
-        self.assertIn(serializer1.data, response.data)
-        self.assertNotIn(serializer2.data, response.data)
+        self.assertIn(serializer1.data, response.data["results"])
+        self.assertNotIn(serializer2.data, response.data["results"])
 
     def test_filter_borrowing_by_is_active(self):
         response = self.client.get(BORROWING_URL, {"is_active": True})
         serializer1 = BorrowingListSerializer(self.borrowing1)
         serializer2 = BorrowingListSerializer(self.borrowing2)
 
-        self.assertIn(serializer1.data, response.data)
-        self.assertNotIn(serializer2.data, response.data)
+        self.assertIn(serializer1.data, response.data["results"])
+        self.assertNotIn(serializer2.data, response.data["results"])
 
     def test_return_book(self):
-        stripe.api_key = os.environ.get("STRIPE_SECRET_API_KEY")
-
+        self.borrowing1.expected_return_date = timezone.now().date()
+        self.borrowing1.save()
         inventory = self.book.inventory
         response = self.client.post(f"/api/borrowings/{self.borrowing1.id}/return/")
 
@@ -183,12 +204,85 @@ class AdminBorrowingApiTest(TestCase):
         self.assertTrue(self.borrowing1.actual_return)
         self.assertEqual(self.book.inventory, inventory + 1)
 
+    def test_concurrent_returns_put_the_copy_back_once(self):
+        self.borrowing1.expected_return_date = timezone.now().date()
+        self.borrowing1.save()
+        inventory = self.book.inventory
+        # Both requests loaded the borrowing before either returned it.
+        stale = Borrowing.objects.get(pk=self.borrowing1.pk)
+        url = f"/api/borrowings/{self.borrowing1.id}/return/"
+
+        first = self.client.post(url)
+        with mock.patch(
+            "borrowing_service.views.BorrowingViewSet.get_object", return_value=stale
+        ):
+            second = self.client.post(url)
+
+        self.assertEqual(first.status_code, status.HTTP_200_OK)
+        self.assertEqual(second.status_code, status.HTTP_400_BAD_REQUEST)
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.inventory, inventory + 1)
+
+    @mock.patch("borrowing_service.views.create_fine_session")
+    def test_return_overdue_book_asks_for_the_fine(self, create_fine_session):
+        create_fine_session.return_value = stripe.checkout.Session.construct_from(
+            {
+                "url": "https://checkout.test/fine",
+                "id": "cs_fine",
+                "amount_total": 1500,
+                "expires_at": int(timezone.now().timestamp()) + 3600,
+            },
+            "sk_test",
+        )
+        self.borrowing1.expected_return_date = "2023-10-25"
+        self.borrowing1.save()
+        inventory = self.book.inventory
+
+        response = self.client.post(f"/api/borrowings/{self.borrowing1.id}/return/")
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.inventory, inventory)
+        fine = Payment.objects.get(borrowing=self.borrowing1)
+        self.assertEqual(fine.type, Payment.TypeChoices.FINE)
+        self.assertEqual(fine.session_id, "cs_fine")
+
+    @mock.patch("borrowing_service.views.create_fine_session")
+    def test_return_overdue_book_when_stripe_refuses(self, create_fine_session):
+        create_fine_session.side_effect = stripe.error.IdempotencyError("Key reused")
+        self.borrowing1.expected_return_date = "2023-10-25"
+        self.borrowing1.save()
+
+        response = self.client.post(f"/api/borrowings/{self.borrowing1.id}/return/")
+
+        self.assertEqual(response.status_code, status.HTTP_502_BAD_GATEWAY)
+        self.borrowing1.refresh_from_db()
+        self.assertIsNone(self.borrowing1.actual_return)
+        self.assertFalse(Payment.objects.filter(borrowing=self.borrowing1).exists())
+
+    @mock.patch("payment_service.stripe_helper.get_gateway")
+    def test_fine_retried_on_a_later_day_gets_a_new_key(self, get_gateway):
+        create = get_gateway.return_value.create_checkout_session
+        self.borrowing1.expected_return_date = datetime.date(2023, 10, 25)
+        request = mock.Mock(build_absolute_uri=lambda url: url)
+        keys = []
+        for day in (26, 27, 27):
+            self.borrowing1.actual_return = datetime.date(2023, 10, day)
+            create_fine_session(self.borrowing1, request)
+            keys.append(create.call_args.kwargs["idempotency_key"])
+
+        self.assertNotEqual(keys[0], keys[1])
+        self.assertEqual(keys[1], keys[2])
+
     def test_return_already_returned_book(self):
         self.borrowing1.actual_return = timezone.now().date()
         self.borrowing1.save()
         response = self.client.post(f"/api/borrowings/{self.borrowing1.id}/return/")
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
         self.assertEqual(
-            response.data, {"error": "You already have a link to pay the fine or have successfully "
-                                     "returned the book"}
+            response.data,
+            {
+                "error": "You already have a link to pay the fine or have successfully "
+                "returned the book"
+            },
         )
@@ -0,0 +1,83 @@
+import datetime
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from book_service.models import Book
+from borrowing_service.models import Borrowing
+from config.testing import QueryBudgetMixin
+from payment_service.models import Payment
+
+
+@mock.patch("borrowing_service.signals.send_admin_borrowing_message")
+class BorrowingQueryBudgetTests(QueryBudgetMixin, TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email="test@user.com", password="testpass", is_staff=True
+        )
+        self.client.force_authenticate(self.user)
+        self.book = Book.objects.create(
+            title="Test Book",
+            author="Test Author",
+            cover=Book.CoverChoices.HARD,
+            inventory=100,
+            daily_fee=1,
+        )
+        self.borrowing = self.borrow(self.user)
+
+    def borrow(self, user):
+        return Borrowing.objects.create(
+            book_id=self.book,
+            user_id=user,
+            expected_return_date=datetime.date.today(),
+        )
+
+    def add_borrowings(self, count):
+        for _ in range(count):
+            user = get_user_model().objects.create_user(
+                email=f"user{Borrowing.objects.count()}@user.com",
+                password="testpass",
+            )
+            self.borrow(user)
+
+    def add_payments(self, count):
+        Payment.objects.bulk_create(
+            Payment(
+                status=Payment.StatusChoices.PAID,
+                type=Payment.TypeChoices.PAYMENT,
+                borrowing=self.borrowing,
+                session_url="http://testurl.com",
+                session_id="cs_test",
+                money_to_pay=0,
+            )
+            for _ in range(count)
+        )
+
+    def test_list(self, _):
+        self.assertQueryBudget(
+            1,
+            lambda: self.client.get(reverse("borrowings:borrowing-list")),
+            grow=self.add_borrowings,
+        )
+
+    def test_retrieve(self, _):
+        self.assertQueryBudget(
+            2,
+            lambda: self.client.get(
+                reverse("borrowings:borrowing-detail", args=[self.borrowing.id])
+            ),
+            grow=self.add_payments,
+        )
+
+    def test_checkout(self, _):
+        self.assertQueryBudget(
+            2,
+            lambda: self.client.get(
+                reverse("borrowings:borrowing-checkout", args=[self.borrowing.id])
+            ),
+            grow=self.add_payments,
+        )
@@ -0,0 +1,135 @@
+import datetime
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.utils import timezone
+
+from book_service.models import Book
+from borrowing_service import reminders
+from borrowing_service.models import Borrowing, OverdueReminder
+from borrowing_service.reminders import send_overdue_digests
+from borrowing_service.tasks import check_borrowings_overdue
+from notifications.models import Notification, NotificationOutbox
+
+
+class CheckBorrowingsOverdueTests(TestCase):
+    def setUp(self):
+        self.book = Book.objects.create(
+            title="testbook",
+            author="testauthor",
+            cover="Hard",
+            inventory=3,
+            daily_fee=1,
+        )
+        self.past = timezone.now().date() - datetime.timedelta(days=3)
+
+    def borrow(self, user, expected_return_date, actual_return=None):
+        return Borrowing.objects.create(
+            book_id=self.book,
+            user_id=user,
+            expected_return_date=expected_return_date,
+            actual_return=actual_return,
+        )
+
+    def create_user(self, email, chat_id=None):
+        user = get_user_model().objects.create_user(email, "testpassword")
+        if chat_id:
+            Notification.objects.create(
+                user=user, chat_id=chat_id, telegram_username=email
+            )
+        return user
+
+    def digests(self):
+        return list(
+            NotificationOutbox.objects.filter(kind="overdue_digest")
+            .order_by("id")
+            .values_list("chat_id", "text")
+        )
+
+    def test_one_digest_per_user_with_fines(self):
+        reader = self.create_user("reader@user.com", chat_id=101)
+        other = self.create_user("other@user.com", chat_id=102)
+        offline = self.create_user("offline@user.com")
+
+        for _ in range(3):
+            self.borrow(reader, self.past)
+        self.borrow(other, self.past)
+        self.borrow(other, self.past, actual_return=self.past)
+        self.borrow(other, timezone.now().date() + datetime.timedelta(days=1))
+        self.borrow(offline, self.past)
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            stats = check_borrowings_overdue()
+
+        digests = dict(self.digests())
+        self.assertEqual(sorted(digests), [101, 102])
+        self.assertEqual(digests[101].count("'testbook': due"), 3)
+        self.assertIn("3 days late, fine so far 4.5$", digests[101])
+        self.assertIn("Fines accrued so far: 13.5$", digests[101])
+        self.assertIn("Fines accrued so far: 4.5$", digests[102])
+        self.assertEqual(len(callbacks), 1)
+        self.assertEqual(stats["borrowings"], 5)
+        self.assertEqual(stats["users"], 3)
+        self.assertEqual(stats["without_telegram"], 1)
+        self.assertEqual(stats["digests"], 2)
+        self.assertIn("duration_ms", stats)
+        self.assertEqual(
+            set(OverdueReminder.objects.values_list("level", flat=True)), {1}
+        )
+
+    def test_repeated_runs_are_suppressed(self):
+        reader = self.create_user("reader@user.com", chat_id=101)
+        self.borrow(reader, self.past)
+
+        send_overdue_digests()
+        stats = send_overdue_digests()
+
+        self.assertEqual(stats["suppressed"], 1)
+        self.assertEqual(len(self.digests()), 1)
+
+    def test_new_overdue_book_is_reported_after_the_quiet_period(self):
+        reader = self.create_user("reader@user.com", chat_id=101)
+        self.borrow(reader, self.past)
+        now = timezone.now()
+        send_overdue_digests(now)
+        self.borrow(reader, now.date() - datetime.timedelta(days=1))
+
+        send_overdue_digests(now + datetime.timedelta(hours=1))
+        self.assertEqual(len(self.digests()), 1)
+        send_overdue_digests(now + datetime.timedelta(hours=21))
+        self.assertEqual(len(self.digests()), 2)
+        self.assertEqual(self.digests()[1][1].count("'testbook': due"), 2)
+
+    def test_a_month_of_daily_runs(self):
+        reader = self.create_user("reader@user.com", chat_id=101)
+        start = timezone.now() - datetime.timedelta(days=40)
+        for _ in range(5):
+            self.borrow(reader, start.date())
+
+        for day in range(1, 36):
+            send_overdue_digests(start + datetime.timedelta(days=day))
+
+        # Days 1, 7 (escalated), 14, 21, 28, 30 (escalated) and 33: 7 digests
+        # instead of 35 daily reminders, or 175 with one per borrowing.
+        digests = self.digests()
+        self.assertEqual(len(digests), 7)
+        self.assertIn("more than a week overdue", digests[1][1])
+        self.assertIn("more than a month overdue", digests[5][1])
+        self.assertEqual(
+            set(OverdueReminder.objects.values_list("level", flat=True)), {3}
+        )
+
+    def test_users_are_processed_in_batches(self):
+        for number in range(5):
+            user = self.create_user(f"u{number}@user.com", chat_id=200 + number)
+            self.borrow(user, self.past)
+
+        with mock.patch(
+            "borrowing_service.reminders.record_digests",
+            wraps=reminders.record_digests,
+        ) as record:
+            stats = send_overdue_digests(batch_size=2)
+
+        self.assertEqual(record.call_count, 3)
+        self.assertEqual(stats["digests"], 5)
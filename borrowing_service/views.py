@@ -1,5 +1,10 @@
 import datetime
+import logging
 
+import stripe
+from django.db import transaction
+from django.db.models import Prefetch
+from django.utils import timezone
 from drf_spectacular.utils import extend_schema, OpenApiParameter
 from rest_framework import mixins, status
 from rest_framework.viewsets import GenericViewSet
@@ -7,6 +12,7 @@ from rest_framework.permissions import IsAuthenticated, IsAdminUser
 from rest_framework.decorators import action
 from rest_framework.response import Response
 
+from book_service.inventory import return_copy
 from borrowing_service.models import Borrowing
 from borrowing_service.serializers import (
     BorrowingSerializer,
@@ -14,8 +20,11 @@ from borrowing_service.serializers import (
     BorrowingDetailSerializer,
     BorrowingReturnSerializer,
 )
-from payment_service.models import Payment
-from payment_service.stripe_helper import create_fine_session
+from payment_service.gateway import PaymentGatewayUnavailable
+from payment_service.models import CheckoutSessionOutbox, Payment
+from payment_service.stripe_helper import create_fine_session, session_expires_at
+
+logger = logging.getLogger(__name__)
 
 
 class BorrowingViewSet(
@@ -46,7 +55,7 @@ class BorrowingViewSet(
 
     def get_queryset(self):
         user = self.request.user
-        queryset = self.queryset.select_related("book_id", "user_id")
+        queryset = self.get_action_queryset()
         user_id = self.request.query_params.get("user_id")
         is_active = self.request.query_params.get("is_active")
 
@@ -64,6 +73,23 @@ class BorrowingViewSet(
 
         return queryset
 
+    def get_action_queryset(self):
+        """
+        Load exactly the relations the action's serializer reads.
+
+        Keeps every endpoint at a fixed number of queries however many
+        borrowings or payments there are, see `QueryBudgetMixin`.
+        """
+        if self.action == "list":
+            return self.queryset.select_related("book_id", "user_id")
+        if self.action == "retrieve":
+            return self.queryset.select_related("book_id", "user_id").prefetch_related(
+                Prefetch("payments", queryset=Payment.objects.order_by("id"))
+            )
+        if self.action == "return_book":
+            return self.queryset.select_related("book_id")
+        return self.queryset
+
     @extend_schema(
         parameters=[
             OpenApiParameter(
@@ -91,6 +117,58 @@ class BorrowingViewSet(
         """
         return super().list(request, *args, **kwargs)
 
+    @action(methods=["GET"], detail=True, url_path="checkout")
+    def checkout(self, request, pk=None):
+        """
+        Poll for the Stripe Checkout session of a new borrowing.
+
+        The session is created by a background worker after the borrowing
+        is committed, so it may not exist yet right after creation.
+
+        Returns:
+        - HTTP 200 OK with `session_url` once the session is ready.
+        - HTTP 202 Accepted while the session is still being created.
+        - HTTP 502 Bad Gateway if Stripe kept failing.
+        - HTTP 404 Not Found if the borrowing has no payment.
+        """
+        borrowing = self.get_object()
+        payment = (
+            borrowing.payments.filter(type=Payment.TypeChoices.PAYMENT)
+            .select_related("checkout_outbox")
+            .order_by("-id")
+            .first()
+        )
+        if payment is None:
+            return Response(
+                {"error": "This borrowing has no payment."},
+                status=status.HTTP_404_NOT_FOUND,
+            )
+
+        if payment.session_url:
+            return Response(
+                {
+                    "status": "ready",
+                    "payment_status": payment.status,
+                    "session_id": payment.session_id,
+                    "session_url": payment.session_url,
+                },
+                status=status.HTTP_200_OK,
+            )
+
+        outbox = getattr(payment, "checkout_outbox", None)
+        failed = CheckoutSessionOutbox.StatusChoices.FAILED
+        if outbox is not None and outbox.status == failed:
+            return Response(
+                {"status": "failed", "error": "Could not create a payment session."},
+                status=status.HTTP_502_BAD_GATEWAY,
+            )
+
+        return Response(
+            {"status": "pending"},
+            status=status.HTTP_202_ACCEPTED,
+            headers={"Retry-After": "1"},
+        )
+
     @action(
         methods=["POST"],
         detail=True,
@@ -107,40 +185,70 @@ class BorrowingViewSet(
         Returns:
         - HTTP 200 OK if the book was successfully returned.
         - HTTP 400 Bad Request if there is an issue returning the book or paying a fine.
+        - HTTP 502 Bad Gateway if Stripe refused to create the fine payment.
+        - HTTP 503 Service Unavailable if the fine payment can't be created now.
         """
         borrowing = self.get_object()
-
+        already_returned = Response(
+            {
+                "error": "You already have a link to pay the fine"
+                " or have successfully returned the book"
+            },
+            status=status.HTTP_400_BAD_REQUEST,
+        )
         if borrowing.actual_return is not None:
-            return Response(
-                {
-                    "error": "You already have a link to pay the fine"
-                    " or have successfully returned the book"
-                },
-                status=status.HTTP_400_BAD_REQUEST,
-            )
+            return already_returned
 
-        borrowing.actual_return = datetime.date.today()
-        borrowing.save()
+        today = datetime.date.today()
+        overdue = borrowing.expected_return_date < today
+        borrowing.actual_return = today
 
-        if borrowing.expected_return_date >= datetime.date.today():
-            book = borrowing.book_id
-            book.inventory += 1
-            book.save()
-            return Response(
-                {"message": "The book was successfully returned!"},
-                status=status.HTTP_200_OK,
-            )
+        # Stripe is called before anything is saved, so the return can
+        # simply be retried while the payment provider is unavailable.
+        if overdue:
+            try:
+                session = create_fine_session(borrowing, request)
+            except PaymentGatewayUnavailable:
+                return Response(
+                    {"error": "Payments are temporarily unavailable, please retry."},
+                    status=status.HTTP_503_SERVICE_UNAVAILABLE,
+                )
+            except stripe.error.StripeError as error:
+                logger.error(
+                    "Could not create the fine session for borrowing %s: %s",
+                    borrowing.pk,
+                    error,
+                )
+                return Response(
+                    {"error": "Could not create a payment session."},
+                    status=status.HTTP_502_BAD_GATEWAY,
+                )
 
-        session = create_fine_session(borrowing, request)
+        with transaction.atomic():
+            # Claimed with a conditional UPDATE, so of two concurrent returns
+            # only one puts the copy back or opens a fine.
+            claimed = Borrowing.objects.filter(
+                pk=borrowing.pk, actual_return__isnull=True
+            ).update(actual_return=today, updated_at=timezone.now())
+            if not claimed:
+                return already_returned
 
-        Payment.objects.create(
-            status=Payment.StatusChoices.PENDING,
-            type=Payment.TypeChoices.FINE,
-            borrowing=borrowing,
-            session_url=session.url,
-            session_id=session.id,
-            money_to_pay=session.amount_total / 100,
-        )
+            if not overdue:
+                return_copy(borrowing.book_id_id)
+                return Response(
+                    {"message": "The book was successfully returned!"},
+                    status=status.HTTP_200_OK,
+                )
+
+            Payment.objects.create(
+                status=Payment.StatusChoices.PENDING,
+                type=Payment.TypeChoices.FINE,
+                borrowing=borrowing,
+                session_url=session.url,
+                session_id=session.id,
+                money_to_pay=session.amount_total / 100,
+                expires_at=session_expires_at(session),
+            )
 
         return Response(
             {"message": "You must pay the fine before returning the book."},
@@ -13,4 +13,9 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings")
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Imported once Django is set up, the app touches models and settings.
+from payment_service.sse import PaymentStatusEvents  # noqa: E402
+
+application = PaymentStatusEvents(django_application)
@@ -0,0 +1,178 @@
+import base64
+import datetime
+import json
+from decimal import Decimal
+
+from django.conf import settings
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Cursor pagination over a composite, unique ordering (keyset / seek method).
+
+    Unlike OFFSET pagination every page is fetched with a
+    `WHERE (a, b) > (last_a, last_b) ORDER BY a, b LIMIT n` style query, so
+    with a matching index the 1000th page costs the same as the first one.
+
+    The ordering is taken from `view.keyset_ordering`, then from the queryset
+    `order_by()`, then from the model `Meta.ordering`; `id` is appended as a
+    tie-breaker when missing. Cursors are opaque base64 tokens.
+    """
+
+    cursor_query_param = "cursor"
+    page_size_query_param = "page_size"
+    invalid_cursor_message = "Invalid cursor"
+
+    def __init__(self):
+        self.page_size = api_settings.PAGE_SIZE or 20
+        self.max_page_size = getattr(settings, "KEYSET_PAGINATION_MAX_PAGE_SIZE", 100)
+        self.next_position = None
+        self.previous_position = None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        self.ordering = self.get_ordering(queryset, view)
+
+        position, reverse = self.decode_cursor(request)
+        if position is not None:
+            queryset = queryset.filter(self.seek_filter(position, reverse))
+
+        ordering = invert_ordering(self.ordering) if reverse else self.ordering
+        rows = list(queryset.order_by(*ordering)[: self.page_size + 1])
+        has_more = len(rows) > self.page_size
+        rows = rows[: self.page_size]
+        if reverse:
+            rows.reverse()
+
+        if rows:
+            first, last = self.get_position(rows[0]), self.get_position(rows[-1])
+            if reverse:
+                self.previous_position = first if has_more else None
+                self.next_position = last
+            else:
+                self.previous_position = first if position is not None else None
+                self.next_position = last if has_more else None
+
+        return rows
+
+    def get_paginated_response(self, data):
+        return Response(
+            {
+                "next": self.get_link(self.next_position, reverse=False),
+                "previous": self.get_link(self.previous_position, reverse=True),
+                "results": data,
+            }
+        )
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "properties": {
+                "next": {"type": "string", "nullable": True, "format": "uri"},
+                "previous": {"type": "string", "nullable": True, "format": "uri"},
+                "results": schema,
+            },
+        }
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {
+                "name": self.cursor_query_param,
+                "required": False,
+                "in": "query",
+                "description": "The pagination cursor value.",
+                "schema": {"type": "string"},
+            },
+            {
+                "name": self.page_size_query_param,
+                "required": False,
+                "in": "query",
+                "description": f"Number of results per page (max {self.max_page_size}).",
+                "schema": {"type": "integer"},
+            },
+        ]
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return min(self.page_size, self.max_page_size)
+        return max(1, min(page_size, self.max_page_size))
+
+    @staticmethod
+    def get_ordering(queryset, view):
+        ordering = list(
+            getattr(view, "keyset_ordering", None)
+            or queryset.query.order_by
+            or queryset.model._meta.ordering
+        )
+        if not {"id", "-id", "pk", "-pk"} & set(ordering):
+            ordering.append("id")
+        return ordering
+
+    def get_position(self, instance):
+        position = []
+        for field in self.ordering:
+            value = instance
+            for attr in field.lstrip("-").split("__"):
+                value = getattr(value, attr)
+            position.append(encode_value(value))
+        return position
+
+    def seek_filter(self, position, reverse):
+        """Build `(a > x) OR (a = x AND b > y) ...` for the cursor position."""
+        condition = Q()
+        equal_prefix = Q()
+        for field, value in zip(self.ordering, position):
+            name = field.lstrip("-")
+            descending = field.startswith("-") != reverse
+            lookup = "lt" if descending else "gt"
+            condition |= equal_prefix & Q(**{f"{name}__{lookup}": value})
+            equal_prefix &= Q(**{name: value})
+        return condition
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(encoded.encode("ascii")))
+            position, reverse = payload["p"], bool(payload.get("r"))
+        except (TypeError, ValueError, KeyError, UnicodeError):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(position, list) or len(position) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        return position, reverse
+
+    def get_link(self, position, reverse):
+        if position is None:
+            return None
+        payload = {"p": position}
+        if reverse:
+            payload["r"] = 1
+        cursor = base64.urlsafe_b64encode(
+            json.dumps(payload, separators=(",", ":")).encode("ascii")
+        ).decode("ascii")
+        return replace_query_param(self.base_url, self.cursor_query_param, cursor)
+
+
+def invert_ordering(ordering):
+    return [field[1:] if field.startswith("-") else f"-{field}" for field in ordering]
+
+
+def encode_value(value):
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    if hasattr(value, "pk"):
+        return value.pk
+    return value
@@ -51,6 +51,7 @@ INSTALLED_APPS = [
     "borrowing_service",
     "payment_service",
     "notifications",
+    "analytics",
 ]
 
 MIDDLEWARE = [
@@ -146,9 +147,13 @@ REST_FRAMEWORK = {
     "DEFAULT_SCHEMA_CLASS": "drf_spectacular.openapi.AutoSchema",
     "DEFAULT_AUTHENTICATION_CLASSES": (
         "rest_framework_simplejwt.authentication.JWTAuthentication",
-    )
+    ),
+    "DEFAULT_PAGINATION_CLASS": "config.pagination.KeysetPagination",
+    "PAGE_SIZE": 20,
 }
 
+KEYSET_PAGINATION_MAX_PAGE_SIZE = 100
+
 SPECTACULAR_SETTINGS = {
     "TITLE": "Library API",
     "DESCRIPTION": "Borrow and pay for books in the library",
@@ -180,5 +185,44 @@ CELERY_TIMEZONE = "Europe/Kyiv"
 CELERY_TASK_TRACK_STARTED = True
 CELERY_TASK_TIME_LIMIT = 30 * 60
 
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    }
+}
+
+BOOK_CACHE_TIMEOUT = 60 * 60
+
+# Hold a copy for this long after a borrowing is created, e.g.
+# timedelta(minutes=15). None takes the copy only once payment succeeds.
+INVENTORY_RESERVATION_TTL = None
+
 STRIPE_PUBLIC_KEY = os.environ.get("STRIPE_PUBLIC_KEY")
 STRIPE_SECRET_KEY = os.environ.get("STRIPE_SECRET_KEY")
+STRIPE_WEBHOOK_SECRET = os.environ.get("STRIPE_WEBHOOK_SECRET")
+
+# Connect and read timeouts for Stripe calls, in seconds.
+STRIPE_TIMEOUT = (3.05, 10)
+STRIPE_MAX_RETRIES = 2
+STRIPE_POOL_SIZE = 10
+# Fail fast for this many seconds after this many failed calls in a row.
+STRIPE_BREAKER_THRESHOLD = 5
+STRIPE_BREAKER_RESET_TIMEOUT = 30
+
+TELEGRAM_API_URL = os.environ.get("TELEGRAM_API_URL", "https://api.telegram.org")
+# Connect and read timeouts for Telegram calls, in seconds.
+TELEGRAM_TIMEOUT = (3.05, 10)
+TELEGRAM_POOL_SIZE = 20
+
+# Public base URL of the `/s/<code>/` short link redirects.
+SHORT_LINK_BASE_URL = os.environ.get("SHORT_LINK_BASE_URL", "http://localhost:8000")
+SHORT_LINK_CACHE_TIMEOUT = 24 * 60 * 60
+
+# Telegram chat of each user, dropped from the cache when it changes.
+CHAT_ROUTE_CACHE_TIMEOUT = 24 * 60 * 60
+# Users without a chat are cached briefly: connecting one only drops the
+# entry from the cache of the process that handled it.
+CHAT_ROUTE_NOT_REGISTERED_TIMEOUT = 60
+
+# Redis pub/sub used to push payment status changes to waiting clients.
+PAYMENT_EVENTS_REDIS_URL = "redis://localhost:6379/2"
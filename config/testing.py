@@ -0,0 +1,50 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+
+class QueryBudgetMixin:
+    """
+    TestCase mixin asserting that an endpoint runs a fixed number of queries.
+
+    The request is repeated after growing the data set, so an N+1 (a query
+    per row, e.g. a missing `select_related`/`Prefetch`) fails the test even
+    when the budget itself is generous:
+
+        self.assertQueryBudget(
+            4,
+            lambda: self.client.get(url),
+            grow=lambda count: create_borrowings(self.user, count),
+        )
+    """
+
+    def assertQueryBudget(self, budget, request, grow=None, sizes=(1, 10)):
+        """
+        Args:
+        - budget (int): Maximum number of queries a request may run.
+        - request (callable): Performs the request and returns the response.
+        - grow (callable): Adds the given number of rows before each run.
+        - sizes (tuple): Rows added before each run.
+
+        Returns:
+        - list: Query counts of each run.
+        """
+        counts = []
+        for size in sizes if grow else sizes[:1]:
+            if grow:
+                grow(size)
+            with CaptureQueriesContext(connection) as context:
+                response = request()
+            self.assertLess(response.status_code, 400, response.content)
+            counts.append(len(context))
+            self.assertLessEqual(
+                len(context),
+                budget,
+                f"{len(context)} queries over a budget of {budget}:\n"
+                + "\n".join(query["sql"] for query in context.captured_queries),
+            )
+        self.assertEqual(
+            len(set(counts)),
+            1,
+            f"Query count grows with the number of rows: {counts}",
+        )
+        return counts
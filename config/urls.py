@@ -28,6 +28,8 @@ urlpatterns = [
     path("api/borrowings/", include("borrowing_service.urls", namespace="borrowings")),
     path("api/books/", include("book_service.urls", namespace="books")),
     path("api/payments/", include("payment_service.urls", namespace="payments")),
+    path("api/analytics/", include("analytics.urls", namespace="analytics")),
+    path("s/", include("notifications.urls", namespace="notifications")),
     path("api/doc/", SpectacularAPIView.as_view(), name="schema"),
     path(
         "api/doc/swagger/",
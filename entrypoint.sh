@@ -11,7 +11,6 @@ python manage.py makemigrations book_service
 python manage.py migrate
 python manage.py makemigrations
 python manage.py migrate
-nohup python notifications_bot.py &
 
 
 # Start Django development server
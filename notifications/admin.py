@@ -1,5 +1,19 @@
 from django.contrib import admin
 
-from notifications.models import Notification
+from notifications.models import Notification, NotificationOutbox, ShortLink
 
 admin.site.register(Notification)
+
+
+@admin.register(NotificationOutbox)
+class NotificationOutboxAdmin(admin.ModelAdmin):
+    list_display = ("created_at", "kind", "chat_id", "status", "attempts", "latency_ms")
+    list_filter = ("status", "kind")
+    search_fields = ("chat_id",)
+
+
+@admin.register(ShortLink)
+class ShortLinkAdmin(admin.ModelAdmin):
+    list_display = ("code", "url", "hits", "created_at", "last_hit_at")
+    search_fields = ("code",)
+    readonly_fields = ("url_hash", "hits", "last_hit_at")
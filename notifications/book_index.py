@@ -0,0 +1,149 @@
+import bisect
+import threading
+import time
+from collections import defaultdict, namedtuple
+
+from book_service.search import normalize_query
+from book_service.sync import get_changes
+from notifications.shortlinks import LRUCache
+
+REFRESH_INTERVAL = 30
+SYNC_PAGE_SIZE = 5000
+RESULT_CACHE_SIZE = 1000
+DEFAULT_LIMIT = 20
+
+IndexedBook = namedtuple("IndexedBook", "id title author inventory")
+
+
+class BookIndex:
+    """
+    In-memory prefix index of the book catalog for search-as-you-type.
+
+    Every word of a book's title and author is kept in one sorted list,
+    so all words starting with a prefix are found with two bisections.
+    The index is built once and then kept up to date incrementally from
+    the catalog's delta sync (`updated_at` and `BookDeletion` tombstones),
+    at most every `refresh_interval` seconds, so keystrokes never reach the
+    database. Changes show up once they are older than the feed's
+    `SYNC_LAG`, which keeps late commits from being skipped. Recent results are kept in a small LRU keyed by the index
+    generation, so results from before a change are never served.
+    """
+
+    def __init__(self, refresh_interval=REFRESH_INTERVAL, cache_size=RESULT_CACHE_SIZE):
+        self.refresh_interval = refresh_interval
+        self.books = {}
+        self.title_keys = {}
+        self.words = []
+        self.postings = defaultdict(set)
+        self.results = LRUCache(cache_size)
+        self.sync_token = None
+        self.generation = 0
+        self.refreshed_at = None
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+
+    def is_stale(self):
+        return (
+            self.refreshed_at is None
+            or time.monotonic() - self.refreshed_at >= self.refresh_interval
+        )
+
+    def refresh(self):
+        """
+        Apply catalog changes made since the last refresh.
+
+        Returns:
+        - int: Number of books added, changed or removed.
+        """
+        with self._refresh_lock:
+            if not self.is_stale():
+                return 0
+            applied = 0
+            while True:
+                changes = get_changes(self.sync_token, limit=SYNC_PAGE_SIZE)
+                # Searches only wait for the changes to be applied, never
+                # for the database.
+                with self._lock:
+                    for book in changes["changed"]:
+                        self._remove(book.id)
+                        self._add(
+                            IndexedBook(
+                                book.id, book.title, book.author, book.inventory
+                            )
+                        )
+                    for book_id in changes["deleted"]:
+                        self._remove(book_id)
+                applied += len(changes["changed"]) + len(changes["deleted"])
+                self.sync_token = changes["token"]
+                if not changes["has_more"]:
+                    break
+            if applied:
+                self.generation += 1
+            self.refreshed_at = time.monotonic()
+            return applied
+
+    def _add(self, book):
+        self.books[book.id] = book
+        self.title_keys[book.id] = " ".join(normalize_query(book.title))
+        for word in set(normalize_query(f"{book.title} {book.author}")):
+            if word not in self.postings:
+                bisect.insort(self.words, word)
+            self.postings[word].add(book.id)
+
+    def _remove(self, book_id):
+        book = self.books.pop(book_id, None)
+        if book is None:
+            return
+        del self.title_keys[book_id]
+        for word in set(normalize_query(f"{book.title} {book.author}")):
+            # Emptied words stay in `words`; they just match nothing.
+            self.postings[word].discard(book_id)
+
+    def _matching(self, prefix):
+        start = bisect.bisect_left(self.words, prefix)
+        end = bisect.bisect_left(self.words, prefix + "\U0010ffff", lo=start)
+        ids = set()
+        for word in self.words[start:end]:
+            ids |= self.postings[word]
+        return ids
+
+    def search(self, query, limit=DEFAULT_LIMIT):
+        """
+        Find books whose title or author has words starting with every
+        word of the query, titles starting with the query first.
+
+        Returns:
+        - list: Up to `limit` `IndexedBook`s.
+        """
+        words = normalize_query(query)
+        if not words:
+            return []
+        text = " ".join(words)
+        key = (self.generation, text, limit)
+        cached = self.results.get(key)
+        if cached is not None:
+            return cached
+
+        with self._lock:
+            key = (self.generation, text, limit)
+            ids = None
+            # The longest prefix is the most selective, start from it.
+            for word in sorted(words, key=len, reverse=True):
+                ids = (
+                    self._matching(word) if ids is None else ids & self._matching(word)
+                )
+                if not ids:
+                    break
+            books = [
+                (not self.title_keys[book_id].startswith(text), self.books[book_id])
+                for book_id in ids
+            ]
+
+        books.sort(key=lambda item: (item[0], item[1].title.lower(), item[1].id))
+        books = [book for _, book in books]
+        books = books[:limit]
+        self.results.set(key, books)
+        return books
+
+
+index = BookIndex()
@@ -0,0 +1,176 @@
+import logging
+
+from aiogram import Bot, Dispatcher
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+from aiogram.enums import ParseMode
+from aiogram.filters import Command, CommandStart
+from aiogram.types import (
+    InlineQuery,
+    InlineQueryResultArticle,
+    InputTextMessageContent,
+    Message,
+)
+from aiogram.utils.markdown import hbold
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+from aiohttp import web
+
+from notifications.bot_queries import connect_chat, search_catalog, user_borrowings
+
+logger = logging.getLogger(__name__)
+
+WEBHOOK_PATH = "/telegram/webhook/"
+# Updates Telegram sends to one webhook in parallel, shared by all replicas.
+WEBHOOK_MAX_CONNECTIONS = 100
+INLINE_RESULTS = 20
+# Seconds Telegram may serve an inline answer from its own cache.
+INLINE_CACHE_TIME = 30
+
+# Handlers keep no state between updates (no FSM, nothing in memory), so
+# any replica can serve any update.
+dp = Dispatcher()
+
+
+@dp.message(CommandStart())
+async def command_start_handler(message: Message) -> None:
+    """
+    Handles the /start command to create a user notification in the Django database
+    and sends a welcome message to the user on Telegram.
+    Args:
+    - message (Message): The message from the user.
+
+    """
+    text = message.text
+    user_id = int(text[text.find("userid") + 6 :])
+    user_token = text[7 : text.find("userid")]
+
+    await connect_chat(
+        user_id=user_id,
+        connect_token=user_token,
+        telegram_username=message.from_user.username,
+        chat_id=message.chat.id,
+    )
+
+    await message.answer(
+        f"Hi, {hbold(message.from_user.username)}! \n\n"
+        f"I will help you to keep track "
+        f"of your borrowings in our library. \n\n"
+        f"{hbold('Happy reading!')} \U0001F970"
+    )
+
+
+@dp.message(Command("myborrowings"))
+async def get_borrowings_handler(message: Message) -> None:
+    """
+    Handles the /myborrowings command to fetch information about the user's current
+    borrowings and sends a message to the user with this information.
+
+    The borrowings and their books are read in a single query on the bot's
+    DB thread pool.
+
+    Args:
+    - message (Message): The message from the user.
+    """
+    borrowings = await user_borrowings(message.from_user.username)
+
+    message_text = "Here are all of your current borrowings: \n"
+
+    for title, return_date in borrowings:
+        message_text += f"{title} - expected to return {return_date}\n"
+
+    await message.answer(message_text)
+
+
+def availability(book):
+    if book.inventory > 0:
+        return f"Available ({book.inventory} in stock)"
+    return "Not available right now"
+
+
+@dp.inline_query()
+async def book_search_handler(inline_query: InlineQuery) -> None:
+    """
+    Handles inline queries (`@bot title or author`) by searching the catalog
+    as the user types and answering with matching books and availability.
+
+    Served from the in-memory book index, so keystrokes don't hit the
+    database.
+
+    Args:
+    - inline_query (InlineQuery): The query from the user.
+    """
+    books = await search_catalog(inline_query.query, INLINE_RESULTS)
+    results = [
+        InlineQueryResultArticle(
+            id=str(book.id),
+            title=book.title,
+            description=f"{book.author} - {availability(book)}",
+            input_message_content=InputTextMessageContent(
+                message_text=(
+                    f"{hbold(book.title)} by {book.author}\n{availability(book)}"
+                )
+            ),
+        )
+        for book in books
+    ]
+    await inline_query.answer(results, cache_time=INLINE_CACHE_TIME)
+
+
+def create_bot(token, api_url=None):
+    """
+    Args:
+    - token (str): The bot token.
+    - api_url (str): Bot API server to use instead of Telegram's, e.g. a
+      `TelegramStub`.
+    """
+    session = None
+    if api_url:
+        session = AiohttpSession(api=TelegramAPIServer.from_base(api_url))
+    return Bot(token, session=session, parse_mode=ParseMode.HTML)
+
+
+def create_webhook_app(bot, secret_token=None, webhook_url=None):
+    """
+    Build the aiohttp application receiving updates on `WEBHOOK_PATH`.
+
+    Updates are acknowledged at once and handled in the background, so
+    Telegram never waits on the database. Run as many replicas as needed
+    behind the reverse proxy; each one only needs the bot token and secret.
+
+    Args:
+    - bot (Bot): The bot replying to updates.
+    - secret_token (str): Required in the `X-Telegram-Bot-Api-Secret-Token`
+      header of every update, so only Telegram can post them.
+    - webhook_url (str): Public URL of `WEBHOOK_PATH`. When given, the
+      webhook is registered with Telegram on startup; every replica
+      registers the same URL, so this is idempotent.
+
+    Returns:
+    - web.Application: Ready to be served with `web.run_app`.
+    """
+    app = web.Application()
+    SimpleRequestHandler(dispatcher=dp, bot=bot, secret_token=secret_token).register(
+        app, path=WEBHOOK_PATH
+    )
+    setup_application(app, dp, bot=bot)
+
+    if webhook_url:
+
+        async def set_webhook(app):
+            await bot.set_webhook(
+                webhook_url,
+                secret_token=secret_token,
+                max_connections=WEBHOOK_MAX_CONNECTIONS,
+                allowed_updates=dp.resolve_used_update_types(),
+            )
+            logger.info("Telegram webhook set to %s", webhook_url)
+
+        app.on_startup.append(set_webhook)
+    return app
+
+
+async def run_polling(bot):
+    """Fallback for local development: a single process long-polls Telegram."""
+    # Telegram refuses getUpdates while a webhook is set.
+    await bot.delete_webhook()
+    await dp.start_polling(bot)
@@ -0,0 +1,92 @@
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import close_old_connections
+
+from borrowing_service.models import Borrowing
+from notifications.book_index import DEFAULT_LIMIT, index
+from notifications.models import Notification
+
+MAX_WORKERS = 8
+
+executor = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="bot-db")
+
+
+def bot_query(func):
+    """
+    Turn a sync ORM function into a coroutine run on the bot's DB threads.
+
+    `sync_to_async` defaults to one thread for the whole process, so every
+    chat's queries wait in a single line. Here up to `MAX_WORKERS` queries
+    run in parallel, each thread keeping its own connection (reused while
+    `CONN_MAX_AGE` allows), and no more than that reach the database however
+    many chats are waiting. Functions must return plain data, never lazy
+    querysets or models with unloaded relations.
+    """
+
+    def run(*args, **kwargs):
+        close_old_connections()
+        return func(*args, **kwargs)
+
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            executor, functools.partial(run, *args, **kwargs)
+        )
+
+    return wrapper
+
+
+@bot_query
+def connect_chat(user_id, connect_token, telegram_username, chat_id):
+    """Link a user to their Telegram chat, in one INSERT."""
+    return Notification.objects.create(
+        user_id=user_id,
+        connect_token=connect_token,
+        telegram_username=telegram_username,
+        chat_id=chat_id,
+    )
+
+
+@bot_query
+def user_borrowings(telegram_username):
+    """
+    Borrowings of the user behind a Telegram username, in one query.
+
+    Returns:
+    - list: (book title, expected return date) tuples, newest first.
+    """
+    borrowings = (
+        Borrowing.objects.filter(
+            user_id__notification__telegram_username=telegram_username
+        )
+        .select_related("book_id")
+        .only("expected_return_date", "book_id", "book_id__title")
+    )
+    return [
+        (borrowing.book_id.title, borrowing.expected_return_date)
+        for borrowing in borrowings
+    ]
+
+
+@bot_query
+def refresh_book_index():
+    return index.refresh()
+
+
+async def search_catalog(query, limit=DEFAULT_LIMIT):
+    """
+    Search the catalog from the in-memory `BookIndex`.
+
+    Only an index older than its refresh interval costs a trip to the
+    database, to fetch what changed since; any other keystroke is answered
+    from memory.
+
+    Returns:
+    - list: `IndexedBook`s, best match first.
+    """
+    if index.is_stale():
+        await refresh_book_index()
+    return index.search(query, limit)
@@ -0,0 +1,289 @@
+import asyncio
+import json
+import logging
+import os
+import random
+import time
+from dataclasses import dataclass
+
+import aiohttp
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Telegram's documented limits: about 30 messages per second across all
+# chats, one per second to a single chat and 20 per minute to a group.
+GLOBAL_RATE = 30
+CHAT_RATE = 1
+GROUP_RATE = 20 / 60
+DEFAULT_BATCH_SIZE = 100
+MAX_CHAT_BUCKETS = 10_000
+
+
+def bot_url(method, token=None, api_url=None):
+    """URL of a Bot API method, e.g. `sendMessage`."""
+    token = token or os.environ.get("BOT_TOKEN")
+    return f"{api_url or settings.TELEGRAM_API_URL}/bot{token}/{method}"
+
+
+class TokenBucket:
+    """
+    Lets through `rate` operations per second, with bursts of `capacity`.
+
+    `reserve` always takes a token and may leave the bucket in debt, so
+    callers queue up in the order they asked instead of racing for the
+    next token. `try_acquire` only takes a token that is already there.
+    """
+
+    def __init__(self, rate, capacity=1, clock=time.monotonic):
+        self.rate = rate
+        self.capacity = capacity
+        self.clock = clock
+        self.tokens = capacity
+        self.updated = clock()
+
+    def _refill(self):
+        now = self.clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self):
+        """Take a token; returns the seconds to wait before using it."""
+        self._refill()
+        self.tokens -= 1
+        return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def try_acquire(self):
+        self._refill()
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+    def wait_time(self):
+        """Seconds until a token is available."""
+        self._refill()
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def pause(self, seconds):
+        """Hand out nothing for `seconds`, e.g. after a 429 response."""
+        self._refill()
+        self.tokens = min(self.tokens, 1 - seconds * self.rate)
+
+    def idle(self):
+        self._refill()
+        return self.tokens >= self.capacity
+
+    async def acquire(self):
+        delay = self.reserve()
+        if delay:
+            await asyncio.sleep(delay)
+
+
+@dataclass
+class DeliveryResult:
+    chat_id: object
+    ok: bool
+    attempts: int
+    latency: float
+    error: str = None
+    message_id: int = None
+    # False when Telegram refused the message itself, e.g. a blocked bot.
+    retryable: bool = False
+
+
+class TelegramDelivery:
+    """
+    Sends Telegram messages concurrently from one asyncio event loop.
+
+    - One `aiohttp` session with a bounded connection pool is shared by
+      every send, so connections to the Bot API are kept alive and reused.
+    - A global token bucket keeps the bot under Telegram's overall limit
+      and a bucket per chat under the per-chat (or per-group) limit.
+    - A 429 response pauses that chat's bucket for its `retry_after`;
+      connection errors and 5xx are retried with jittered backoff. Other
+      errors (blocked bot, unknown chat) are final.
+
+    Limits are tracked per engine and not shared between processes, so
+    engines running in parallel would each spend Telegram's whole budget.
+    Bulk messages therefore go through the notification outbox, whose
+    dispatcher sends everything with a single engine.
+
+        async with TelegramDelivery() as delivery:
+            results = await delivery.send_many([(chat_id, text), ...])
+    """
+
+    def __init__(
+        self,
+        token=None,
+        api_url=None,
+        global_rate=GLOBAL_RATE,
+        chat_rate=CHAT_RATE,
+        group_rate=GROUP_RATE,
+        pool_size=None,
+        timeout=None,
+        max_attempts=5,
+        backoff=0.5,
+        max_backoff=30.0,
+    ):
+        self.url = bot_url("sendMessage", token, api_url)
+        self.chat_rate = chat_rate
+        self.group_rate = group_rate
+        self.pool_size = pool_size or settings.TELEGRAM_POOL_SIZE
+        self.timeout = timeout or settings.TELEGRAM_TIMEOUT
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.global_bucket = TokenBucket(global_rate)
+        self.session = None
+        self._chats = {}
+
+    async def __aenter__(self):
+        connect, read = self.timeout
+        self.session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=self.pool_size),
+            timeout=aiohttp.ClientTimeout(sock_connect=connect, sock_read=read),
+            json_serialize=json.dumps,
+        )
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.session.close()
+        self.session = None
+
+    def chat_bucket(self, chat_id):
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            if len(self._chats) >= MAX_CHAT_BUCKETS:
+                self._chats = {
+                    chat: bucket
+                    for chat, bucket in self._chats.items()
+                    if not bucket.idle()
+                }
+            # Group and channel chat ids are negative.
+            rate = self.group_rate if int(chat_id) < 0 else self.chat_rate
+            bucket = self._chats[chat_id] = TokenBucket(rate)
+        return bucket
+
+    async def send(self, chat_id, text, **params):
+        """
+        Send one message, waiting for the rate limits and retrying.
+
+        Returns:
+        - DeliveryResult: Never raises for delivery failures.
+        """
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        payload = {"chat_id": chat_id, "text": text, **params}
+        bucket = self.chat_bucket(chat_id)
+        attempts, error, retryable = 0, None, True
+        while attempts < self.max_attempts:
+            attempts += 1
+            await bucket.acquire()
+            await self.global_bucket.acquire()
+            try:
+                async with self.session.post(self.url, json=payload) as response:
+                    status = response.status
+                    body = await response.json(content_type=None)
+            except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as exc:
+                error = str(exc) or exc.__class__.__name__
+                await asyncio.sleep(self._delay(attempts))
+                continue
+            if not isinstance(body, dict):
+                # An empty or foreign body, e.g. from a proxy in between.
+                body = {}
+
+            if body.get("ok"):
+                return DeliveryResult(
+                    chat_id,
+                    True,
+                    attempts,
+                    loop.time() - started,
+                    message_id=body["result"].get("message_id"),
+                )
+            error = body.get("description") or f"HTTP {status}"
+            if status == 429:
+                retry_after = body.get("parameters", {}).get("retry_after", 1)
+                bucket.pause(retry_after)
+            elif status >= 500:
+                await asyncio.sleep(self._delay(attempts))
+            else:
+                retryable = False
+                break
+
+        logger.warning("Telegram message to %s not delivered: %s", chat_id, error)
+        return DeliveryResult(
+            chat_id,
+            False,
+            attempts,
+            loop.time() - started,
+            error,
+            retryable=retryable,
+        )
+
+    async def send_many(self, messages):
+        """
+        Send (chat_id, text) pairs concurrently.
+
+        Messages to the same chat are sent in the given order.
+
+        Returns:
+        - list: A `DeliveryResult` per message, in the same order.
+        """
+        return await asyncio.gather(
+            *(self.send(chat_id, text) for chat_id, text in messages)
+        )
+
+    async def drain(self, queue, batch_size=DEFAULT_BATCH_SIZE):
+        """
+        Send the (chat_id, text) items of an `asyncio.Queue` in batches
+        until it is empty. At most `batch_size` sends are in flight.
+
+        Returns:
+        - list: A `DeliveryResult` per message.
+        """
+        results = []
+        while not queue.empty():
+            batch = []
+            while len(batch) < batch_size and not queue.empty():
+                batch.append(queue.get_nowait())
+            results.extend(await self.send_many(batch))
+            for _ in batch:
+                queue.task_done()
+        return results
+
+    def _delay(self, attempt):
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2**attempt))
+
+
+def deliver(messages, **options):
+    """
+    Send (chat_id, text) pairs from synchronous code in one engine run.
+
+    Meant for one-off jobs and load tests; messages sent by the service go
+    through the outbox, see `TelegramDelivery`.
+
+    Args:
+    - messages (iterable): (chat_id, text) pairs.
+    - options: Passed on to `TelegramDelivery`.
+
+    Returns:
+    - dict: Counts of sent and failed messages and the run duration.
+    """
+    messages = [(chat_id, text) for chat_id, text in messages]
+
+    async def run():
+        async with TelegramDelivery(**options) as delivery:
+            queue = asyncio.Queue()
+            for message in messages:
+                queue.put_nowait(message)
+            return await delivery.drain(queue)
+
+    started = time.perf_counter()
+    results = asyncio.run(run()) if messages else []
+    sent = sum(result.ok for result in results)
+    return {
+        "sent": sent,
+        "failed": len(results) - sent,
+        "duration_ms": round((time.perf_counter() - started) * 1000, 1),
+    }
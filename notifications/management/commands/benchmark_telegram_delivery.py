@@ -0,0 +1,77 @@
+import asyncio
+import statistics
+import time
+
+import requests
+from django.core.management.base import BaseCommand
+
+from notifications.delivery import TelegramDelivery, bot_url
+from notifications.telegram_stub import TelegramStub
+
+
+class Command(BaseCommand):
+    """
+    Django command comparing the old one-request-per-message Telegram
+    sending with the batched asyncio delivery engine.
+
+    Both run against a local TelegramStub enforcing Telegram's rate limits
+    with configurable latency, and report throughput, how many messages
+    were delivered or rejected with 429 and how many TCP connections were
+    opened. Runs fully offline.
+    """
+
+    help = "Offline benchmark of sequential vs batched Telegram delivery"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--messages", type=int, default=300)
+        parser.add_argument("--chats", type=int, default=50)
+        parser.add_argument("--latency", type=float, default=0.05)
+        parser.add_argument(
+            "--mode", choices=("sequential", "engine", "both"), default="both"
+        )
+
+    def handle(self, *args, **options) -> None:
+        messages = [
+            (1000 + index % options["chats"], f"Benchmark message {index}")
+            for index in range(options["messages"])
+        ]
+        modes = (
+            ("sequential", "engine")
+            if options["mode"] == "both"
+            else (options["mode"],)
+        )
+        with TelegramStub(latency=options["latency"]) as stub:
+            for mode in modes:
+                stub.reset()
+                run = self.sequential if mode == "sequential" else self.engine
+                started = time.perf_counter()
+                latencies = run(messages, stub.url)
+                elapsed = time.perf_counter() - started
+                latencies = sorted(latency * 1000 for latency in latencies)
+                self.stdout.write(
+                    f"{mode:>10}: {len(stub.messages)}/{len(messages)} delivered "
+                    f"in {elapsed:6.2f}s "
+                    f"({len(stub.messages) / elapsed:5.1f} msg/s), "
+                    f"{stub.rejected} rejected with 429, "
+                    f"{stub.connections} connections, "
+                    f"latency p50={statistics.median(latencies):7.1f}ms "
+                    f"p95={latencies[int(len(latencies) * 0.95) - 1]:7.1f}ms"
+                )
+
+    @staticmethod
+    def sequential(messages, api_url):
+        url = bot_url("sendMessage", "benchmark", api_url)
+        latencies = []
+        for chat_id, text in messages:
+            started = time.perf_counter()
+            requests.get(url, params={"chat_id": chat_id, "text": text}, timeout=10)
+            latencies.append(time.perf_counter() - started)
+        return latencies
+
+    @staticmethod
+    def engine(messages, api_url):
+        async def run():
+            async with TelegramDelivery("benchmark", api_url) as delivery:
+                return await delivery.send_many(messages)
+
+        return [result.latency for result in asyncio.run(run())]
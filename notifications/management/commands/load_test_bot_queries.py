@@ -0,0 +1,120 @@
+import asyncio
+import statistics
+import time
+from datetime import date, timedelta
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from book_service.models import Book
+from borrowing_service.models import Borrowing
+from notifications.bot_queries import user_borrowings
+from notifications.models import Notification
+
+
+async def old_borrowings(telegram_username):
+    """The old /myborrowings data access, kept here only as a baseline."""
+    notification = await sync_to_async(Notification.objects.get)(
+        telegram_username=telegram_username
+    )
+    borrowings = await sync_to_async(Borrowing.objects.filter)(
+        user_id=notification.user_id
+    )
+    result = []
+    for borrowing in await sync_to_async(list)(borrowings):
+        book_id = await sync_to_async(lambda: borrowing.book_id_id)()
+        book = await sync_to_async(Book.objects.get)(id=book_id)
+        return_date = await sync_to_async(lambda: borrowing.expected_return_date)()
+        result.append((str(book), return_date))
+    return result
+
+
+class Command(BaseCommand):
+    """
+    Django command simulating thousands of chats sending /myborrowings at
+    once to the Telegram bot's data access layer.
+
+    Compares the old per-attribute `sync_to_async` code, with its query per
+    book, against the batched `notifications.bot_queries` and reports
+    latency percentiles and throughput. The benchmark users, books and
+    borrowings are deleted at the end.
+    """
+
+    help = "Load test the Telegram bot's /myborrowings queries"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chats", type=int, default=2000)
+        parser.add_argument("--borrowings", type=int, default=3)
+        parser.add_argument("--mode", choices=("old", "new", "both"), default="both")
+
+    def handle(self, *args, **options) -> None:
+        usernames = self.create_data(options["chats"], options["borrowings"])
+        modes = ("old", "new") if options["mode"] == "both" else (options["mode"],)
+        try:
+            for mode in modes:
+                self.run(mode, usernames, options["borrowings"])
+        finally:
+            get_user_model().objects.filter(email__endswith="@bot-load.test").delete()
+            Book.objects.filter(author="bot load test").delete()
+
+    @staticmethod
+    def create_data(chats, borrowings_per_user):
+        get_user_model().objects.bulk_create(
+            get_user_model()(email=f"chat{index}@bot-load.test", password="!")
+            for index in range(chats)
+        )
+        users = get_user_model().objects.filter(email__endswith="@bot-load.test")
+        Book.objects.bulk_create(
+            Book(
+                title=f"Load test book {index}",
+                author="bot load test",
+                cover=Book.CoverChoices.SOFT,
+                inventory=chats,
+                daily_fee=1,
+            )
+            for index in range(borrowings_per_user)
+        )
+        books = list(Book.objects.filter(author="bot load test"))
+        Notification.objects.bulk_create(
+            Notification(
+                user=user,
+                telegram_username=f"load_test_{user.pk}",
+                chat_id=10**9 + user.pk,
+            )
+            for user in users
+        )
+        Borrowing.objects.bulk_create(
+            Borrowing(
+                user_id=user,
+                book_id=book,
+                expected_return_date=date.today() + timedelta(days=7),
+            )
+            for user in users
+            for book in books
+        )
+        return [f"load_test_{pk}" for pk in users.values_list("pk", flat=True)]
+
+    def run(self, mode, usernames, borrowings_per_user):
+        query = old_borrowings if mode == "old" else user_borrowings
+
+        async def chat(username):
+            started = time.perf_counter()
+            borrowings = await query(username)
+            assert len(borrowings) == borrowings_per_user
+            return time.perf_counter() - started
+
+        async def all_chats():
+            return await asyncio.gather(*(chat(username) for username in usernames))
+
+        started = time.perf_counter()
+        latencies = asyncio.run(all_chats())
+        elapsed = time.perf_counter() - started
+
+        latencies = sorted(latency * 1000 for latency in latencies)
+        self.stdout.write(
+            f"{mode:>4}: {len(usernames)} chats in {elapsed:6.2f}s "
+            f"({len(usernames) / elapsed:7.1f} commands/s), "
+            f"latency p50={statistics.median(latencies):8.1f}ms "
+            f"p95={latencies[int(len(latencies) * 0.95) - 1]:8.1f}ms"
+        )
@@ -1,48 +1,50 @@
-import os
+import logging
+
 import requests
-import pyshorteners
+from django.conf import settings
+from requests.adapters import HTTPAdapter
 
-from notifications.models import Notification
+from notifications import outbox, routing, shortlinks
+from notifications.delivery import bot_url
 
+logger = logging.getLogger(__name__)
 
-def handle_notification_exception(func):
-    def wrapper(*args, **kwargs):
-        try:
-            return func(*args, **kwargs)
-        except Notification.DoesNotExist:
-            print("This user is not registered on Telegram")
-        except Exception as e:
-            print(f"An unexpected error occurred: {e}")
+ADMIN_CHAT_ID = -4085174893
 
-    return wrapper
+# Shared by all threads, so connections to the Bot API are reused.
+session = requests.Session()
+session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=10))
+session.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=10))
 
 
 def send_message(chat_id, notification_text):
-    BOT_TOKEN = os.environ.get("BOT_TOKEN")
-    return requests.get(f"https://api.telegram.org/bot{BOT_TOKEN}"
-                        f"/sendMessage?chat_id={chat_id}&text={notification_text}")
-
-
-@handle_notification_exception
-def notify_overdue_borrowing(user_id):
-    notification = Notification.objects.get(user_id=user_id)
-    text = (
-        f"Hello {notification.telegram_username}! 📚🌟\n\n"
-        f"We hope this message finds you well. 😊 It looks like there's a small reminder about your recent borrowing at BuzzingPages:\n"
-        f"We kindly request you to return the book at your earliest convenience."
-        f"If you've already returned it, please accept our apologies for any inconvenience.\n\n"
-        f"Thank you for your understanding and prompt attention! 🙏📚"
+    """
+    Send one message right away, e.g. from a request or signal.
+
+    The text goes in a JSON body, so it is never mangled by URL encoding.
+    Batches should be queued with `notifications.outbox.enqueue_many`
+    instead.
+    """
+    return session.post(
+        bot_url("sendMessage"),
+        json={"chat_id": chat_id, "text": notification_text},
+        timeout=settings.TELEGRAM_TIMEOUT,
     )
-    return send_message(chat_id=notification.chat_id, notification_text=text)
 
 
-@handle_notification_exception
 def send_user_payment_message(instance):
-    s = pyshorteners.Shortener()
-    short_url = s.tinyurl.short(instance.session_url)
+    """
+    Queue the payment link for the borrowing's user, if they are on Telegram.
 
+    Returns:
+    - NotificationOutbox: The queued message, or None.
+    """
     borrowing = instance.borrowing
-    notification = Notification.objects.get(user_id=borrowing.user_id)
+    route = routing.resolve_chat_id(borrowing.user_id_id)
+    if route is None:
+        logger.info("User %s is not registered on Telegram", borrowing.user_id_id)
+        return None
+    short_url = shortlinks.shorten(instance.session_url)
 
     notification_text = (
         f"Hello there, dear reader! 📚🐝\n\n"
@@ -56,13 +58,16 @@ def send_user_payment_message(instance):
         f"Thank you for choosing BuzzingPages for your reading needs! 📖✨"
     )
 
-    return send_message(chat_id=notification.chat_id, notification_text=notification_text)
+    return outbox.enqueue(route.chat_id, notification_text, kind="payment_link")
 
 
-@handle_notification_exception
 def send_admin_borrowing_message(instance):
-    admin_chat_id = "-4085174893"
+    """
+    Queue the new borrowing announcement for the admins' chat.
 
+    Returns:
+    - NotificationOutbox: The queued message.
+    """
     notification_text = (
         f"Hello Admins! 📚👋\n\n"
         f"A new borrowing has been created for the "
@@ -74,23 +79,18 @@ def send_admin_borrowing_message(instance):
         f"Thank you for your attention! ✨"
     )
 
-    return send_message(chat_id=admin_chat_id, notification_text=notification_text)
+    return outbox.enqueue(ADMIN_CHAT_ID, notification_text, kind="new_borrowing")
 
 
-@handle_notification_exception
-def notify_invalid_session(user_id):
-    notification = Notification.objects.get(user_id=user_id)
-    text = (f"Hi, {notification.telegram_username}! 😕\n\n"
+def expired_session_text(telegram_username):
+    return (f"Hi, {telegram_username}! 😕\n\n"
             f"We're sorry, but it seems that your session is expired. "
             f"Please review and try again or contact our support for assistance.")
-    return send_message(chat_id=notification.chat_id, notification_text=text)
 
 
-@handle_notification_exception
-def successful_payment_message(borrowing):
-    notification = Notification.objects.get(user=borrowing.user_id)
-    notification_text = (
-        f"Hello dear {notification.telegram_username}! 🎉💳\n\n"
+def successful_payment_text(telegram_username, borrowing):
+    return (
+        f"Hello dear {telegram_username}! 🎉💳\n\n"
         f"We're thrilled to inform you that your payment for the borrowing of '{borrowing.book_id.title}' at BuzzingPages was successful. 📚💰\n"
         f"Borrowing Details:\n\n"
         f"   - Borrow Date: {borrowing.borrow_date}\n"
@@ -98,16 +98,98 @@ def successful_payment_message(borrowing):
         f"Thank you for completing the payment and choosing BuzzingPages for your reading needs! 📖✨\n\n"
         f"If you have any questions or need assistance, feel free to reach out to us. Happy reading!"
     )
-    return send_message(chat_id=notification.chat_id, notification_text=notification_text)
 
 
-@handle_notification_exception
-def successful_fine_payment_message(borrowing):
-    notification = Notification.objects.get(user=borrowing.user_id)
-    notification_text = (
-        f"Hello {notification.telegram_username}! 🎉💳\n\n"
+def successful_fine_payment_text(telegram_username, borrowing):
+    return (
+        f"Hello {telegram_username}! 🎉💳\n\n"
         f"Great news! You've successfully paid the fine for the late return of '{borrowing.book_id.title}' at BuzzingPages. 📚💰\n"
         f"Thank you for addressing the fine and choosing BuzzingPages for your reading needs! 📖✨\n\n"
         f"If you have any questions or need further assistance, feel free to reach out. Happy reading!"
     )
-    return send_message(chat_id=notification.chat_id, notification_text=notification_text)
+
+
+def queue_paid_messages(borrowings, fine=False):
+    """
+    Queue a payment confirmation for the user of each borrowing.
+
+    Call it in the transaction marking the payments paid, so the messages
+    commit with it and are sent by the rate-limited dispatcher.
+
+    Args:
+    - borrowings (list): Borrowings whose payment was paid.
+    - fine (bool): Whether the paid payments were fines.
+
+    Returns:
+    - list: The queued `NotificationOutbox` rows, for users on Telegram.
+    """
+    routes = routing.resolve_chat_ids(borrowing.user_id_id for borrowing in borrowings)
+    text = successful_fine_payment_text if fine else successful_payment_text
+    messages = []
+    for borrowing in borrowings:
+        route = routes.get(borrowing.user_id_id)
+        if route is not None:
+            messages.append(
+                (route.chat_id, text(route.telegram_username, borrowing))
+            )
+    return outbox.enqueue_many(messages, kind="fine_paid" if fine else "payment_paid")
+
+
+def queue_sold_out_messages(payments):
+    """
+    Tell the users of paid payments whose book is sold out, and ask the
+    admins to refund them, see `queue_paid_messages`.
+
+    Returns:
+    - list: The queued `NotificationOutbox` rows.
+    """
+    if not payments:
+        return []
+    routes = routing.resolve_chat_ids(
+        payment.borrowing.user_id_id for payment in payments
+    )
+    messages = []
+    for payment in payments:
+        route = routes.get(payment.borrowing.user_id_id)
+        if route is not None:
+            messages.append(
+                (
+                    route.chat_id,
+                    f"Hello {route.telegram_username}! 😔\n\n"
+                    f"We received your payment for '{payment.borrowing.book_id.title}', "
+                    f"but the last copy was taken just before it arrived. "
+                    f"Our team will refund you shortly. We're sorry for the inconvenience! 🙏",
+                )
+            )
+    lines = [
+        f"   - Payment {payment.pk} ({payment.session_id}): "
+        f"{payment.money_to_pay}$ for '{payment.borrowing.book_id.title}', "
+        f"user {payment.borrowing.user_id_id}"
+        for payment in payments
+    ]
+    messages.append(
+        (
+            ADMIN_CHAT_ID,
+            "Hello Admins! ⚠️\n\n"
+            "These payments were received for books that are sold out "
+            "and need to be refunded:\n\n" + "\n".join(lines),
+        )
+    )
+    return outbox.enqueue_many(messages, kind="sold_out")
+
+
+def queue_expired_session_messages(user_ids):
+    """
+    Queue one expired session message per user on Telegram, see
+    `queue_paid_messages`.
+
+    Returns:
+    - list: The queued `NotificationOutbox` rows.
+    """
+    return outbox.enqueue_many(
+        (
+            (route.chat_id, expired_session_text(route.telegram_username))
+            for route in routing.resolve_chat_ids(user_ids).values()
+        ),
+        kind="expired_session",
+    )
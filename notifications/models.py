@@ -1,5 +1,6 @@
 from django.contrib.auth import get_user_model
 from django.db import models
+from django.utils import timezone
 
 
 class Notification(models.Model):
@@ -7,3 +8,60 @@ class Notification(models.Model):
     connect_token = models.CharField(max_length=63, null=True, unique=True)
     telegram_username = models.CharField(max_length=255, unique=True, null=True)
     chat_id = models.IntegerField(unique=True, null=True)
+
+
+class NotificationOutbox(models.Model):
+    """
+    A Telegram message waiting to be sent.
+
+    Written in the same transaction as the change it announces, so writes
+    never wait on Telegram; the dispatcher delivers pending rows in
+    batches afterwards and retries failures with backoff.
+    """
+
+    class StatusChoices(models.TextChoices):
+        PENDING = "Pending"
+        PROCESSING = "Processing"
+        SENT = "Sent"
+        FAILED = "Failed"
+
+    chat_id = models.BigIntegerField()
+    text = models.TextField()
+    kind = models.CharField(max_length=50, blank=True)
+    status = models.CharField(
+        max_length=20, choices=StatusChoices.choices, default=StatusChoices.PENDING
+    )
+    attempts = models.PositiveSmallIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    created_at = models.DateTimeField(default=timezone.now)
+    updated_at = models.DateTimeField(auto_now=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+    # From the row being written to Telegram accepting the message.
+    latency_ms = models.PositiveIntegerField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["status", "next_attempt_at"],
+                name="notification_outbox_due_idx",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.kind or 'Message'} to {self.chat_id}: {self.status}"
+
+
+class ShortLink(models.Model):
+    """A short `/s/<code>/` URL redirecting to a long one, e.g. a payment link."""
+
+    code = models.CharField(max_length=12, unique=True)
+    url = models.TextField()
+    # SHA-256 of the URL, so shortening the same URL again reuses its code.
+    url_hash = models.CharField(max_length=64, unique=True)
+    hits = models.PositiveBigIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_hit_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.code} -> {self.url}"
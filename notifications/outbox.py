@@ -0,0 +1,252 @@
+import asyncio
+import logging
+import random
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from notifications.delivery import TelegramDelivery
+from notifications.models import NotificationOutbox
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 100
+MAX_ATTEMPTS = 8
+RETRY_BACKOFF = timedelta(seconds=30)
+MAX_RETRY_BACKOFF = timedelta(hours=1)
+PROCESSING_TIMEOUT = timedelta(minutes=5)
+SCHEDULE_KEY = "notifications:scheduled"
+SCHEDULE_DELAY = 1
+DISPATCHER_KEY = "notifications:dispatching"
+
+
+def enqueue(chat_id, text, kind=""):
+    """
+    Queue a Telegram message for the dispatcher.
+
+    Call it inside the transaction making the change the message is about:
+    the row commits or rolls back with it, and the dispatcher is only woken
+    up once the commit succeeded.
+
+    Returns:
+    - NotificationOutbox: The queued message.
+    """
+    entry = NotificationOutbox.objects.create(chat_id=chat_id, text=text, kind=kind)
+    transaction.on_commit(dispatch_notifications)
+    return entry
+
+
+def enqueue_many(messages, kind=""):
+    """
+    Queue many Telegram messages in one INSERT, see `enqueue`.
+
+    Args:
+    - messages (iterable): (chat_id, text) pairs.
+
+    Returns:
+    - list: The queued `NotificationOutbox` rows.
+    """
+    entries = NotificationOutbox.objects.bulk_create(
+        NotificationOutbox(chat_id=chat_id, text=text, kind=kind)
+        for chat_id, text in messages
+    )
+    if entries:
+        transaction.on_commit(dispatch_notifications)
+    return entries
+
+
+def dispatch_notifications():
+    """
+    Wake up the dispatcher, at most once per `SCHEDULE_DELAY` seconds.
+
+    Messages committed while a wake-up is queued are sent by that run, so
+    a burst of commits starts one dispatcher instead of one per commit.
+    A broker outage must not fail the request that already committed; the
+    messages stay pending and the periodic `deliver_pending_notifications`
+    sends them later.
+    """
+    from notifications.tasks import deliver_notifications
+
+    if not cache.add(SCHEDULE_KEY, True, timeout=SCHEDULE_DELAY):
+        return
+    try:
+        deliver_notifications.apply_async(countdown=SCHEDULE_DELAY)
+    except Exception:
+        cache.delete(SCHEDULE_KEY)
+        logger.warning("Could not queue notification delivery", exc_info=True)
+
+
+def run_dispatcher(**options):
+    """
+    Run `process_outbox` unless another dispatcher is already running.
+
+    Only one engine sends at a time, so Telegram's global rate limit holds
+    for the whole service. Messages that became due while the run was
+    finishing get a new wake-up, since the one they sent was skipped.
+
+    Returns:
+    - dict: The `process_outbox` stats, None if another dispatcher runs.
+    """
+    timeout = PROCESSING_TIMEOUT.total_seconds()
+    if not cache.add(DISPATCHER_KEY, True, timeout=timeout):
+        return None
+    try:
+        stats = process_outbox(**options)
+    finally:
+        cache.delete(DISPATCHER_KEY)
+    if NotificationOutbox.objects.filter(
+        status=NotificationOutbox.StatusChoices.PENDING,
+        next_attempt_at__lte=timezone.now(),
+    ).exists():
+        dispatch_notifications()
+    return stats
+
+
+def claim_batch(batch_size=BATCH_SIZE):
+    """
+    Take up to `batch_size` due messages for this worker.
+
+    Rows are locked with `SKIP LOCKED`, so parallel dispatchers claim
+    disjoint batches instead of waiting on each other or sending twice.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        batch = list(
+            NotificationOutbox.objects.select_for_update(skip_locked=True)
+            .filter(
+                status=NotificationOutbox.StatusChoices.PENDING,
+                next_attempt_at__lte=now,
+            )
+            .order_by("next_attempt_at", "id")[:batch_size]
+        )
+        for entry in batch:
+            entry.status = NotificationOutbox.StatusChoices.PROCESSING
+            entry.attempts += 1
+            entry.updated_at = now
+        NotificationOutbox.objects.bulk_update(
+            batch, ["status", "attempts", "updated_at"]
+        )
+    return batch
+
+
+def retry_delay(attempts):
+    """Jittered exponential backoff before the next delivery attempt."""
+    delay = min(MAX_RETRY_BACKOFF, RETRY_BACKOFF * 2 ** (attempts - 1))
+    return delay * random.uniform(0.5, 1)
+
+
+def record_results(batch, results):
+    """
+    Write the outcome of a delivered batch back in one UPDATE per field set.
+
+    Returns:
+    - dict: Counts of sent, retried and failed messages.
+    """
+    now = timezone.now()
+    stats = {"sent": 0, "retried": 0, "failed": 0}
+    for entry, result in zip(batch, results):
+        entry.updated_at = now
+        if result.ok:
+            entry.status = NotificationOutbox.StatusChoices.SENT
+            entry.sent_at = now
+            entry.latency_ms = (now - entry.created_at) // timedelta(milliseconds=1)
+            entry.last_error = ""
+            stats["sent"] += 1
+        elif result.retryable and entry.attempts < MAX_ATTEMPTS:
+            entry.status = NotificationOutbox.StatusChoices.PENDING
+            entry.next_attempt_at = now + retry_delay(entry.attempts)
+            entry.last_error = result.error or ""
+            stats["retried"] += 1
+        else:
+            entry.status = NotificationOutbox.StatusChoices.FAILED
+            entry.last_error = result.error or ""
+            stats["failed"] += 1
+    NotificationOutbox.objects.bulk_update(
+        batch,
+        [
+            "status",
+            "sent_at",
+            "latency_ms",
+            "last_error",
+            "next_attempt_at",
+            "updated_at",
+        ],
+    )
+    return stats
+
+
+def release_stale():
+    """Put messages claimed by a dispatcher that died back in the queue."""
+    now = timezone.now()
+    return NotificationOutbox.objects.filter(
+        status=NotificationOutbox.StatusChoices.PROCESSING,
+        updated_at__lt=now - PROCESSING_TIMEOUT,
+    ).update(status=NotificationOutbox.StatusChoices.PENDING, updated_at=now)
+
+
+def run_off_hub(func, *args):
+    """
+    Call `func` in a real OS thread if eventlet has patched this worker.
+
+    The Celery worker runs on the eventlet pool. An asyncio loop driven from
+    one of its green threads blocks the hub, and every other task with it,
+    for as long as the loop runs. eventlet's thread pool runs the loop in an
+    OS thread instead while the calling green thread waits cooperatively.
+    """
+    try:
+        from eventlet import patcher, tpool
+    except ImportError:
+        return func(*args)
+    if not patcher.is_monkey_patched("thread"):
+        return func(*args)
+    return tpool.execute(func, *args)
+
+
+def process_outbox(batch_size=BATCH_SIZE, max_batches=None, **options):
+    """
+    Deliver due messages batch by batch until none are left.
+
+    Each batch is claimed in a short transaction, sent concurrently by one
+    `TelegramDelivery` engine kept for the whole run, so its rate limits
+    hold across batches, and recorded in a second short transaction. No
+    transaction is open while Telegram is called. The engine's event loop
+    only runs through `run_off_hub`; the database work stays in the calling
+    thread.
+
+    Args:
+    - batch_size (int): Messages claimed and sent at a time.
+    - max_batches (int): Stop after this many batches, None for no limit.
+    - options: Passed on to `TelegramDelivery`.
+
+    Returns:
+    - dict: Counts of batches, sent, retried and failed messages, and the
+      highest delivery latency in milliseconds.
+    """
+    stats = {"batches": 0, "sent": 0, "retried": 0, "failed": 0, "max_latency_ms": 0}
+    loop = asyncio.new_event_loop()
+    delivery = TelegramDelivery(**options)
+    run_off_hub(loop.run_until_complete, delivery.__aenter__())
+    try:
+        while max_batches is None or stats["batches"] < max_batches:
+            batch = claim_batch(batch_size)
+            if not batch:
+                break
+            results = run_off_hub(
+                loop.run_until_complete,
+                delivery.send_many([(entry.chat_id, entry.text) for entry in batch]),
+            )
+            for key, count in record_results(batch, results).items():
+                stats[key] += count
+            stats["batches"] += 1
+            # Keep the dispatcher lock of a long run, see `run_dispatcher`.
+            cache.touch(DISPATCHER_KEY, PROCESSING_TIMEOUT.total_seconds())
+            stats["max_latency_ms"] = max(
+                [stats["max_latency_ms"]]
+                + [entry.latency_ms for entry in batch if entry.latency_ms is not None]
+            )
+    finally:
+        run_off_hub(loop.run_until_complete, delivery.__aexit__(None, None, None))
+        loop.close()
+    return stats
@@ -0,0 +1,128 @@
+import time
+from collections import namedtuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from notifications.models import Notification
+from notifications.shortlinks import LRUCache
+
+LRU_SIZE = 50_000
+# How long this process trusts a route without asking the shared cache. It
+# bounds how late other processes see a chat connected in the bot.
+LOCAL_TTL = 60
+CACHE_PREFIX = "chatroute:"
+# Cached for users who are not on Telegram, for a shorter time, so bulk
+# jobs don't query for them on every run either.
+NOT_REGISTERED = ()
+
+Route = namedtuple("Route", "chat_id telegram_username")
+
+_lru = LRUCache(LRU_SIZE)
+
+
+def _key(user_id):
+    return f"{CACHE_PREFIX}{user_id}"
+
+
+def _remember(routes):
+    expires_at = time.monotonic() + LOCAL_TTL
+    for user_id, route in routes.items():
+        _lru.set(user_id, (route, expires_at))
+
+
+def resolve_chat_ids(user_ids):
+    """
+    Map users to their Telegram chats, in at most one query.
+
+    Lookups go to the in-process LRU first, then the shared cache in one
+    round trip, and only the users found in neither to the database.
+
+    Args:
+    - user_ids (iterable): Ids of the users to notify.
+
+    Returns:
+    - dict: `Route` (chat_id, telegram_username) per user id, only for the
+      users registered on Telegram.
+    """
+    routes = {}
+    missing = []
+    now = time.monotonic()
+    for user_id in set(user_ids):
+        local = _lru.get(user_id)
+        if local is not None and local[1] > now:
+            routes[user_id] = local[0]
+        else:
+            missing.append(user_id)
+
+    if missing:
+        cached = cache.get_many([_key(user_id) for user_id in missing])
+        found = {}
+        for user_id in missing:
+            route = cached.get(_key(user_id))
+            if route is not None:
+                found[user_id] = Route(*route) if route else NOT_REGISTERED
+        missing = [user_id for user_id in missing if user_id not in found]
+
+        if missing:
+            loaded = dict.fromkeys(missing, NOT_REGISTERED)
+            for user_id, chat_id, username in Notification.objects.filter(
+                user_id__in=missing, chat_id__isnull=False
+            ).values_list("user_id", "chat_id", "telegram_username"):
+                loaded[user_id] = Route(chat_id, username)
+            registered = {
+                _key(user_id): tuple(route)
+                for user_id, route in loaded.items()
+                if route
+            }
+            if registered:
+                cache.set_many(registered, settings.CHAT_ROUTE_CACHE_TIMEOUT)
+            if len(registered) < len(loaded):
+                cache.set_many(
+                    {
+                        _key(user_id): NOT_REGISTERED
+                        for user_id, route in loaded.items()
+                        if not route
+                    },
+                    settings.CHAT_ROUTE_NOT_REGISTERED_TIMEOUT,
+                )
+            found.update(loaded)
+
+        _remember(found)
+        routes.update(found)
+
+    return {user_id: route for user_id, route in routes.items() if route}
+
+
+def resolve_chat_id(user_id):
+    """
+    Returns:
+    - Route: The user's chat and Telegram username, or None if they are not
+      registered on Telegram.
+    """
+    return resolve_chat_ids([user_id]).get(user_id)
+
+
+def invalidate(user_id):
+    """
+    Forget the route of a user in this process and the shared cache.
+
+    Done at once and again after commit, so a lookup racing the transaction
+    can't keep the old route cached. Other processes drop their copy within
+    `LOCAL_TTL`. A process whose cache isn't the shared one, e.g. a bot
+    configured without it, can't reach the shared entry; users who were
+    not registered then show up after `CHAT_ROUTE_NOT_REGISTERED_TIMEOUT`.
+    """
+
+    def forget():
+        _lru.delete(user_id)
+        cache.delete(_key(user_id))
+
+    forget()
+    transaction.on_commit(forget)
+
+
+def clear():
+    """Forget every route kept in this process."""
+    _lru.clear()
@@ -0,0 +1,182 @@
+import atexit
+import hashlib
+import secrets
+import string
+import threading
+import time
+from collections import Counter, OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import Case, F, Value, When
+from django.urls import reverse
+from django.utils import timezone
+
+from notifications.models import ShortLink
+
+ALPHABET = string.digits + string.ascii_letters
+CODE_LENGTH = 8
+LRU_SIZE = 10_000
+HIT_FLUSH_COUNT = 100
+HIT_FLUSH_INTERVAL = 10
+CACHE_PREFIX = "shortlink:"
+
+
+def encode_base62(number):
+    """Write a non-negative integer in base 62 (0-9, a-z, A-Z)."""
+    digits = []
+    while True:
+        number, remainder = divmod(number, 62)
+        digits.append(ALPHABET[remainder])
+        if not number:
+            return "".join(reversed(digits))
+
+
+def new_code():
+    """
+    A random base62 code. Codes are not derived from the row id, so links
+    can't be enumerated to find other users' payment pages.
+    """
+    return encode_base62(secrets.randbelow(62**CODE_LENGTH)).rjust(CODE_LENGTH, "0")
+
+
+def shorten(url):
+    """
+    Return the short URL of `url`, creating the link on first use.
+
+    Runs entirely against the database, with no outbound call, so it is
+    cheap enough for signals and request handlers. The same URL always
+    gets the same code.
+
+    Returns:
+    - str: Absolute short URL under `SHORT_LINK_BASE_URL`.
+    """
+    url_hash = hashlib.sha256(url.encode()).hexdigest()
+    link = ShortLink.objects.filter(url_hash=url_hash).only("code").first()
+    while link is None:
+        try:
+            with transaction.atomic():
+                link = ShortLink.objects.create(
+                    code=new_code(), url=url, url_hash=url_hash
+                )
+        except IntegrityError:
+            # A code collision, or the same URL shortened concurrently.
+            link = ShortLink.objects.filter(url_hash=url_hash).only("code").first()
+    path = reverse("notifications:short-link", args=[link.code])
+    return f"{settings.SHORT_LINK_BASE_URL.rstrip('/')}{path}"
+
+
+class LRUCache:
+    """A small thread-safe least-recently-used mapping."""
+
+    def __init__(self, size):
+        self.size = size
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._items.get(key)
+            if value is not None:
+                self._items.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            if len(self._items) > self.size:
+                self._items.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._items.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+
+_lru = LRUCache(LRU_SIZE)
+
+
+def resolve(code):
+    """
+    Return the long URL of a code, or None if there is no such link.
+
+    Links never change, so lookups are served from an in-process LRU,
+    then the shared cache, and only then the database.
+    """
+    url = _lru.get(code)
+    if url is None:
+        url = cache.get(CACHE_PREFIX + code)
+        if url is None:
+            url = (
+                ShortLink.objects.filter(code=code)
+                .values_list("url", flat=True)
+                .first()
+            )
+            if url is None:
+                return None
+            cache.set(CACHE_PREFIX + code, url, settings.SHORT_LINK_CACHE_TIMEOUT)
+        _lru.set(code, url)
+    return url
+
+
+class HitCounter:
+    """
+    Counts redirects in memory and writes them in batches.
+
+    Every `flush_count` hits or `flush_interval` seconds, whichever comes
+    first, all pending counts go to the database in a single UPDATE, so a
+    redirect costs no write of its own. Counts still pending when the
+    process exits are flushed then.
+    """
+
+    def __init__(self, flush_count=HIT_FLUSH_COUNT, flush_interval=HIT_FLUSH_INTERVAL):
+        self.flush_count = flush_count
+        self.flush_interval = flush_interval
+        self.pending = Counter()
+        self._total = 0
+        self._flushed_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def add(self, code):
+        with self._lock:
+            self.pending[code] += 1
+            self._total += 1
+            due = (
+                self._total >= self.flush_count
+                or time.monotonic() - self._flushed_at >= self.flush_interval
+            )
+        if due:
+            self.flush()
+
+    def flush(self):
+        """
+        Returns:
+        - int: Number of hits written.
+        """
+        with self._lock:
+            pending, self.pending = self.pending, Counter()
+            self._total = 0
+            self._flushed_at = time.monotonic()
+        if not pending:
+            return 0
+        ShortLink.objects.filter(code__in=pending).update(
+            hits=F("hits")
+            + Case(
+                *(
+                    When(code=code, then=Value(count))
+                    for code, count in pending.items()
+                ),
+                default=Value(0),
+            ),
+            last_hit_at=timezone.now(),
+        )
+        return sum(pending.values())
+
+
+hits = HitCounter()
+atexit.register(hits.flush)
@@ -0,0 +1,17 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from notifications import routing
+from notifications.models import Notification
+
+
+@receiver(post_save, sender=Notification)
+@receiver(post_delete, sender=Notification)
+def invalidate_chat_route(sender, instance, **kwargs):
+    """
+    Signal receiver function triggered after a Notification is saved or
+    deleted, e.g. when a user connects their chat in the bot.
+
+    Drops the user's cached route so messages go to the new chat at once.
+    """
+    routing.invalidate(instance.user_id)
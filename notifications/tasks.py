@@ -0,0 +1,30 @@
+import logging
+
+from celery import shared_task
+
+from notifications.outbox import release_stale, run_dispatcher
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task
+def deliver_notifications():
+    """
+    Asynchronous task sending queued Telegram messages, woken up whenever
+    a transaction queuing messages commits.
+    """
+    return run_dispatcher()
+
+
+@shared_task
+def deliver_pending_notifications():
+    """
+    Periodic task re-queueing messages of dead dispatchers and sending
+    the ones whose retry is due or whose wake-up was lost.
+    """
+    released = release_stale()
+    stats = run_dispatcher() or {"batches": 0, "busy": True}
+    stats["released"] = released
+    if stats["batches"]:
+        logger.info("Pending notifications delivered: %s", stats)
+    return stats
@@ -0,0 +1,296 @@
+import asyncio
+import json
+import math
+import re
+import threading
+import time
+from collections import defaultdict
+
+import aiohttp
+from aiohttp import web
+
+from notifications.delivery import TokenBucket
+
+METHOD_PATH = re.compile(r"^/bot(?P<token>[^/]*)/(?P<method>\w+)$")
+
+
+class TelegramStub:
+    """
+    Local stand-in for the parts of the Telegram Bot API the bot uses.
+
+    Runs an aiohttp server on its own thread and event loop, so both sync
+    and async clients can be pointed at `url` instead of
+    `https://api.telegram.org`:
+
+        with TelegramStub(latency=0.05) as stub:
+            deliver(messages, api_url=stub.url, token="test")
+            assert len(stub.messages) == len(messages)
+
+    Like Telegram it answers `429 Too Many Requests` with a `retry_after`
+    when the bot goes over `global_rate` messages per second overall or
+    `chat_rate` per second to one chat (with short bursts allowed), and can
+    inject latency and failures for load tests.
+
+    It also plays Telegram's side of a webhook: once the bot called
+    `setWebhook`, `push_updates` posts updates to it with the registered
+    secret and at most `max_connections` requests in flight.
+    """
+
+    def __init__(
+        self,
+        latency=0.0,
+        global_rate=30,
+        chat_rate=1,
+        chat_burst=3,
+        host="127.0.0.1",
+        port=0,
+    ):
+        self.latency = latency
+        self.global_rate = global_rate
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.host = host
+        self.port = port
+        self.messages = []
+        self.requests = 0
+        self.rejected = 0
+        self._transports = set()
+        self._failures = []
+        self.webhook = {}
+        self.inline_answers = []
+        self._global = TokenBucket(global_rate, capacity=global_rate)
+        self._chats = defaultdict(
+            lambda: TokenBucket(self.chat_rate, capacity=self.chat_burst)
+        )
+        self._loop = None
+        self._runner = None
+        self._thread = None
+
+    @property
+    def url(self):
+        return f"http://{self.host}:{self.port}"
+
+    def start(self):
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, daemon=True)
+        self._thread.start()
+        asyncio.run_coroutine_threadsafe(self._serve(), self._loop).result()
+        return self
+
+    def stop(self):
+        asyncio.run_coroutine_threadsafe(self._runner.cleanup(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def fail_next(self, count=1, status=500, retry_after=1, empty=False):
+        """
+        Answer the next `count` requests with an error, without a body if
+        `empty`, like a proxy in front of the Bot API may.
+        """
+        self._failures.extend([(status, retry_after, empty)] * count)
+
+    def reset(self):
+        self.messages.clear()
+        self.inline_answers.clear()
+        self.requests = self.rejected = 0
+        self._transports.clear()
+        self._failures.clear()
+        self._chats.clear()
+        self._global = TokenBucket(self.global_rate, capacity=self.global_rate)
+
+    async def _serve(self):
+        app = web.Application()
+        app.router.add_route("*", "/{path:.*}", self._handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+
+    @property
+    def connections(self):
+        """Number of TCP connections clients opened."""
+        return len(self._transports)
+
+    async def _handle(self, request):
+        self.requests += 1
+        self._transports.add(request.transport)
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        match = METHOD_PATH.match(request.path)
+        if not match or match["method"] not in self._methods:
+            return _error(404, "Not Found")
+        if self._failures:
+            status, retry_after, empty = self._failures.pop(0)
+            if empty:
+                return web.Response(status=status)
+            if status == 429:
+                return self._too_many_requests(retry_after)
+            return _error(status, "Injected failure")
+
+        try:
+            params = await request.json()
+        except ValueError:
+            params = dict(await request.post()) or dict(request.query)
+        return await self._methods[match["method"]](self, params)
+
+    async def _get_me(self, params):
+        return _ok(
+            {"id": 1, "is_bot": True, "first_name": "Stub", "username": "stub_bot"}
+        )
+
+    async def _set_webhook(self, params):
+        self.webhook = {
+            "url": params["url"],
+            "secret_token": params.get("secret_token"),
+            "max_connections": int(params.get("max_connections") or 40),
+        }
+        return _ok(True)
+
+    async def _delete_webhook(self, params):
+        self.webhook = {}
+        self.inline_answers = []
+        return _ok(True)
+
+    async def _answer_inline_query(self, params):
+        self.inline_answers.append(
+            {
+                "inline_query_id": params["inline_query_id"],
+                "results": json.loads(params.get("results") or "[]"),
+            }
+        )
+        return _ok(True)
+
+    async def _send_message(self, params):
+        chat_id, text = params.get("chat_id"), params.get("text")
+        if not chat_id:
+            return _error(400, "Bad Request: chat not found")
+        if not text:
+            return _error(400, "Bad Request: message text is empty")
+
+        chat = self._chats[str(chat_id)]
+        for bucket in (chat, self._global):
+            wait = bucket.wait_time()
+            if wait:
+                return self._too_many_requests(math.ceil(wait))
+        chat.try_acquire()
+        self._global.try_acquire()
+
+        self.messages.append((chat_id, text, time.monotonic()))
+        return _ok(
+            {
+                "message_id": len(self.messages),
+                "chat": {"id": int(chat_id), "type": "private"},
+                "date": int(time.time()),
+                "text": text,
+            }
+        )
+
+    _methods = {
+        "getMe": _get_me,
+        "setWebhook": _set_webhook,
+        "deleteWebhook": _delete_webhook,
+        "sendMessage": _send_message,
+        "answerInlineQuery": _answer_inline_query,
+    }
+
+    async def push_updates(self, updates):
+        """
+        Post updates to the registered webhook, as Telegram would.
+
+        Can be awaited from any event loop; the requests are made from the
+        stub's own loop.
+
+        Returns:
+        - dict: Counts of accepted and refused updates and the duration.
+        """
+        future = asyncio.run_coroutine_threadsafe(self._push(updates), self._loop)
+        return await asyncio.wrap_future(future)
+
+    async def _push(self, updates):
+        headers = {}
+        if self.webhook.get("secret_token"):
+            headers["X-Telegram-Bot-Api-Secret-Token"] = self.webhook["secret_token"]
+        stats = {"accepted": 0, "refused": 0}
+        started = time.perf_counter()
+        connector = aiohttp.TCPConnector(limit=self.webhook["max_connections"])
+        async with aiohttp.ClientSession(connector=connector) as session:
+
+            async def push(update):
+                try:
+                    async with session.post(
+                        self.webhook["url"], json=update, headers=headers
+                    ) as response:
+                        accepted = response.status == 200
+                except aiohttp.ClientError:
+                    accepted = False
+                stats["accepted" if accepted else "refused"] += 1
+
+            await asyncio.gather(*(push(update) for update in updates))
+        stats["seconds"] = round(time.perf_counter() - started, 3)
+        return stats
+
+    def _too_many_requests(self, retry_after):
+        self.rejected += 1
+        return web.json_response(
+            {
+                "ok": False,
+                "error_code": 429,
+                "description": f"Too Many Requests: retry after {retry_after}",
+                "parameters": {"retry_after": retry_after},
+            },
+            status=429,
+        )
+
+
+def make_update(update_id, chat_id, text, username=None):
+    """A Telegram `Update` carrying a private text message."""
+    user = {"id": chat_id, "is_bot": False, "first_name": "Reader"}
+    if username:
+        user["username"] = username
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+            "from": user,
+            "text": text,
+            "entities": (
+                [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}]
+                if text.startswith("/")
+                else []
+            ),
+        },
+    }
+
+
+def make_inline_query(update_id, user_id, query):
+    """A Telegram `Update` carrying an inline query."""
+    return {
+        "update_id": update_id,
+        "inline_query": {
+            "id": str(update_id),
+            "from": {"id": user_id, "is_bot": False, "first_name": "Reader"},
+            "query": query,
+            "offset": "",
+        },
+    }
+
+
+def _ok(result):
+    return web.json_response({"ok": True, "result": result})
+
+
+def _error(status, description):
+    return web.json_response(
+        {"ok": False, "error_code": status, "description": description},
+        status=status,
+    )
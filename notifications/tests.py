@@ -0,0 +1,694 @@
+import asyncio
+import socket
+import threading
+import time
+from datetime import timedelta
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.cache.backends.locmem import LocMemCache
+from aiohttp import web
+from django.test import (
+    SimpleTestCase,
+    TestCase,
+    TransactionTestCase,
+    override_settings,
+)
+from django.utils import timezone
+
+from book_service.models import Book
+from borrowing_service.models import Borrowing
+from notifications import bot_queries, messages, outbox, routing, shortlinks
+from notifications.book_index import BookIndex
+from notifications.delivery import TelegramDelivery, TokenBucket, deliver
+from notifications.models import Notification, NotificationOutbox, ShortLink
+from notifications.bot import WEBHOOK_PATH, create_bot, create_webhook_app
+from notifications.telegram_stub import (
+    TelegramStub,
+    make_inline_query,
+    make_update,
+)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TokenBucketTests(SimpleTestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.bucket = TokenBucket(2, capacity=2, clock=self.clock)
+
+    def test_reservations_queue_up_behind_the_burst(self):
+        delays = [self.bucket.reserve() for _ in range(4)]
+
+        self.assertEqual(delays, [0.0, 0.0, 0.5, 1.0])
+
+    def test_tokens_refill_up_to_capacity(self):
+        self.bucket.reserve()
+        self.bucket.reserve()
+        self.clock.now = 10
+
+        self.assertTrue(self.bucket.try_acquire())
+        self.assertTrue(self.bucket.try_acquire())
+        self.assertFalse(self.bucket.try_acquire())
+        self.assertEqual(self.bucket.wait_time(), 0.5)
+
+    def test_pause_holds_back_the_next_token(self):
+        self.bucket.pause(3)
+
+        self.assertEqual(self.bucket.reserve(), 3.0)
+
+
+class TelegramDeliveryTests(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.stub = TelegramStub(global_rate=1000, chat_rate=1, chat_burst=1).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.stub.stop()
+        super().tearDownClass()
+
+    def setUp(self):
+        self.stub.reset()
+
+    def send_many(self, messages, **options):
+        options.setdefault("global_rate", 1000)
+
+        async def run():
+            async with TelegramDelivery("test", self.stub.url, **options) as delivery:
+                return await delivery.send_many(messages)
+
+        return asyncio.run(run())
+
+    def test_messages_share_one_connection_pool(self):
+        results = self.send_many([(chat_id, "Hello") for chat_id in range(1, 41)])
+
+        self.assertTrue(all(result.ok for result in results))
+        self.assertEqual(len(self.stub.messages), 40)
+        self.assertEqual(self.stub.rejected, 0)
+        self.assertLessEqual(self.stub.connections, 20)
+
+    def test_messages_to_one_chat_respect_its_rate(self):
+        self.send_many([(7, "first"), (7, "second")], chat_rate=5)
+
+        (_, first, sent_first), (_, second, sent_second) = self.stub.messages
+        self.assertEqual((first, second), ("first", "second"))
+        self.assertGreaterEqual(sent_second - sent_first, 0.15)
+
+    def test_too_many_requests_waits_for_retry_after(self):
+        self.stub.fail_next(status=429, retry_after=1)
+
+        (result,) = self.send_many([(7, "Hello")])
+
+        self.assertTrue(result.ok)
+        self.assertEqual(result.attempts, 2)
+        self.assertGreaterEqual(result.latency, 1)
+
+    def test_server_errors_are_retried(self):
+        self.stub.fail_next(count=2, status=502)
+
+        (result,) = self.send_many([(7, "Hello")], backoff=0.01)
+
+        self.assertTrue(result.ok)
+        self.assertEqual(result.attempts, 3)
+
+    def test_responses_without_a_body_are_http_errors(self):
+        self.stub.fail_next(status=502, empty=True)
+        (first,) = self.send_many([(7, "Hello")], backoff=0.01)
+        self.stub.fail_next(status=400, empty=True)
+        (second,) = self.send_many([(8, "Hello")])
+
+        self.assertTrue(first.ok)
+        self.assertEqual(first.attempts, 2)
+        self.assertFalse(second.ok)
+        self.assertEqual((second.attempts, second.error), (1, "HTTP 400"))
+        self.assertFalse(second.retryable)
+
+    def test_request_errors_are_not_retried(self):
+        (result,) = self.send_many([(7, "")])
+
+        self.assertFalse(result.ok)
+        self.assertEqual(result.attempts, 1)
+        self.assertEqual(result.error, "Bad Request: message text is empty")
+
+    def test_deliver_drains_messages_in_batches(self):
+        stats = deliver(
+            [(chat_id, "Hello") for chat_id in range(1, 251)],
+            token="test",
+            api_url=self.stub.url,
+            global_rate=1000,
+        )
+
+        self.assertEqual((stats["sent"], stats["failed"]), (250, 0))
+        self.assertEqual(len(self.stub.messages), 250)
+
+
+@override_settings(TELEGRAM_API_URL="https://telegram.test")
+class SendMessageTests(SimpleTestCase):
+    @mock.patch.dict("os.environ", {"BOT_TOKEN": "secret"})
+    @mock.patch.object(messages.session, "post")
+    def test_text_is_posted_as_json_with_timeout(self, post):
+        messages.send_message(42, "Fish & chips?")
+
+        post.assert_called_once_with(
+            "https://telegram.test/botsecret/sendMessage",
+            json={"chat_id": 42, "text": "Fish & chips?"},
+            timeout=(3.05, 10),
+        )
+
+
+class NotificationOutboxTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.stub = TelegramStub(global_rate=1000).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.stub.stop()
+        super().tearDownClass()
+
+    def setUp(self):
+        self.stub.reset()
+        cache.clear()
+
+    def process(self, **options):
+        return outbox.process_outbox(
+            token="test", api_url=self.stub.url, global_rate=1000, **options
+        )
+
+    @mock.patch("notifications.outbox.dispatch_notifications")
+    @mock.patch("notifications.messages.send_message")
+    def test_new_borrowing_is_queued_not_sent(self, send_message, dispatch):
+        user = get_user_model().objects.create_user(
+            email="reader@example.com", password="testpass"
+        )
+        book = Book.objects.create(
+            title="Outbox",
+            author="Author",
+            cover=Book.CoverChoices.SOFT,
+            inventory=1,
+            daily_fee=1,
+        )
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Borrowing.objects.create(
+                book_id=book,
+                user_id=user,
+                expected_return_date=timezone.now().date() + timedelta(days=3),
+            )
+            dispatch.assert_not_called()
+
+        entry = NotificationOutbox.objects.get()
+        self.assertEqual(entry.chat_id, messages.ADMIN_CHAT_ID)
+        self.assertEqual(entry.kind, "new_borrowing")
+        self.assertIn("reader@example.com", entry.text)
+        dispatch.assert_called_once_with()
+        send_message.assert_not_called()
+        self.assertEqual(self.stub.requests, 0)
+
+    def test_due_messages_are_sent_in_batches(self):
+        NotificationOutbox.objects.bulk_create(
+            NotificationOutbox(chat_id=chat_id, text=f"Hello {chat_id}")
+            for chat_id in range(1, 6)
+        )
+        NotificationOutbox.objects.create(
+            chat_id=99,
+            text="Later",
+            next_attempt_at=timezone.now() + timedelta(hours=1),
+        )
+
+        stats = self.process(batch_size=2)
+
+        self.assertEqual((stats["batches"], stats["sent"]), (3, 5))
+        self.assertEqual(len(self.stub.messages), 5)
+        sent = NotificationOutbox.objects.filter(
+            status=NotificationOutbox.StatusChoices.SENT
+        )
+        self.assertEqual(sent.count(), 5)
+        self.assertFalse(sent.filter(latency_ms__isnull=True).exists())
+        self.assertEqual(
+            NotificationOutbox.objects.get(chat_id=99).status,
+            NotificationOutbox.StatusChoices.PENDING,
+        )
+
+    def test_event_loop_runs_off_the_eventlet_hub(self):
+        NotificationOutbox.objects.create(chat_id=7, text="Hello")
+        threads = []
+
+        def execute(func, *args):
+            # Stand-in for eventlet's thread pool: run in another OS thread.
+            result = {}
+            worker = threading.Thread(target=lambda: result.update(ok=func(*args)))
+            worker.start()
+            worker.join()
+            threads.append(worker.ident)
+            return result["ok"]
+
+        with mock.patch(
+            "eventlet.patcher.is_monkey_patched", return_value=True
+        ), mock.patch("eventlet.tpool.execute", side_effect=execute):
+            stats = self.process()
+
+        self.assertEqual(stats["sent"], 1)
+        self.assertEqual(len(threads), 3)
+        self.assertNotIn(threading.get_ident(), threads)
+
+    def test_failed_delivery_is_retried_later(self):
+        entry = NotificationOutbox.objects.create(chat_id=7, text="Hello")
+        self.stub.fail_next(status=502)
+
+        stats = self.process(max_attempts=1)
+
+        entry.refresh_from_db()
+        self.assertEqual(stats["retried"], 1)
+        self.assertEqual(entry.status, NotificationOutbox.StatusChoices.PENDING)
+        self.assertEqual(entry.attempts, 1)
+        self.assertGreater(entry.next_attempt_at, timezone.now())
+        self.assertEqual(entry.last_error, "Injected failure")
+
+        NotificationOutbox.objects.filter(pk=entry.pk).update(
+            next_attempt_at=timezone.now()
+        )
+        self.process()
+        entry.refresh_from_db()
+        self.assertEqual(entry.status, NotificationOutbox.StatusChoices.SENT)
+        self.assertEqual(entry.attempts, 2)
+
+    def test_rejected_message_is_not_retried(self):
+        entry = NotificationOutbox.objects.create(chat_id=7, text="")
+
+        stats = self.process()
+
+        entry.refresh_from_db()
+        self.assertEqual(stats["failed"], 1)
+        self.assertEqual(entry.status, NotificationOutbox.StatusChoices.FAILED)
+
+    def test_stale_claims_are_released(self):
+        entry = NotificationOutbox.objects.create(
+            chat_id=7, text="Hello", status=NotificationOutbox.StatusChoices.PROCESSING
+        )
+        NotificationOutbox.objects.filter(pk=entry.pk).update(
+            updated_at=timezone.now() - outbox.PROCESSING_TIMEOUT * 2
+        )
+
+        self.assertEqual(outbox.release_stale(), 1)
+        self.assertEqual(self.process()["sent"], 1)
+
+    @mock.patch("notifications.tasks.deliver_notifications.apply_async")
+    def test_burst_of_commits_wakes_up_one_dispatcher(self, apply_async):
+        for chat_id in range(1, 4):
+            with self.captureOnCommitCallbacks(execute=True):
+                outbox.enqueue(chat_id, "Hello")
+
+        apply_async.assert_called_once_with(countdown=outbox.SCHEDULE_DELAY)
+
+    @mock.patch("notifications.tasks.deliver_notifications.apply_async")
+    def test_wake_up_is_retried_after_broker_failure(self, apply_async):
+        apply_async.side_effect = ConnectionError
+        outbox.dispatch_notifications()
+        apply_async.side_effect = None
+        outbox.dispatch_notifications()
+
+        self.assertEqual(apply_async.call_count, 2)
+
+    @mock.patch("notifications.outbox.dispatch_notifications")
+    def test_only_one_dispatcher_runs_at_a_time(self, dispatch):
+        NotificationOutbox.objects.create(chat_id=7, text="Hello")
+        options = {"token": "test", "api_url": self.stub.url}
+
+        cache.add(outbox.DISPATCHER_KEY, True)
+        self.assertIsNone(outbox.run_dispatcher(**options))
+        self.assertEqual(self.stub.requests, 0)
+
+        cache.delete(outbox.DISPATCHER_KEY)
+        self.assertEqual(outbox.run_dispatcher(**options)["sent"], 1)
+        self.assertIsNone(cache.get(outbox.DISPATCHER_KEY))
+        dispatch.assert_not_called()
+
+    @mock.patch("notifications.outbox.dispatch_notifications")
+    def test_messages_queued_during_a_run_get_a_new_wake_up(self, dispatch):
+        def run(**options):
+            NotificationOutbox.objects.create(chat_id=7, text="Hello")
+            return {"batches": 0}
+
+        with mock.patch("notifications.outbox.process_outbox", side_effect=run):
+            outbox.run_dispatcher()
+
+        dispatch.assert_called_once_with()
+
+
+@override_settings(SHORT_LINK_BASE_URL="https://lib.test")
+class ShortLinkTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        shortlinks._lru.clear()
+        hits = mock.patch.object(shortlinks, "hits", shortlinks.HitCounter())
+        hits.start()
+        self.addCleanup(hits.stop)
+
+    def test_base62_encoding(self):
+        self.assertEqual(shortlinks.encode_base62(0), "0")
+        self.assertEqual(shortlinks.encode_base62(61), "Z")
+        self.assertEqual(shortlinks.encode_base62(62), "10")
+
+    def test_same_url_gets_same_code(self):
+        first = shortlinks.shorten("https://checkout.stripe.com/c/pay/cs_1")
+        second = shortlinks.shorten("https://checkout.stripe.com/c/pay/cs_1")
+        other = shortlinks.shorten("https://checkout.stripe.com/c/pay/cs_2")
+
+        self.assertEqual(first, second)
+        self.assertNotEqual(first, other)
+        self.assertRegex(first, r"^https://lib\.test/s/[0-9a-zA-Z]{8}/$")
+        self.assertEqual(ShortLink.objects.count(), 2)
+
+    def test_redirect_is_served_from_memory_once_seen(self):
+        url = "https://checkout.stripe.com/c/pay/cs_1"
+        path = shortlinks.shorten(url).removeprefix("https://lib.test")
+
+        with self.assertNumQueries(1):
+            response = self.client.get(path)
+        self.assertRedirects(response, url, fetch_redirect_response=False)
+
+        shortlinks._lru.clear()
+        with self.assertNumQueries(0):
+            self.client.get(path)
+            self.client.get(path)
+
+    def test_unknown_code_is_not_found(self):
+        self.assertEqual(self.client.get("/s/missing/").status_code, 404)
+
+    def test_hits_are_written_in_batches(self):
+        shortlinks.hits.flush_count = 3
+        link = ShortLink.objects.get(
+            code=shortlinks.shorten("https://example.com/").split("/")[-2]
+        )
+        path = f"/s/{link.code}/"
+
+        self.client.get(path)
+        self.client.get(path)
+        link.refresh_from_db()
+        self.assertEqual(link.hits, 0)
+
+        self.client.get(path)
+        link.refresh_from_db()
+        self.assertEqual(link.hits, 3)
+        self.assertIsNotNone(link.last_hit_at)
+
+
+def create_book(title, author="Author", inventory=1):
+    return Book.objects.create(
+        title=title,
+        author=author,
+        cover=Book.CoverChoices.SOFT,
+        inventory=inventory,
+        daily_fee=1,
+    )
+
+
+class ChatRoutingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        routing.clear()
+        self.users = [
+            get_user_model().objects.create_user(
+                email=f"reader{index}@example.com", password="testpass"
+            )
+            for index in range(3)
+        ]
+        for index, user in enumerate(self.users[:2]):
+            Notification.objects.create(
+                user=user, telegram_username=f"reader{index}", chat_id=100 + index
+            )
+        self.user_ids = [user.pk for user in self.users]
+
+    def test_bulk_resolve_is_one_query_then_cached(self):
+        with self.assertNumQueries(1):
+            routes = routing.resolve_chat_ids(self.user_ids)
+        self.assertEqual(
+            routes,
+            {
+                self.user_ids[0]: (100, "reader0"),
+                self.user_ids[1]: (101, "reader1"),
+            },
+        )
+
+        with self.assertNumQueries(0):
+            self.assertEqual(routing.resolve_chat_ids(self.user_ids), routes)
+        # Another process only has the shared cache.
+        routing.clear()
+        with self.assertNumQueries(0):
+            self.assertEqual(routing.resolve_chat_ids(self.user_ids), routes)
+
+    def test_route_changes_are_seen_at_once(self):
+        self.assertIsNone(routing.resolve_chat_id(self.user_ids[2]))
+        Notification.objects.create(
+            user=self.users[2], telegram_username="late", chat_id=102
+        )
+        self.assertEqual(routing.resolve_chat_id(self.user_ids[2]), (102, "late"))
+
+        notification = Notification.objects.get(user=self.users[0])
+        notification.chat_id = 200
+        notification.save()
+        self.assertEqual(routing.resolve_chat_id(self.user_ids[0]).chat_id, 200)
+
+        notification.delete()
+        self.assertIsNone(routing.resolve_chat_id(self.user_ids[0]))
+
+    def test_chat_connected_where_the_shared_cache_is_not_reachable(self):
+        workers = LocMemCache("chat-routes-workers", {})
+        bot = LocMemCache("chat-routes-bot", {})
+        user_id = self.user_ids[2]
+        now = time.time()
+
+        with mock.patch.object(routing, "cache", workers):
+            self.assertEqual(
+                routing.resolve_chat_ids([self.user_ids[0], user_id]),
+                {self.user_ids[0]: (100, "reader0")},
+            )
+        # The bot connects the chat and invalidates only its own cache.
+        with mock.patch.object(routing, "cache", bot):
+            with self.captureOnCommitCallbacks(execute=True):
+                Notification.objects.create(
+                    user=self.users[2], telegram_username="late", chat_id=102
+                )
+        routing.clear()
+
+        with mock.patch.object(routing, "cache", workers):
+            self.assertIsNone(routing.resolve_chat_id(user_id))
+            later = now + settings.CHAT_ROUTE_NOT_REGISTERED_TIMEOUT + 1
+            with mock.patch("time.time", return_value=later), self.assertNumQueries(1):
+                routing.clear()
+                self.assertEqual(routing.resolve_chat_id(user_id), (102, "late"))
+                # Registered users stay cached for much longer.
+                self.assertEqual(routing.resolve_chat_id(self.user_ids[0]).chat_id, 100)
+
+    @mock.patch("notifications.messages.send_message")
+    def test_messages_use_the_cached_route(self, send_message):
+        book = create_book("Dune")
+        borrowing = Borrowing.objects.create(
+            book_id=book,
+            user_id=self.users[0],
+            expected_return_date=timezone.now().date(),
+        )
+        routing.resolve_chat_ids(self.user_ids)
+
+        # Only the INSERTs of the queued messages.
+        with self.assertNumQueries(2):
+            paid = messages.queue_paid_messages([borrowing])
+            expired = messages.queue_expired_session_messages(
+                [self.user_ids[0], self.user_ids[2]]
+            )
+
+        self.assertEqual([entry.chat_id for entry in paid + expired], [100, 100])
+        self.assertEqual(
+            [entry.kind for entry in paid + expired],
+            ["payment_paid", "expired_session"],
+        )
+        send_message.assert_not_called()
+
+
+class BotQueriesTests(TestCase):
+    def test_bot_queries_run_on_the_bounded_pool(self):
+        @bot_queries.bot_query
+        def thread_name():
+            return threading.current_thread().name
+
+        self.assertTrue(asyncio.run(thread_name()).startswith("bot-db"))
+
+    def test_borrowings_and_books_are_read_in_one_query(self):
+        user = get_user_model().objects.create_user(
+            email="reader@example.com", password="testpass"
+        )
+        Notification.objects.create(user=user, telegram_username="reader", chat_id=1)
+        for title in ("Dune", "Emma", "Ulysses"):
+            book = Book.objects.create(
+                title=title,
+                author="Author",
+                cover=Book.CoverChoices.SOFT,
+                inventory=1,
+                daily_fee=1,
+            )
+            Borrowing.objects.create(
+                book_id=book, user_id=user, expected_return_date=timezone.now().date()
+            )
+
+        with self.assertNumQueries(1):
+            borrowings = bot_queries.user_borrowings.__wrapped__("reader")
+
+        self.assertEqual(
+            sorted(title for title, _ in borrowings), ["Dune", "Emma", "Ulysses"]
+        )
+        self.assertEqual(bot_queries.user_borrowings.__wrapped__("stranger"), [])
+
+
+class BookIndexTests(TestCase):
+    def setUp(self):
+        # Serve changes as soon as they are written.
+        lag = mock.patch("book_service.sync.SYNC_LAG", timedelta(0))
+        lag.start()
+        self.addCleanup(lag.stop)
+        create_book("Dune", "Frank Herbert")
+        create_book("Dune Messiah", "Frank Herbert")
+        create_book("The Martian", "Andy Weir", inventory=0)
+        create_book("Emma", "Jane Austen")
+        self.index = BookIndex()
+        self.index.refresh()
+
+    def titles(self, query):
+        return [book.title for book in self.index.search(query)]
+
+    def test_search_by_title_and_author_prefix(self):
+        self.assertEqual(self.titles("du"), ["Dune", "Dune Messiah"])
+        self.assertEqual(self.titles("mart"), ["The Martian"])
+        self.assertEqual(self.titles("aust"), ["Emma"])
+        self.assertEqual(self.titles("herb mess"), ["Dune Messiah"])
+        self.assertEqual(self.titles("weir dune"), [])
+        self.assertEqual(self.titles("  "), [])
+
+    def test_titles_starting_with_the_query_come_first(self):
+        create_book("A Martian Odyssey", "Stanley Weinbaum")
+        create_book("Martian Time-Slip", "Philip K. Dick")
+        self.index.refreshed_at = None
+        self.index.refresh()
+
+        self.assertEqual(
+            self.titles("martian"),
+            ["Martian Time-Slip", "A Martian Odyssey", "The Martian"],
+        )
+
+    def test_refresh_applies_only_changes(self):
+        book = Book.objects.get(title="The Martian")
+        book.inventory = 3
+        book.save()
+        Book.objects.get(title="Emma").delete()
+        self.index.refreshed_at = None
+
+        self.assertEqual(self.index.refresh(), 2)
+
+        self.assertEqual(self.index.search("martian")[0].inventory, 3)
+        self.assertEqual(self.titles("emma"), [])
+        self.assertEqual(self.index.refresh(), 0)
+
+    def test_searches_never_query_the_database(self):
+        self.titles("dune")
+        with self.assertNumQueries(0):
+            self.assertEqual(self.titles("dune"), ["Dune", "Dune Messiah"])
+            self.assertEqual(self.titles("frank"), ["Dune", "Dune Messiah"])
+
+
+class BotWebhookTests(TransactionTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.stub = TelegramStub(global_rate=10_000).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.stub.stop()
+        super().tearDownClass()
+
+    def setUp(self):
+        self.stub.reset()
+
+    def serve(self, updates, expected_replies, secret_token="s3cret", replies=None):
+        replies = self.stub.messages if replies is None else replies
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            port = sock.getsockname()[1]
+        webhook_url = f"http://127.0.0.1:{port}{WEBHOOK_PATH}"
+
+        async def run():
+            bot = create_bot("42:test", self.stub.url)
+            app = create_webhook_app(bot, secret_token, webhook_url)
+            runner = web.AppRunner(app)
+            await runner.setup()
+            await web.TCPSite(runner, "127.0.0.1", port).start()
+            try:
+                self.assertEqual(self.stub.webhook["url"], webhook_url)
+                stats = await self.stub.push_updates(updates)
+                for _ in range(200):
+                    if len(replies) >= expected_replies:
+                        break
+                    await asyncio.sleep(0.05)
+                return stats
+            finally:
+                await runner.cleanup()
+
+        return asyncio.run(run())
+
+    def test_update_flood_is_answered(self):
+        updates = [
+            make_update(index, 5000 + index, "/myborrowings", f"reader{index}")
+            for index in range(300)
+        ]
+
+        stats = self.serve(updates, expected_replies=300)
+
+        self.assertEqual(stats["accepted"], 300)
+        self.assertEqual(len(self.stub.messages), 300)
+        self.assertEqual(
+            {chat_id for chat_id, _, _ in self.stub.messages},
+            {str(5000 + index) for index in range(300)},
+        )
+
+    def test_updates_without_the_secret_are_refused(self):
+        async def forget_secret(updates):
+            self.stub.webhook["secret_token"] = "wrong"
+            return await push_updates(updates)
+
+        push_updates = self.stub.push_updates
+        with mock.patch.object(self.stub, "push_updates", forget_secret):
+            stats = self.serve([make_update(1, 1, "/myborrowings")], 0)
+
+        self.assertEqual(stats["refused"], 1)
+        self.assertEqual(self.stub.messages, [])
+
+    @mock.patch("book_service.sync.SYNC_LAG", timedelta(0))
+    def test_inline_query_lists_matching_books(self):
+        create_book("Dune", "Frank Herbert", inventory=2)
+        create_book("The Martian", "Andy Weir", inventory=0)
+
+        with mock.patch.object(bot_queries, "index", BookIndex()):
+            self.serve(
+                [make_inline_query(1, 7, "dune"), make_inline_query(2, 7, "weir")],
+                expected_replies=2,
+                replies=self.stub.inline_answers,
+            )
+
+        answers = {
+            answer["inline_query_id"]: answer["results"]
+            for answer in self.stub.inline_answers
+        }
+        self.assertEqual([result["title"] for result in answers["1"]], ["Dune"])
+        self.assertIn("Available (2 in stock)", answers["1"][0]["description"])
+        self.assertIn("Not available", answers["2"][0]["description"])
@@ -0,0 +1,9 @@
+from django.urls import path
+
+from notifications.views import short_link_redirect
+
+urlpatterns = [
+    path("<str:code>/", short_link_redirect, name="short-link"),
+]
+
+app_name = "notifications"
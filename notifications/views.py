@@ -1 +1,17 @@
-from django.shortcuts import render
+from django.http import Http404, HttpResponseRedirect
+
+from notifications import shortlinks
+
+
+def short_link_redirect(request, code):
+    """
+    Redirect a short link to its long URL.
+
+    Served from memory once the link was seen by this process; the hit is
+    only counted in memory and written to the database in batches.
+    """
+    url = shortlinks.resolve(code)
+    if url is None:
+        raise Http404("No such link.")
+    shortlinks.hits.add(code)
+    return HttpResponseRedirect(url)
@@ -2,19 +2,10 @@ import asyncio
 import logging
 import os
 import sys
-import asyncio
-import logging
 
-import requests
-from aiogram.utils.markdown import *
-from asgiref.sync import sync_to_async
+from aiohttp import web
 from dotenv import load_dotenv
 
-from aiogram import Bot, Dispatcher
-from aiogram.enums import ParseMode
-from aiogram.filters import CommandStart, Command
-from aiogram.types import Message
-
 from django.conf import settings
 from django.apps import apps
 
@@ -43,6 +34,16 @@ conf = {
             "NAME": os.environ["POSTGRES_DB"],
             "USER": os.environ["POSTGRES_USER"],
             "PASSWORD": os.environ["POSTGRES_PASSWORD"],
+            # Keep the connections of the bot's DB threads open between queries.
+            "CONN_MAX_AGE": 60,
+        }
+    },
+    # The bot connects chats, so it must drop cached chat routes from the
+    # same cache the API and workers read them from.
+    "CACHES": {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": "redis://redis:6379/1",
         }
     },
     "TIME_ZONE": "UTC",
@@ -51,85 +52,41 @@ conf = {
 settings.configure(**conf)
 apps.populate(settings.INSTALLED_APPS)
 
-from notifications.models import Notification
-from borrowing_service.models import Borrowing
-from book_service.models import Book
+from notifications.bot import (
+    WEBHOOK_PATH,
+    create_bot,
+    create_webhook_app,
+    run_polling,
+)
 
 
 load_dotenv()
 TOKEN = os.environ.get("BOT_TOKEN")
+# "webhook" to serve updates behind the reverse proxy, "polling" otherwise.
+BOT_MODE = os.environ.get("BOT_MODE", "polling")
+WEBHOOK_BASE_URL = os.environ.get("WEBHOOK_BASE_URL")
+WEBHOOK_SECRET = os.environ.get("WEBHOOK_SECRET")
+WEBHOOK_HOST = os.environ.get("WEBHOOK_HOST", "0.0.0.0")
+WEBHOOK_PORT = int(os.environ.get("WEBHOOK_PORT", 8080))
 
-dp = Dispatcher()
-
-
-@dp.message(CommandStart())
-async def command_start_handler(message: Message) -> None:
-    """
-    Handles the /start command to create a user notification in the Django database
-    and sends a welcome message to the user on Telegram.
-    Args:
-    - message (Message): The message from the user.
-
-    """
-    text = message.text
-    user_id = int(text[text.find("userid") + 6 :])
-    user_token = text[7 : text.find("userid")]
-
-    await sync_to_async(Notification.objects.create)(
-        user_id=user_id,
-        connect_token=user_token,
-        telegram_username=message.from_user.username,
-        chat_id=message.chat.id,
-    )
-
-    await sync_to_async(Notification.objects.get)(user_id=user_id)
-
-    await message.answer(
-        f"Hi, {hbold(message.from_user.username)}! \n\n"
-        f"I will help you to keep track "
-        f"of your borrowings in our library. \n\n"
-        f"{hbold('Happy reading!')} \U0001F970"
-    )
 
-
-@dp.message(Command("myborrowings"))
-async def get_borrowings_handler(message: Message) -> None:
-    """
-    Handles the /myborrowings command to fetch information about the user's current
-    borrowings and sends a message to the user with this information.
-
-    Args:
-    - message (Message): The message from the user.
-    """
-    notification = await sync_to_async(Notification.objects.get)(
-        telegram_username=message.from_user.username
-    )
-
-    user_id = notification.user_id
-
-    user_borrowings = await sync_to_async(Borrowing.objects.filter)(user_id=user_id)
-
-    message_text = "Here are all of your current borrowings: \n"
-
-    for borrowing in await sync_to_async(list)(user_borrowings):
-        book_id = await sync_to_async(lambda: borrowing.book_id_id)()
-
-        book = await sync_to_async(Book.objects.get)(id=book_id)
-        return_date = await sync_to_async(lambda: borrowing.expected_return_date)()
-
-        message_text += f"{str(book)} - expected to return {return_date}\n"
-
-    await message.answer(message_text)
-
-
-async def main() -> None:
+def main() -> None:
     """
     The main function initializing and starting the Telegram bot.
+
+    In webhook mode it serves `WEBHOOK_PATH` over HTTP and can run as any
+    number of replicas; in polling mode a single process long-polls
+    Telegram.
     """
-    bot = Bot(TOKEN, parse_mode=ParseMode.HTML)
-    await dp.start_polling(bot)
+    bot = create_bot(TOKEN)
+    if BOT_MODE == "webhook":
+        webhook_url = f"{WEBHOOK_BASE_URL.rstrip('/')}{WEBHOOK_PATH}"
+        app = create_webhook_app(bot, WEBHOOK_SECRET, webhook_url)
+        web.run_app(app, host=WEBHOOK_HOST, port=WEBHOOK_PORT)
+    else:
+        asyncio.run(run_polling(bot))
 
 
 if __name__ == "__main__":
     logging.basicConfig(level=logging.INFO, stream=sys.stdout)
-    asyncio.run(main())
+    main()
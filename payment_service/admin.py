@@ -1,5 +1,19 @@
 from django.contrib import admin
 
-from payment_service.models import Payment
+from payment_service.models import Payment, ReconciliationRun, StripeEvent
 
 admin.site.register(Payment)
+
+
+@admin.register(StripeEvent)
+class StripeEventAdmin(admin.ModelAdmin):
+    list_display = ("event_id", "type", "status", "attempts", "received_at")
+    list_filter = ("status", "type")
+    search_fields = ("event_id",)
+
+
+@admin.register(ReconciliationRun)
+class ReconciliationRunAdmin(admin.ModelAdmin):
+    list_display = ("started_at", "window_start", "window_end", "status", "dry_run")
+    list_filter = ("status",)
+    readonly_fields = ("report",)
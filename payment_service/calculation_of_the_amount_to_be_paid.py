@@ -1,11 +1,10 @@
 import datetime
-from decimal import Decimal
 
-FINE_MULTIPLIER = Decimal("1.5")
+from payment_service.pricing import fine_cents, rental_cents, to_cents
 
 
 def calculating_total_sum_for_begin_of_borrowing(
-    daily_fee: float, expected_return: datetime
+    daily_fee: float, expected_return: datetime, today: datetime = None
 ) -> int:
     """
     Calculates the total sum for the beginning of borrowing.
@@ -13,12 +12,14 @@ def calculating_total_sum_for_begin_of_borrowing(
     Args:
     - daily_fee (float): Daily fee for borrowing.
     - expected_return (datetime): Expected return date.
+    - today (datetime): Borrow date, today by default.
 
     Returns:
     - int: Total sum for the beginning of borrowing in cents.
     """
-    days_in_borrowing = expected_return - datetime.date.today()
-    return int((days_in_borrowing.days + 1) * daily_fee * 100)
+    return rental_cents(
+        to_cents(daily_fee), expected_return, today or datetime.date.today()
+    )
 
 
 def calculating_sum_of_fine(
@@ -35,5 +36,4 @@ def calculating_sum_of_fine(
     Returns:
     - int: Sum of fine for late return in cents.
     """
-    fine_days = actual_return - expected_return
-    return int(fine_days.days * daily_fee * FINE_MULTIPLIER * 100)
+    return fine_cents(to_cents(daily_fee), expected_return, actual_return)
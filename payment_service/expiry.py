@@ -0,0 +1,98 @@
+import logging
+from datetime import timedelta
+
+import stripe
+from django.db import transaction
+from django.utils import timezone
+
+from notifications.routing import resolve_chat_ids
+from payment_service.gateway import PaymentGatewayUnavailable, get_gateway
+from payment_service.models import Payment
+from payment_service.status_events import status_changed
+from payment_service.stripe_helper import session_expires_at
+from payment_service.transitions import pay_sessions
+
+logger = logging.getLogger(__name__)
+
+EXPIRE_BATCH_SIZE = 1000
+RECONCILE_LIMIT = 100
+# Leaves time for the webhook of a session paid right before it expired.
+EXPIRY_GRACE = timedelta(minutes=5)
+
+
+def expire_overdue_payments(now=None, batch_size=EXPIRE_BATCH_SIZE):
+    """
+    Mark pending payments whose Stripe session expired as expired.
+
+    Rows past `expires_at` are found through `payment_status_expires_idx`
+    and expired with one UPDATE per batch, without calling Stripe.
+
+    Args:
+    - now (datetime): Current time, for tests.
+    - batch_size (int): Rows expired per transaction.
+
+    Returns:
+    - tuple: (number of payments expired, set of their users' IDs)
+    """
+    cutoff = (now or timezone.now()) - EXPIRY_GRACE
+    expired, user_ids = 0, set()
+    while True:
+        with transaction.atomic():
+            rows = list(
+                Payment.objects.select_for_update(skip_locked=True, of=("self",))
+                .filter(status=Payment.StatusChoices.PENDING, expires_at__lte=cutoff)
+                .values_list("id", "user_id")[:batch_size]
+            )
+            if not rows:
+                return expired, user_ids
+            payment_ids = [payment_id for payment_id, _ in rows]
+            expired += Payment.objects.filter(
+                pk__in=payment_ids, status=Payment.StatusChoices.PENDING
+            ).update(status=Payment.StatusChoices.EXPIRED, updated_at=timezone.now())
+            status_changed(payment_ids, Payment.StatusChoices.EXPIRED)
+        user_ids.update(user_id for _, user_id in rows)
+
+
+def expired_session_recipients(user_ids):
+    """Return [chat_id, telegram_username] of the users registered on Telegram."""
+    return [list(route) for route in resolve_chat_ids(user_ids).values()]
+
+
+def reconcile_untracked_payments(limit=RECONCILE_LIMIT):
+    """
+    Ask Stripe about pending payments without a known expiry.
+
+    Only rows created before `expires_at` was recorded, or whose session
+    creation result was lost, end up here; each is looked up once and gets
+    its `expires_at`, so the regular expiry pass takes over from then on.
+    Sessions Stripe reports as paid are marked paid.
+
+    Returns:
+    - int: Number of payments reconciled.
+    """
+    payments = list(
+        Payment.objects.filter(
+            status=Payment.StatusChoices.PENDING, expires_at__isnull=True
+        )
+        .exclude(session_id="")
+        .values_list("id", "session_id")[:limit]
+    )
+    reconciled, paid = 0, []
+    for payment_id, session_id in payments:
+        try:
+            session = get_gateway().retrieve_checkout_session(session_id)
+        except PaymentGatewayUnavailable as error:
+            logger.warning("Stopped reconciling payments: %s", error)
+            break
+        except stripe.error.StripeError as error:
+            logger.warning("Could not reconcile payment %s: %s", payment_id, error)
+            continue
+        Payment.objects.filter(pk=payment_id).update(
+            expires_at=session_expires_at(session), updated_at=timezone.now()
+        )
+        if session.get("payment_status") == "paid":
+            paid.append(session_id)
+        reconciled += 1
+    if paid:
+        pay_sessions(paid)
+    return reconciled
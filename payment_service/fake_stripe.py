@@ -0,0 +1,278 @@
+import json
+import random
+import re
+import secrets
+import threading
+import time
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlparse
+
+import stripe
+
+SESSION_TTL = 24 * 60 * 60
+SESSION_PATH = re.compile(r"^/v1/checkout/sessions/(?P<session_id>[\w-]+)$")
+
+
+def build_event(event_type, data_object, created=None):
+    """Wrap an API object in a Stripe event, as sent to webhooks."""
+    return {
+        "id": f"evt_{secrets.token_hex(12)}",
+        "object": "event",
+        "api_version": stripe.api_version,
+        "created": int(created or time.time()),
+        "type": event_type,
+        "data": {"object": dict(data_object)},
+    }
+
+
+def parse_stripe_form(body):
+    """Turn Stripe's `a[b][0][c]=1` form encoding back into nested dicts/lists."""
+    result = {}
+    for key, value in parse_qsl(body, keep_blank_values=True):
+        parts = re.findall(r"[^\[\]]+", key)
+        target = result
+        for part, following in zip(parts, parts[1:]):
+            target = _child(target, part, [] if following.isdigit() else {})
+        _child(target, parts[-1], value, replace=True)
+    return result
+
+
+def _child(target, part, default, replace=False):
+    if isinstance(target, list):
+        index = int(part)
+        target.extend([None] * (index + 1 - len(target)))
+        if replace or target[index] is None:
+            target[index] = default
+        return target[index]
+    if replace:
+        target[part] = default
+        return default
+    return target.setdefault(part, default)
+
+
+class FakeStripe:
+    """
+    In-process stand-in for the parts of the Stripe API the library uses.
+
+    Runs a threaded HTTP server on localhost and points the `stripe` module
+    at it, so the real client library (and its retries, idempotency keys and
+    HTTP pooling) is exercised without network access:
+
+        with FakeStripe(latency=0.2) as fake:
+            session = stripe.checkout.Session.create(...)
+            fake.complete(session.id)
+
+    Supports creating, retrieving and listing checkout sessions, listing the
+    events produced by `complete`/`expire`, honours `Idempotency-Key`, and
+    can inject latency and failures for load tests.
+    """
+
+    def __init__(self, latency=0.0, failure_rate=0.0, host="127.0.0.1", port=0):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.sessions = {}
+        self.events = {}
+        self.requests = defaultdict(int)
+        self.connections = 0
+        self._idempotent_responses = {}
+        self._failures = []
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread = None
+        self._previous = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        self._previous = (stripe.api_base, stripe.api_key)
+        stripe.api_base = self.url
+        stripe.api_key = stripe.api_key or "sk_test_fake"
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        if self._previous:
+            stripe.api_base, stripe.api_key = self._previous
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def reset(self):
+        """Forget all sessions, idempotency keys, counters and failures."""
+        with self._lock:
+            self.sessions.clear()
+            self.events.clear()
+            self.requests.clear()
+            self.connections = 0
+            self._idempotent_responses.clear()
+            self._failures.clear()
+
+    def fail_next(self, count=1, status=500):
+        """Answer the next `count` requests with an API error."""
+        with self._lock:
+            self._failures.extend([status] * count)
+
+    def add_session(self, **fields):
+        """Seed a session directly, e.g. for reconciliation tests."""
+        session = self._new_session(fields.pop("amount_total", 0), {})
+        session.update(fields)
+        with self._lock:
+            self.sessions[session["id"]] = session
+        return session
+
+    def complete(self, session_id):
+        """Mark a session paid and return its `checkout.session.completed` event."""
+        self.sessions[session_id].update(status="complete", payment_status="paid")
+        return self._add_event("checkout.session.completed", session_id)
+
+    def expire(self, session_id):
+        """Expire a session and return its `checkout.session.expired` event."""
+        self.sessions[session_id].update(status="expired")
+        return self._add_event("checkout.session.expired", session_id)
+
+    def _add_event(self, event_type, session_id):
+        event = build_event(event_type, self.sessions[session_id])
+        with self._lock:
+            self.events[event["id"]] = event
+        return event
+
+    def _new_session(self, amount_total, params):
+        session_id = f"cs_test_{secrets.token_hex(12)}"
+        created = int(time.time())
+        return {
+            "id": session_id,
+            "object": "checkout.session",
+            "amount_total": amount_total,
+            "currency": "usd",
+            "created": created,
+            "expires_at": int(params.get("expires_at") or created + SESSION_TTL),
+            "mode": params.get("mode", "payment"),
+            "payment_status": "unpaid",
+            "status": "open",
+            "success_url": params.get("success_url"),
+            "cancel_url": params.get("cancel_url"),
+            "metadata": params.get("metadata", {}),
+            "client_reference_id": params.get("client_reference_id"),
+            "url": f"{self.url}/pay/{session_id}",
+        }
+
+    def _create_session(self, params):
+        amount_total = sum(
+            int(item["price_data"]["unit_amount"]) * int(item.get("quantity", 1))
+            for item in params.get("line_items", [])
+        )
+        session = self._new_session(amount_total, params)
+        with self._lock:
+            self.sessions[session["id"]] = session
+        return 200, session
+
+    def _list(self, objects, params, url):
+        limit = min(int(params.get("limit", 10)), 100)
+        created = params.get("created", {})
+        with self._lock:
+            items = sorted(
+                objects.values(), key=lambda item: (-item["created"], item["id"])
+            )
+        if "gte" in created:
+            items = [item for item in items if item["created"] >= int(created["gte"])]
+        if "lt" in created:
+            items = [item for item in items if item["created"] < int(created["lt"])]
+        if params.get("type"):
+            items = [item for item in items if item["type"] == params["type"]]
+        if params.get("starting_after"):
+            ids = [item["id"] for item in items]
+            start = ids.index(params["starting_after"]) + 1
+            items = items[start:]
+        return 200, {
+            "object": "list",
+            "url": url,
+            "has_more": len(items) > limit,
+            "data": items[:limit],
+        }
+
+    def _dispatch(self, method, path, params, idempotency_key):
+        with self._lock:
+            self.requests[
+                (method, SESSION_PATH.sub("/v1/checkout/sessions/{id}", path))
+            ] += 1
+            failure = self._failures.pop(0) if self._failures else None
+        if failure is None and random.random() < self.failure_rate:
+            failure = 500
+        if self.latency:
+            time.sleep(self.latency)
+        if failure:
+            return failure, {
+                "error": {"type": "api_error", "message": "Injected failure"}
+            }
+
+        if method == "POST" and path == "/v1/checkout/sessions":
+            if idempotency_key and idempotency_key in self._idempotent_responses:
+                return self._idempotent_responses[idempotency_key]
+            response = self._create_session(params)
+            if idempotency_key:
+                self._idempotent_responses[idempotency_key] = response
+            return response
+        if method == "GET" and path == "/v1/checkout/sessions":
+            return self._list(self.sessions, params, path)
+        if method == "GET" and path == "/v1/events":
+            return self._list(self.events, params, path)
+        match = SESSION_PATH.match(path)
+        if method == "GET" and match and match["session_id"] in self.sessions:
+            return 200, self.sessions[match["session_id"]]
+        return 404, {
+            "error": {"type": "invalid_request_error", "message": "No such resource"}
+        }
+
+    def _handler_class(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def setup(self):
+                super().setup()
+                with fake._lock:
+                    fake.connections += 1
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                self._respond(
+                    *fake._dispatch("GET", url.path, parse_stripe_form(url.query), None)
+                )
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                body = self.rfile.read(length).decode()
+                self._respond(
+                    *fake._dispatch(
+                        "POST",
+                        urlparse(self.path).path,
+                        parse_stripe_form(body),
+                        self.headers.get("Idempotency-Key"),
+                    )
+                )
+
+            def _respond(self, status, payload):
+                body = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.send_header("Request-Id", f"req_{secrets.token_hex(8)}")
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
@@ -0,0 +1,218 @@
+import logging
+import os
+import random
+import threading
+import time
+import uuid
+
+import requests
+import stripe
+from django.conf import settings
+from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+
+stripe.api_key = os.environ.get("STRIPE_SECRET_API_KEY")
+
+RETRYABLE_ERRORS = (
+    stripe.error.APIConnectionError,
+    stripe.error.APIError,
+    stripe.error.RateLimitError,
+)
+
+
+class PaymentGatewayUnavailable(Exception):
+    """Stripe is failing or the circuit breaker is open; try again later."""
+
+    def __init__(self, message, retry_after=None, circuit_open=False):
+        super().__init__(message)
+        self.retry_after = retry_after
+        self.circuit_open = circuit_open
+
+
+class CircuitBreaker:
+    """
+    Fails calls fast after repeated failures instead of queueing on Stripe.
+
+    After `failure_threshold` consecutive failures the circuit opens and
+    every call raises `PaymentGatewayUnavailable` at once. After
+    `reset_timeout` seconds a single trial call is let through: success
+    closes the circuit, failure opens it again. State is per process.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+
+    def before_call(self):
+        """
+        Returns:
+        - bool: True if this call is the half-open trial.
+        """
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return False
+            if state == "half-open" and not self._trial_running:
+                self._trial_running = True
+                return True
+            retry_after = max(
+                0.0, self.reset_timeout - (time.monotonic() - self.opened_at)
+            )
+        raise PaymentGatewayUnavailable(
+            "Payment provider is unavailable", retry_after, circuit_open=True
+        )
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_running = False
+
+    def release_trial(self):
+        """Let another trial through after one that ended without a verdict."""
+        with self._lock:
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._trial_running or self.failures >= self.failure_threshold:
+                if self.opened_at is None or self._trial_running:
+                    logger.warning("Stripe circuit breaker opened")
+                self.opened_at = time.monotonic()
+            self._trial_running = False
+
+
+class StripeGateway:
+    """
+    The one way the app talks to Stripe.
+
+    - A single `requests.Session` with a bounded connection pool is shared
+      by all threads, so TLS connections to Stripe are reused.
+    - Every call has connect and read timeouts.
+    - Connection errors, 5xx and 429 responses are retried with jittered
+      exponential backoff. Creates carry an idempotency key, so a retried
+      create never opens a second session.
+    - A `CircuitBreaker` stops calling Stripe while it keeps failing.
+      Request errors (4xx) are raised as they are and don't trip it.
+    """
+
+    def __init__(
+        self,
+        timeout=(3.05, 10),
+        max_retries=2,
+        backoff=0.25,
+        max_backoff=2.0,
+        pool_size=10,
+        breaker=None,
+    ):
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.breaker = breaker or CircuitBreaker()
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0
+        )
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.http_client = stripe.http_client.RequestsClient(
+            timeout=timeout, session=self.session
+        )
+
+    def install(self):
+        """Route every `stripe` library call through this gateway's pool."""
+        stripe.default_http_client = self.http_client
+        # Retries are done here, where the circuit breaker can see them.
+        stripe.max_network_retries = 0
+        return self
+
+    def call(self, method, *args, **kwargs):
+        """
+        Call a `stripe` library function with retries and the breaker.
+
+        Raises:
+        - PaymentGatewayUnavailable: If the circuit is open or Stripe kept
+          failing after all retries.
+        - stripe.error.StripeError: For errors a retry can't fix.
+        """
+        trial = self.breaker.before_call()
+        try:
+            for attempt in range(self.max_retries + 1):
+                try:
+                    result = method(*args, **kwargs)
+                except RETRYABLE_ERRORS as error:
+                    if attempt == self.max_retries:
+                        self.breaker.record_failure()
+                        raise PaymentGatewayUnavailable(str(error)) from error
+                    time.sleep(self._delay(attempt))
+                except stripe.error.StripeError:
+                    self.breaker.record_success()
+                    raise
+                else:
+                    self.breaker.record_success()
+                    return result
+        finally:
+            # Any other exception must not leave the breaker half-open with
+            # a trial that never finishes.
+            if trial:
+                self.breaker.release_trial()
+
+    def _delay(self, attempt):
+        # "Full jitter": spread retries of many workers over the window.
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2**attempt))
+
+    def create_checkout_session(self, idempotency_key=None, **params):
+        return self.call(
+            stripe.checkout.Session.create,
+            idempotency_key=idempotency_key or str(uuid.uuid4()),
+            **params,
+        )
+
+    def retrieve_checkout_session(self, session_id):
+        return self.call(stripe.checkout.Session.retrieve, session_id)
+
+    def list_checkout_sessions(self, **params):
+        return self.call(stripe.checkout.Session.list, **params)
+
+    def list_events(self, **params):
+        return self.call(stripe.Event.list, **params)
+
+
+_gateway = None
+_gateway_lock = threading.Lock()
+
+
+def get_gateway():
+    """Return the process-wide gateway, built from settings on first use."""
+    global _gateway
+    with _gateway_lock:
+        if _gateway is None:
+            _gateway = StripeGateway(
+                timeout=settings.STRIPE_TIMEOUT,
+                max_retries=settings.STRIPE_MAX_RETRIES,
+                pool_size=settings.STRIPE_POOL_SIZE,
+                breaker=CircuitBreaker(
+                    settings.STRIPE_BREAKER_THRESHOLD,
+                    settings.STRIPE_BREAKER_RESET_TIMEOUT,
+                ),
+            ).install()
+    return _gateway
@@ -0,0 +1,166 @@
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from decimal import Decimal
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models.signals import post_save
+from django.test import RequestFactory
+
+from book_service.models import Book
+from borrowing_service.models import Borrowing
+from borrowing_service.signals import (
+    send_borrow_message_admin,
+    send_payment_message_user,
+)
+from payment_service import outbox
+from payment_service.fake_stripe import FakeStripe
+from payment_service.models import Payment
+from payment_service.stripe_helper import (
+    checkout_urls,
+    create_initial_session,
+    initial_payment_amount,
+)
+
+
+class Command(BaseCommand):
+    """
+    Django command comparing borrowing checkout with Stripe called inline
+    versus through the checkout session outbox.
+
+    Runs against a local FakeStripe server with configurable latency and
+    reports how long each borrowing transaction stays open, plus how long
+    the outbox takes until every session URL is available. Telegram
+    notifications are disconnected and all benchmark rows are deleted at
+    the end.
+    """
+
+    help = "Benchmark borrowing creation with inline vs outbox Stripe sessions"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--borrowings", type=int, default=50)
+        parser.add_argument("--workers", type=int, default=4)
+        parser.add_argument("--latency", type=float, default=0.3)
+        parser.add_argument(
+            "--mode", choices=("inline", "outbox", "both"), default="both"
+        )
+
+    def handle(self, *args, **options) -> None:
+        request = RequestFactory().get("/", SERVER_NAME="localhost")
+        user, _ = get_user_model().objects.get_or_create(
+            email="checkout-benchmark@example.com"
+        )
+        book = Book.objects.create(
+            title="Checkout benchmark",
+            author="benchmark",
+            cover=Book.CoverChoices.HARD,
+            inventory=options["borrowings"] * 2,
+            daily_fee=Decimal("0.50"),
+        )
+        post_save.disconnect(send_borrow_message_admin, sender=Borrowing)
+        post_save.disconnect(send_payment_message_user, sender=Payment)
+        modes = (
+            ("inline", "outbox") if options["mode"] == "both" else (options["mode"],)
+        )
+        try:
+            with FakeStripe(latency=options["latency"]):
+                for mode in modes:
+                    self.run(mode, book, user, request, options)
+        finally:
+            post_save.connect(send_borrow_message_admin, sender=Borrowing)
+            post_save.connect(send_payment_message_user, sender=Payment)
+            book.delete()
+            user.delete()
+
+    def run(self, mode, book, user, request, options):
+        create = self.create_inline if mode == "inline" else self.create_outbox
+        outbox_ids = []
+
+        def borrow(_):
+            try:
+                started = time.perf_counter()
+                outbox_id = create(book, user, request)
+                elapsed = time.perf_counter() - started
+            finally:
+                connection.close()
+            if outbox_id:
+                outbox_ids.append(outbox_id)
+            return elapsed
+
+        started = time.perf_counter()
+        with mock.patch.object(outbox, "dispatch_checkout_session"):
+            with ThreadPoolExecutor(max_workers=options["workers"]) as pool:
+                durations = list(pool.map(borrow, range(options["borrowings"])))
+        committed = time.perf_counter() - started
+
+        if outbox_ids:
+            # SQLite can't upgrade concurrent read locks inside a claim
+            # transaction, so the dev database drains with a single worker.
+            workers = 1 if connection.vendor == "sqlite" else options["workers"]
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                list(pool.map(self.process, outbox_ids))
+        ready = time.perf_counter() - started
+
+        durations = sorted(duration * 1000 for duration in durations)
+        self.stdout.write(
+            f"{mode:>6}: transaction avg={statistics.mean(durations):7.1f}ms "
+            f"p95={durations[int(len(durations) * 0.95) - 1]:7.1f}ms, "
+            f"all committed in {committed:6.2f}s, "
+            f"all session URLs in {ready:6.2f}s"
+        )
+        Borrowing.objects.filter(book_id=book).delete()
+
+    @staticmethod
+    def create_inline(book, user, request):
+        with transaction.atomic():
+            borrowing = Borrowing.objects.create(
+                book_id=book,
+                user_id=user,
+                expected_return_date=date.today() + timedelta(days=7),
+            )
+            session = create_initial_session(borrowing, request)
+            Payment.objects.create(
+                status=Payment.StatusChoices.PENDING,
+                type=Payment.TypeChoices.PAYMENT,
+                borrowing=borrowing,
+                session_url=session.url,
+                session_id=session.id,
+                money_to_pay=Decimal(session.amount_total) / 100,
+            )
+        return None
+
+    @staticmethod
+    def create_outbox(book, user, request):
+        with transaction.atomic():
+            borrowing = Borrowing.objects.create(
+                book_id=book,
+                user_id=user,
+                expected_return_date=date.today() + timedelta(days=7),
+            )
+            unit_amount = initial_payment_amount(borrowing)
+            payment = Payment.objects.create(
+                status=Payment.StatusChoices.PENDING,
+                type=Payment.TypeChoices.PAYMENT,
+                borrowing=borrowing,
+                session_url="",
+                session_id="",
+                money_to_pay=Decimal(unit_amount) / 100,
+            )
+            entry = outbox.schedule_checkout_session(
+                payment,
+                book.title,
+                unit_amount,
+                *checkout_urls(borrowing, request),
+            )
+        return entry.id
+
+    @staticmethod
+    def process(outbox_id):
+        try:
+            outbox.process_checkout_session(outbox_id)
+        finally:
+            connection.close()
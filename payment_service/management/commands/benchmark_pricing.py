@@ -0,0 +1,112 @@
+import datetime
+import random
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from book_service.models import Book
+from borrowing_service.models import Borrowing
+from payment_service.calculation_of_the_amount_to_be_paid import (
+    calculating_sum_of_fine,
+)
+from payment_service.pricing import accrued_fines, to_cents
+
+
+class Command(BaseCommand):
+    """
+    Django command comparing the batch accrued-fines engine with pricing
+    every overdue borrowing one by one.
+
+    Seeds synthetic users, books and overdue borrowings inside a transaction
+    that is rolled back at the end, so it is safe to run against a dev
+    database.
+    """
+
+    help = "Benchmark batch accrued fines vs. the per-borrowing fine function"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--rows", type=int, default=50_000, help="Overdue borrowings to seed."
+        )
+        parser.add_argument("--users", type=int, default=1_000)
+        parser.add_argument("--books", type=int, default=500)
+        parser.add_argument("--seed", type=int, default=42)
+
+    def handle(self, *args, **options) -> None:
+        rng = random.Random(options["seed"])
+        today = datetime.date.today()
+
+        with transaction.atomic():
+            self._seed(rng, today, options)
+            borrowings = Borrowing.objects.filter(
+                actual_return__isnull=True, expected_return_date__lt=today
+            )
+
+            started = time.perf_counter()
+            per_row_cents = sum(
+                calculating_sum_of_fine(
+                    borrowing.book_id.daily_fee,
+                    borrowing.expected_return_date,
+                    today,
+                )
+                for borrowing in borrowings.select_related("book_id")
+            )
+            per_row = time.perf_counter() - started
+
+            started = time.perf_counter()
+            report = accrued_fines(borrowings, as_of=today, limit=10)
+            batch = time.perf_counter() - started
+
+            transaction.set_rollback(True)
+
+        if to_cents(report["total"]) != per_row_cents:
+            raise CommandError(
+                f"Totals differ: batch {to_cents(report['total'])} cents, "
+                f"per row {per_row_cents} cents"
+            )
+        self.stdout.write(
+            f"{report['borrowings']} overdue borrowings of {report['users']} users, "
+            f"total {report['total']}"
+        )
+        self.stdout.write(f"{'per row':>10} {per_row * 1000:>10.1f}ms")
+        self.stdout.write(
+            f"{'batch':>10} {batch * 1000:>10.1f}ms "
+            f"({per_row / batch if batch else 0:.1f}x)"
+        )
+
+    @staticmethod
+    def _seed(rng, today, options, batch_size=5_000):
+        tag = rng.getrandbits(32)
+        users = get_user_model().objects.bulk_create(
+            get_user_model()(email=f"pricing-{tag}-{index}@example.com")
+            for index in range(options["users"])
+        )
+        books = Book.objects.bulk_create(
+            Book(
+                title=f"Pricing benchmark {index}",
+                author="Benchmark",
+                cover=Book.CoverChoices.SOFT,
+                inventory=1,
+                daily_fee=rng.randint(10, 500) / 100,
+            )
+            for index in range(options["books"])
+        )
+        if not users[0].pk or not books[0].pk:
+            users = list(
+                get_user_model().objects.filter(email__startswith=f"pricing-{tag}-")
+            )
+            books = list(Book.objects.filter(author="Benchmark"))
+
+        count = options["rows"]
+        for start in range(0, count, batch_size):
+            Borrowing.objects.bulk_create(
+                Borrowing(
+                    expected_return_date=today
+                    - datetime.timedelta(days=rng.randint(1, 60)),
+                    book_id=rng.choice(books),
+                    user_id=rng.choice(users),
+                )
+                for _ in range(min(batch_size, count - start))
+            )
@@ -0,0 +1,198 @@
+import contextlib
+import json
+import random
+import statistics
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from unittest import mock
+
+import requests
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models.signals import post_save
+from django.test import Client
+from django.urls import reverse
+
+from book_service.models import Book
+from borrowing_service.models import Borrowing
+from borrowing_service.signals import (
+    send_borrow_message_admin,
+    send_payment_message_user,
+)
+from payment_service.fake_stripe import build_event
+from payment_service.models import Payment
+from payment_service.webhooks import process_pending_events, sign_payload
+
+
+class Command(BaseCommand):
+    """
+    Django command to load test the Stripe webhook endpoint.
+
+    Sends signed `checkout.session.completed` events for pending payments
+    (or made-up sessions), redelivering a share of them like Stripe does,
+    and reports throughput and latency. Without `--url` the requests go
+    through Django's test client in this process.
+    """
+
+    help = "Send signed Stripe webhook events for throughput testing"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--events", type=int, default=1000)
+        parser.add_argument(
+            "--duplicates",
+            type=float,
+            default=0.1,
+            help="Share of events delivered a second time.",
+        )
+        parser.add_argument("--url", help="Webhook URL of a running server.")
+        parser.add_argument("--workers", type=int, default=8)
+        parser.add_argument("--secret", default=settings.STRIPE_WEBHOOK_SECRET)
+        parser.add_argument(
+            "--fixtures",
+            action="store_true",
+            help="First create a pending payment for every event.",
+        )
+        parser.add_argument(
+            "--process",
+            action="store_true",
+            help="Apply the received events inline afterwards.",
+        )
+
+    def handle(self, *args, **options) -> None:
+        if not options["secret"]:
+            raise CommandError("Set STRIPE_WEBHOOK_SECRET or pass --secret")
+        if not options["url"] and settings.STRIPE_WEBHOOK_SECRET != options["secret"]:
+            raise CommandError("--secret must match STRIPE_WEBHOOK_SECRET in-process")
+
+        if options["fixtures"]:
+            self.create_fixtures(options["events"])
+        session_ids = list(
+            Payment.objects.filter(status=Payment.StatusChoices.PENDING)
+            .exclude(session_id="")
+            .values_list("session_id", flat=True)[: options["events"]]
+        )
+        session_ids += [
+            f"cs_test_generated_{index}"
+            for index in range(options["events"] - len(session_ids))
+        ]
+        payloads = [
+            json.dumps(
+                build_event(
+                    "checkout.session.completed",
+                    {"id": session_id, "payment_status": "paid"},
+                )
+            )
+            for session_id in session_ids
+        ]
+        payloads += random.sample(payloads, int(len(payloads) * options["duplicates"]))
+        random.shuffle(payloads)
+
+        send = self.sender(options["url"], options["secret"])
+        statuses = Counter()
+        lock = threading.Lock()
+
+        def deliver(payload):
+            started = time.perf_counter()
+            status_code = send(payload)
+            elapsed = time.perf_counter() - started
+            with lock:
+                statuses[status_code] += 1
+            return elapsed
+
+        workers = options["workers"] if options["url"] else 1
+        # In-process there may be no broker; events are processed below.
+        scheduling = (
+            contextlib.nullcontext()
+            if options["url"]
+            else mock.patch("payment_service.views.schedule_event_processing")
+        )
+        started = time.perf_counter()
+        with scheduling, ThreadPoolExecutor(max_workers=workers) as pool:
+            latencies = sorted(pool.map(deliver, payloads))
+        elapsed = time.perf_counter() - started
+
+        self.stdout.write(
+            f"{len(payloads)} deliveries in {elapsed:.2f}s "
+            f"({len(payloads) / elapsed:.1f}/s), "
+            f"p50={statistics.median(latencies) * 1000:.1f}ms "
+            f"p95={latencies[int(len(latencies) * 0.95) - 1] * 1000:.1f}ms, "
+            f"statuses={dict(statuses)}"
+        )
+        if options["process"]:
+            self.stdout.write(f"Processed: {process_pending_events()}")
+
+    @staticmethod
+    def sender(url, secret):
+        if url:
+            session = requests.Session()
+
+            def send(payload):
+                return session.post(
+                    url,
+                    data=payload,
+                    headers={
+                        "Content-Type": "application/json",
+                        "Stripe-Signature": sign_payload(payload, secret),
+                    },
+                    timeout=10,
+                ).status_code
+
+            return send
+
+        client = Client(HTTP_HOST="localhost")
+        path = reverse("payments:stripe-webhook")
+
+        def send(payload):
+            return client.post(
+                path,
+                data=payload,
+                content_type="application/json",
+                HTTP_STRIPE_SIGNATURE=sign_payload(payload, secret),
+            ).status_code
+
+        return send
+
+    def create_fixtures(self, count):
+        post_save.disconnect(send_borrow_message_admin, sender=Borrowing)
+        post_save.disconnect(send_payment_message_user, sender=Payment)
+        try:
+            book = Book.objects.create(
+                title="Webhook benchmark",
+                author="benchmark",
+                cover=Book.CoverChoices.HARD,
+                inventory=count,
+                daily_fee=1,
+            )
+            users = get_user_model().objects.bulk_create(
+                get_user_model()(email=f"webhook-benchmark-{index}@example.com")
+                for index in range(count)
+            )
+            borrowings = Borrowing.objects.bulk_create(
+                Borrowing(
+                    book_id=book,
+                    user_id=user,
+                    expected_return_date=date.today() + timedelta(days=7),
+                )
+                for user in users
+            )
+            Payment.objects.bulk_create(
+                Payment(
+                    status=Payment.StatusChoices.PENDING,
+                    type=Payment.TypeChoices.PAYMENT,
+                    borrowing=borrowing,
+                    user_id=borrowing.user_id_id,
+                    borrow_date=borrowing.borrow_date,
+                    session_url="",
+                    session_id=f"cs_test_benchmark_{borrowing.pk}",
+                    money_to_pay=7,
+                )
+                for borrowing in borrowings
+            )
+        finally:
+            post_save.connect(send_borrow_message_admin, sender=Borrowing)
+            post_save.connect(send_payment_message_user, sender=Payment)
+        self.stdout.write(f"Created {count} pending payments")
@@ -0,0 +1,98 @@
+import statistics
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import stripe
+from django.core.management.base import BaseCommand
+
+from payment_service.fake_stripe import FakeStripe
+from payment_service.gateway import (
+    CircuitBreaker,
+    PaymentGatewayUnavailable,
+    StripeGateway,
+)
+
+
+class Command(BaseCommand):
+    """
+    Django command to load test the Stripe gateway against a local fake.
+
+    Opens checkout sessions from many threads while the fake Stripe server
+    adds latency and random 500s, and reports latency, outcomes, how many
+    TCP connections were opened and how often the circuit breaker failed
+    fast. Runs fully offline.
+    """
+
+    help = "Offline load test of the pooled, retrying Stripe gateway"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=500)
+        parser.add_argument("--workers", type=int, default=16)
+        parser.add_argument("--latency", type=float, default=0.05)
+        parser.add_argument("--failure-rate", type=float, default=0.05)
+        parser.add_argument("--pool-size", type=int, default=10)
+        parser.add_argument("--max-retries", type=int, default=2)
+        parser.add_argument("--read-timeout", type=float, default=10)
+        parser.add_argument("--breaker-threshold", type=int, default=5)
+
+    def handle(self, *args, **options) -> None:
+        previous_client = stripe.default_http_client
+        gateway = StripeGateway(
+            timeout=(3.05, options["read_timeout"]),
+            max_retries=options["max_retries"],
+            pool_size=options["pool_size"],
+            breaker=CircuitBreaker(options["breaker_threshold"], reset_timeout=1),
+        ).install()
+        outcomes = Counter()
+        lock = threading.Lock()
+
+        def attempt(index):
+            started = time.perf_counter()
+            try:
+                gateway.create_checkout_session(
+                    mode="payment",
+                    line_items=[
+                        {
+                            "price_data": {
+                                "currency": "usd",
+                                "product_data": {"name": f"Book {index}"},
+                                "unit_amount": 100,
+                            },
+                            "quantity": 1,
+                        }
+                    ],
+                    success_url="http://localhost/success/",
+                    cancel_url="http://localhost/cancel/",
+                )
+                outcome = "created"
+            except PaymentGatewayUnavailable as error:
+                outcome = "fast_failed" if error.circuit_open else "unavailable"
+            except stripe.error.StripeError:
+                outcome = "rejected"
+            with lock:
+                outcomes[outcome] += 1
+            return time.perf_counter() - started
+
+        try:
+            with FakeStripe(
+                latency=options["latency"], failure_rate=options["failure_rate"]
+            ) as fake:
+                started = time.perf_counter()
+                with ThreadPoolExecutor(max_workers=options["workers"]) as pool:
+                    latencies = sorted(pool.map(attempt, range(options["requests"])))
+                elapsed = time.perf_counter() - started
+                calls = sum(fake.requests.values())
+                connections = fake.connections
+        finally:
+            stripe.default_http_client = previous_client
+
+        self.stdout.write(
+            f"{options['requests']} sessions in {elapsed:.2f}s "
+            f"({options['requests'] / elapsed:.1f}/s), "
+            f"p50={statistics.median(latencies) * 1000:.1f}ms "
+            f"p95={latencies[int(len(latencies) * 0.95) - 1] * 1000:.1f}ms\n"
+            f"outcomes={dict(outcomes)} stripe_calls={calls} "
+            f"connections_opened={connections} breaker={gateway.breaker.state}"
+        )
@@ -0,0 +1,53 @@
+import json
+from datetime import datetime, timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from payment_service.reconciliation import WINDOW, reconcile_payments
+
+
+def aware_datetime(value):
+    moment = datetime.fromisoformat(value)
+    return timezone.make_aware(moment) if timezone.is_naive(moment) else moment
+
+
+class Command(BaseCommand):
+    """
+    Django command to compare Stripe Checkout sessions with local payments.
+
+    Lists the sessions Stripe created in the given range, fixes pending
+    payments Stripe has already paid or expired and prints the report.
+    """
+
+    help = "Reconcile local payments with Stripe Checkout sessions"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--since",
+            type=aware_datetime,
+            help="Start of the range, two days ago by default.",
+        )
+        parser.add_argument(
+            "--until", type=aware_datetime, help="End of the range, now by default."
+        )
+        parser.add_argument(
+            "--window",
+            type=int,
+            default=int(WINDOW.total_seconds() // 60),
+            help="Minutes of sessions listed per step.",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Only report the drift, do not correct it.",
+        )
+
+    def handle(self, *args, **options) -> None:
+        run = reconcile_payments(
+            since=options["since"],
+            until=options["until"],
+            window=timedelta(minutes=options["window"]),
+            dry_run=options["dry_run"],
+        )
+        self.stdout.write(json.dumps(run.report, indent=2))
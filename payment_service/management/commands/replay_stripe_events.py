@@ -0,0 +1,82 @@
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from payment_service.gateway import get_gateway
+from payment_service.models import StripeEvent
+from payment_service.webhooks import (
+    BATCH_SIZE,
+    EXPIRED_EVENTS,
+    PAID_EVENTS,
+    process_pending_events,
+    record_event,
+)
+
+
+class Command(BaseCommand):
+    """
+    Django command to re-apply stored Stripe webhook events.
+
+    By default failed events are put back to pending and processed inline.
+    `--from-stripe` first fetches events from the Stripe API, e.g. after
+    webhook deliveries were lost, and stores the ones not received yet.
+    Transitions are applied once, so replaying processed events is safe.
+    """
+
+    help = "Replay failed or missed Stripe webhook events"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--since",
+            type=datetime.fromisoformat,
+            help="Only events received (or created on Stripe) since this date.",
+        )
+        parser.add_argument("--event-id", action="append", dest="event_ids")
+        parser.add_argument(
+            "--all",
+            action="store_true",
+            help="Also replay events that were processed already.",
+        )
+        parser.add_argument(
+            "--from-stripe",
+            action="store_true",
+            help="Fetch events from the Stripe API before replaying.",
+        )
+        parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+
+    def handle(self, *args, **options) -> None:
+        since = options["since"]
+        if since is not None and timezone.is_naive(since):
+            since = timezone.make_aware(since)
+
+        if options["from_stripe"]:
+            if since is None:
+                raise CommandError("--from-stripe needs --since")
+            self.fetch_from_stripe(since)
+
+        events = StripeEvent.objects.all()
+        if not options["all"]:
+            events = events.filter(status=StripeEvent.StatusChoices.FAILED)
+        if since is not None:
+            events = events.filter(received_at__gte=since)
+        if options["event_ids"]:
+            events = events.filter(event_id__in=options["event_ids"])
+        reset = events.update(
+            status=StripeEvent.StatusChoices.PENDING, attempts=0, last_error=""
+        )
+        self.stdout.write(f"{reset} events queued for replay")
+
+        stats = process_pending_events(options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Replayed: {stats}"))
+
+    def fetch_from_stripe(self, since):
+        fetched = stored = 0
+        for event_type in PAID_EVENTS + EXPIRED_EVENTS:
+            events = get_gateway().list_events(
+                type=event_type, created={"gte": int(since.timestamp())}, limit=100
+            )
+            for event in events.auto_paging_iter():
+                fetched += 1
+                stored += record_event(event.to_dict_recursive())
+        self.stdout.write(f"{fetched} events fetched from Stripe, {stored} new")
@@ -0,0 +1,79 @@
+# Generated by Django 4.0.4 on 2026-10-18 06:35
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("payment_service", "0002_alter_payment_borrowing"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="payment",
+            name="session_url",
+            field=models.TextField(),
+        ),
+        migrations.AlterField(
+            model_name="payment",
+            name="status",
+            field=models.CharField(
+                choices=[
+                    ("Pending", "Pending"),
+                    ("Paid", "Paid"),
+                    ("Expired", "Expired"),
+                ],
+                max_length=20,
+            ),
+        ),
+        migrations.CreateModel(
+            name="CheckoutSessionOutbox",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("Pending", "Pending"),
+                            ("Processing", "Processing"),
+                            ("Done", "Done"),
+                            ("Failed", "Failed"),
+                        ],
+                        default="Pending",
+                        max_length=20,
+                    ),
+                ),
+                ("product_name", models.CharField(max_length=255)),
+                ("unit_amount", models.PositiveIntegerField()),
+                ("success_url", models.TextField()),
+                ("cancel_url", models.TextField()),
+                ("attempts", models.PositiveSmallIntegerField(default=0)),
+                ("last_error", models.TextField(blank=True)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                (
+                    "payment",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="checkout_outbox",
+                        to="payment_service.payment",
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name="checkoutsessionoutbox",
+            index=models.Index(
+                fields=["status", "updated_at"], name="checkout_outbox_status_idx"
+            ),
+        ),
+    ]
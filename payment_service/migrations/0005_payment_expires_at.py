@@ -0,0 +1,23 @@
+# Generated by Django 4.0.4 on 2026-10-18 06:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("payment_service", "0004_stripe_event"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="payment",
+            name="expires_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name="payment",
+            index=models.Index(
+                fields=["status", "expires_at"], name="payment_status_expires_idx"
+            ),
+        ),
+    ]
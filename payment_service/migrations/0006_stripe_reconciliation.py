@@ -0,0 +1,83 @@
+# Generated by Django 4.0.4 on 2026-10-18 07:02
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("payment_service", "0005_payment_expires_at"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ReconciliationRun",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("Running", "Running"),
+                            ("Done", "Done"),
+                            ("Failed", "Failed"),
+                        ],
+                        default="Running",
+                        max_length=20,
+                    ),
+                ),
+                ("window_start", models.DateTimeField()),
+                ("window_end", models.DateTimeField()),
+                ("dry_run", models.BooleanField(default=False)),
+                ("report", models.JSONField(default=dict)),
+                ("started_at", models.DateTimeField(auto_now_add=True)),
+                ("finished_at", models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name="StripeSessionSnapshot",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("session_id", models.CharField(max_length=255)),
+                ("status", models.CharField(max_length=20)),
+                ("payment_status", models.CharField(max_length=20)),
+                ("amount_total", models.PositiveIntegerField(null=True)),
+                ("created", models.DateTimeField()),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name="payment",
+            index=models.Index(fields=["session_id"], name="payment_session_id_idx"),
+        ),
+        migrations.AddField(
+            model_name="stripesessionsnapshot",
+            name="run",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="snapshots",
+                to="payment_service.reconciliationrun",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="stripesessionsnapshot",
+            index=models.Index(
+                fields=["run", "session_id"], name="stripe_snapshot_session_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,81 @@
+# Generated by Django 4.0.4 on 2026-10-18 07:05
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+BACKFILL_BATCH_SIZE = 1000
+
+
+def backfill_user_and_borrow_date(apps, schema_editor):
+    """
+    Copy user and borrow date from each payment's borrowing.
+
+    Walks the table by id in chunks, one correlated UPDATE per chunk, each
+    committed on its own (the migration is not atomic) so no long lock is
+    held on a large table.
+    """
+    Borrowing = apps.get_model("borrowing_service", "Borrowing")
+    Payment = apps.get_model("payment_service", "Payment")
+    borrowing = Borrowing.objects.filter(pk=models.OuterRef("borrowing_id"))
+    last_id = 0
+    while True:
+        ids = list(
+            Payment.objects.filter(pk__gt=last_id)
+            .order_by("pk")
+            .values_list("pk", flat=True)[:BACKFILL_BATCH_SIZE]
+        )
+        if not ids:
+            return
+        Payment.objects.filter(pk__in=ids).update(
+            user_id=models.Subquery(borrowing.values("user_id")[:1]),
+            borrow_date=models.Subquery(borrowing.values("borrow_date")[:1]),
+        )
+        last_id = ids[-1]
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("payment_service", "0006_stripe_reconciliation"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="payment",
+            name="borrow_date",
+            field=models.DateField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name="payment",
+            name="user",
+            field=models.ForeignKey(
+                editable=False,
+                null=True,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="payments",
+                to=settings.AUTH_USER_MODEL,
+            ),
+        ),
+        migrations.RunPython(backfill_user_and_borrow_date, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name="payment",
+            index=models.Index(
+                fields=["user", "borrow_date", "id"], name="payment_user_date_id_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="payment",
+            index=models.Index(
+                fields=["borrow_date", "id"], name="payment_date_id_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="payment",
+            index=models.Index(
+                fields=["status", "type"], name="payment_status_type_idx"
+            ),
+        ),
+    ]
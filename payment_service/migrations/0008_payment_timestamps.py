@@ -0,0 +1,55 @@
+# Generated by Django 4.0.4 on 2026-10-18 07:08
+
+from django.db import migrations, models
+import datetime
+
+import django.utils.timezone
+
+BACKFILL_BATCH_SIZE = 1000
+
+
+def backfill_created_at(apps, schema_editor):
+    """
+    Date existing payments by their borrow date instead of the migration
+    time, in id-ordered chunks committed one by one.
+    """
+    Payment = apps.get_model("payment_service", "Payment")
+    last_id = 0
+    while True:
+        payments = list(
+            Payment.objects.filter(pk__gt=last_id, borrow_date__isnull=False)
+            .order_by("pk")
+            .only("pk", "borrow_date")[:BACKFILL_BATCH_SIZE]
+        )
+        if not payments:
+            return
+        for payment in payments:
+            payment.created_at = datetime.datetime.combine(
+                payment.borrow_date, datetime.time(), tzinfo=datetime.timezone.utc
+            )
+        Payment.objects.bulk_update(payments, ["created_at"])
+        last_id = payments[-1].pk
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ("payment_service", "0007_payment_user_borrow_date"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="payment",
+            name="created_at",
+            field=models.DateTimeField(
+                db_index=True, default=django.utils.timezone.now
+            ),
+        ),
+        migrations.AddField(
+            model_name="payment",
+            name="updated_at",
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+        migrations.RunPython(backfill_created_at, migrations.RunPython.noop),
+    ]
@@ -1,4 +1,6 @@
+from django.conf import settings
 from django.db import models
+from django.utils import timezone
 
 from borrowing_service.models import Borrowing
 
@@ -23,6 +25,167 @@ class Payment(models.Model):
     session_url = models.TextField()
     session_id = models.CharField(max_length=255)
     money_to_pay = models.DecimalField(max_digits=10, decimal_places=2)
+    expires_at = models.DateTimeField(null=True, blank=True)
+    # Copied from the borrowing so a user's payment history is one index
+    # range scan on `payment_user_date_id_idx`, without joining Borrowing.
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="payments",
+        null=True,
+        editable=False,
+    )
+    borrow_date = models.DateField(null=True, editable=False)
+    created_at = models.DateTimeField(default=timezone.now, db_index=True)
+    # Bulk `update()`s must set this too, analytics rollups follow it.
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["status", "expires_at"], name="payment_status_expires_idx"
+            ),
+            models.Index(fields=["session_id"], name="payment_session_id_idx"),
+            models.Index(
+                fields=["user", "borrow_date", "id"], name="payment_user_date_id_idx"
+            ),
+            models.Index(fields=["borrow_date", "id"], name="payment_date_id_idx"),
+            models.Index(fields=["status", "type"], name="payment_status_type_idx"),
+        ]
 
     def __str__(self):
         return f"{self.borrowing_id}"
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get("update_fields")
+        if update_fields is None or "borrowing" in update_fields:
+            self.user_id = self.borrowing.user_id_id
+            self.borrow_date = self.borrowing.borrow_date
+            if update_fields is not None:
+                kwargs["update_fields"] = {*update_fields, "user", "borrow_date"}
+        super().save(*args, **kwargs)
+
+
+class CheckoutSessionOutbox(models.Model):
+    """
+    Pending request to open a Stripe Checkout session for a Payment.
+
+    Written in the same transaction as the payment, so the borrowing commits
+    without waiting on Stripe; a worker creates the session afterwards.
+    """
+
+    class StatusChoices(models.TextChoices):
+        PENDING = "Pending"
+        PROCESSING = "Processing"
+        DONE = "Done"
+        FAILED = "Failed"
+
+    payment = models.OneToOneField(
+        Payment, on_delete=models.CASCADE, related_name="checkout_outbox"
+    )
+    status = models.CharField(
+        max_length=20, choices=StatusChoices.choices, default=StatusChoices.PENDING
+    )
+    product_name = models.CharField(max_length=255)
+    unit_amount = models.PositiveIntegerField()
+    success_url = models.TextField()
+    cancel_url = models.TextField()
+    attempts = models.PositiveSmallIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["status", "updated_at"], name="checkout_outbox_status_idx"
+            ),
+        ]
+
+    def __str__(self):
+        return f"Checkout session for payment {self.payment_id}: {self.status}"
+
+
+class StripeEvent(models.Model):
+    """
+    A Stripe webhook event, stored once per Stripe event id.
+
+    The unique `event_id` makes redeliveries no-ops; events are applied
+    later in batches by `process_stripe_events`.
+    """
+
+    class StatusChoices(models.TextChoices):
+        PENDING = "Pending"
+        PROCESSED = "Processed"
+        FAILED = "Failed"
+
+    event_id = models.CharField(max_length=255, unique=True)
+    type = models.CharField(max_length=100)
+    payload = models.JSONField()
+    status = models.CharField(
+        max_length=20, choices=StatusChoices.choices, default=StatusChoices.PENDING
+    )
+    attempts = models.PositiveSmallIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    received_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["status", "received_at"], name="stripe_event_status_idx"
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.type} {self.event_id}: {self.status}"
+
+
+class ReconciliationRun(models.Model):
+    """One comparison of Stripe Checkout sessions with local payments."""
+
+    class StatusChoices(models.TextChoices):
+        RUNNING = "Running"
+        DONE = "Done"
+        FAILED = "Failed"
+
+    status = models.CharField(
+        max_length=20, choices=StatusChoices.choices, default=StatusChoices.RUNNING
+    )
+    window_start = models.DateTimeField()
+    window_end = models.DateTimeField()
+    dry_run = models.BooleanField(default=False)
+    report = models.JSONField(default=dict)
+    started_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Reconciliation {self.window_start} - {self.window_end}: {self.status}"
+
+
+class StripeSessionSnapshot(models.Model):
+    """
+    Staging row holding a Checkout session as listed by Stripe during a run.
+
+    Rows only live for the duration of their run, so the comparison with
+    `Payment` can be a database join instead of an in-memory dict.
+    """
+
+    run = models.ForeignKey(
+        ReconciliationRun, on_delete=models.CASCADE, related_name="snapshots"
+    )
+    session_id = models.CharField(max_length=255)
+    status = models.CharField(max_length=20)
+    payment_status = models.CharField(max_length=20)
+    amount_total = models.PositiveIntegerField(null=True)
+    created = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["run", "session_id"], name="stripe_snapshot_session_idx"
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.session_id}: {self.status}/{self.payment_status}"
@@ -0,0 +1,178 @@
+import logging
+from datetime import timedelta
+from decimal import Decimal
+
+import stripe
+from django.db import transaction
+from django.utils import timezone
+
+from payment_service.gateway import PaymentGatewayUnavailable
+from payment_service.models import CheckoutSessionOutbox, Payment
+from payment_service.stripe_helper import create_checkout_session, session_expires_at
+from payment_service.transitions import abandon_checkout
+
+logger = logging.getLogger(__name__)
+
+MAX_ATTEMPTS = 5
+DISPATCH_GRACE = timedelta(minutes=1)
+PROCESSING_TIMEOUT = timedelta(minutes=5)
+
+
+def schedule_checkout_session(
+    payment, product_name, unit_amount, success_url, cancel_url
+):
+    """
+    Record that a payment needs a Stripe Checkout session.
+
+    Must be called inside the transaction that creates the payment: the
+    outbox row commits together with it, and the worker is only woken up
+    once the commit succeeded, so it never sees a payment that was rolled
+    back and no session is ever opened for one.
+
+    Returns:
+    - CheckoutSessionOutbox: The scheduled entry.
+    """
+    outbox = CheckoutSessionOutbox.objects.create(
+        payment=payment,
+        product_name=product_name,
+        unit_amount=unit_amount,
+        success_url=success_url,
+        cancel_url=cancel_url,
+    )
+    transaction.on_commit(lambda: dispatch_checkout_session(outbox.id))
+    return outbox
+
+
+def dispatch_checkout_session(outbox_id):
+    """
+    Queue an outbox entry for the worker.
+
+    A broker outage must not fail the request that already committed, the
+    entry stays pending and `sweep_checkout_sessions` picks it up later.
+    """
+    from payment_service.tasks import process_checkout_session_outbox
+
+    try:
+        process_checkout_session_outbox.delay(outbox_id)
+    except Exception:
+        logger.warning(
+            "Could not queue checkout session outbox %s", outbox_id, exc_info=True
+        )
+
+
+def _claim(outbox_id):
+    with transaction.atomic():
+        outbox = (
+            CheckoutSessionOutbox.objects.select_for_update(skip_locked=True)
+            .filter(pk=outbox_id, status=CheckoutSessionOutbox.StatusChoices.PENDING)
+            .first()
+        )
+        if outbox is None:
+            return None
+        outbox.status = CheckoutSessionOutbox.StatusChoices.PROCESSING
+        outbox.attempts += 1
+        outbox.save(update_fields=["status", "attempts", "updated_at"])
+    return outbox
+
+
+def process_checkout_session(outbox_id):
+    """
+    Create the Stripe Checkout session for one outbox entry.
+
+    The entry is claimed in a short transaction of its own, the Stripe call
+    runs outside of any transaction, and the result is written back in a
+    second short one. The idempotency key is derived from the payment, so a
+    retry after a timeout or a worker crash gets the session Stripe already
+    created instead of a second one.
+
+    Args:
+    - outbox_id (int): ID of the CheckoutSessionOutbox entry.
+
+    Returns:
+    - str: The Stripe session ID, or None if the entry was already taken
+      care of by another worker.
+
+    Raises:
+    - stripe.error.StripeError, PaymentGatewayUnavailable: If Stripe
+      failed; the entry goes back to pending, or to failed after
+      `MAX_ATTEMPTS`, expiring its payment.
+    """
+    outbox = _claim(outbox_id)
+    if outbox is None:
+        return None
+
+    try:
+        session = create_checkout_session(
+            outbox.product_name,
+            outbox.unit_amount,
+            outbox.success_url,
+            outbox.cancel_url,
+            idempotency_key=f"checkout-session-{outbox.payment_id}",
+        )
+    except (stripe.error.StripeError, PaymentGatewayUnavailable) as error:
+        if getattr(error, "circuit_open", False):
+            # Stripe was not called, this doesn't count as an attempt.
+            outbox.attempts -= 1
+        outbox.status = (
+            CheckoutSessionOutbox.StatusChoices.FAILED
+            if outbox.attempts >= MAX_ATTEMPTS
+            else CheckoutSessionOutbox.StatusChoices.PENDING
+        )
+        outbox.last_error = str(error)
+        with transaction.atomic():
+            outbox.save(
+                update_fields=["status", "attempts", "last_error", "updated_at"]
+            )
+            if outbox.status == CheckoutSessionOutbox.StatusChoices.FAILED:
+                # Gave up: the payment can't be paid, free the user and copy.
+                abandon_checkout(outbox.payment_id)
+        raise
+
+    with transaction.atomic():
+        payment = Payment.objects.select_for_update().get(pk=outbox.payment_id)
+        payment.session_url = session.url
+        payment.session_id = session.id
+        payment.money_to_pay = Decimal(session.amount_total) / 100
+        payment.expires_at = session_expires_at(session)
+        payment.save(
+            update_fields=[
+                "session_url",
+                "session_id",
+                "money_to_pay",
+                "expires_at",
+                "updated_at",
+            ]
+        )
+
+        outbox.status = CheckoutSessionOutbox.StatusChoices.DONE
+        outbox.last_error = ""
+        outbox.save(update_fields=["status", "last_error", "updated_at"])
+    return session.id
+
+
+def sweep_checkout_sessions():
+    """
+    Re-queue outbox entries that fell through the cracks.
+
+    Entries stuck in processing (the worker died mid-call) go back to
+    pending, and pending entries older than `DISPATCH_GRACE` (the broker
+    was down at commit time) are dispatched again.
+
+    Returns:
+    - int: Number of entries dispatched.
+    """
+    now = timezone.now()
+    CheckoutSessionOutbox.objects.filter(
+        status=CheckoutSessionOutbox.StatusChoices.PROCESSING,
+        updated_at__lt=now - PROCESSING_TIMEOUT,
+    ).update(status=CheckoutSessionOutbox.StatusChoices.PENDING, updated_at=now)
+
+    stale = list(
+        CheckoutSessionOutbox.objects.filter(
+            status=CheckoutSessionOutbox.StatusChoices.PENDING,
+            updated_at__lt=now - DISPATCH_GRACE,
+        ).values_list("id", flat=True)
+    )
+    for outbox_id in stale:
+        dispatch_checkout_session(outbox_id)
+    return len(stale)
@@ -0,0 +1,124 @@
+import datetime
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db.models import Count, F, IntegerField, Sum
+from django.db.models.functions import Cast, Mod, Round
+
+from borrowing_service.models import Borrowing
+
+FINE_MULTIPLIER = Decimal("1.5")
+
+
+def to_cents(amount) -> int:
+    """
+    Convert a money amount to integer cents.
+
+    Floats go through their shortest repr, so 0.05 is 5 cents rather than
+    4.999... cents.
+    """
+    return int(Decimal(str(amount)) * 100)
+
+
+def from_cents(cents: int) -> Decimal:
+    return Decimal(cents) / 100
+
+
+def rental_cents(fee_cents: int, expected_return, today) -> int:
+    """Initial payment for borrowing from `today` to `expected_return`, inclusive."""
+    return ((expected_return - today).days + 1) * fee_cents
+
+
+def fine_cents(fee_cents: int, expected_return, actual_return) -> int:
+    """
+    Fine for returning late, `FINE_MULTIPLIER` times the daily fee per day.
+
+    Exact Decimal arithmetic; fractions of a cent are dropped, as before.
+    """
+    days_late = (actual_return - expected_return).days
+    return int(days_late * fee_cents * FINE_MULTIPLIER)
+
+
+def fee_cents_expression(field="book_id__daily_fee"):
+    """
+    SQL expression for a daily fee in integer cents.
+
+    Fees have two decimal places, the rounding only absorbs the float noise
+    of SQLite's decimal arithmetic.
+    """
+    return Cast(Round(F(field) * 100), IntegerField())
+
+
+def accrued_fines(queryset=None, as_of=None, limit=None):
+    """
+    Fines accrued so far by all open, overdue borrowings.
+
+    Rows are aggregated in SQL by (user, due date, fee cents modulo the fine
+    denominator): every borrowing in such a group is late by the same number
+    of days and drops the same fraction of a cent, so the group's exact fine
+    follows from the sum of its fees. Python then only handles one tuple per
+    group, and totals match `calculating_sum_of_fine` for every borrowing.
+
+    Args:
+    - queryset: Borrowings to consider, all by default.
+    - as_of (date): Day the fines are computed for, today by default.
+    - limit (int): Number of users with the highest fines to list.
+
+    Returns:
+    - dict: Totals and the per-user breakdown, amounts as Decimal.
+    """
+    as_of = as_of or datetime.date.today()
+    numerator, denominator = FINE_MULTIPLIER.as_integer_ratio()
+    groups = (
+        (queryset if queryset is not None else Borrowing.objects.all())
+        .filter(actual_return__isnull=True, expected_return_date__lt=as_of)
+        .annotate(residue=Mod(fee_cents_expression(), denominator))
+        .order_by()
+        .values_list("user_id", "user_id__email", "expected_return_date", "residue")
+        .annotate(count=Count("id"), fee_cents=Sum(fee_cents_expression()))
+    )
+
+    users = defaultdict(lambda: {"borrowings": 0, "cents": 0})
+    for user_id, email, expected_return, residue, count, fee_cents in groups:
+        days_late = (as_of - expected_return).days
+        dropped = numerator * days_late * int(residue) % denominator
+        user = users[user_id]
+        user["email"] = email
+        user["borrowings"] += count
+        user["cents"] += (
+            numerator * days_late * fee_cents - count * dropped
+        ) // denominator
+
+    ranked = sorted(users.items(), key=lambda item: (-item[1]["cents"], item[0]))
+    return {
+        "as_of": as_of,
+        "borrowings": sum(user["borrowings"] for user in users.values()),
+        "users": len(users),
+        "total": from_cents(sum(user["cents"] for user in users.values())),
+        "per_user": [
+            {
+                "user_id": user_id,
+                "email": user["email"],
+                "borrowings": user["borrowings"],
+                "amount": from_cents(user["cents"]),
+            }
+            for user_id, user in ranked[:limit]
+        ],
+    }
+
+
+def initial_fees(queryset, today=None):
+    """
+    Initial payments for borrowings starting today, priced in one pass.
+
+    Returns:
+    - dict: {borrowing_id: cents}
+    """
+    today = today or datetime.date.today()
+    rows = queryset.annotate(fee_cents=fee_cents_expression()).values_list(
+        "id", "expected_return_date", "fee_cents"
+    )
+    return {
+        borrowing_id: rental_cents(fee_cents, expected_return, today)
+        for borrowing_id, expected_return, fee_cents in rows
+    }
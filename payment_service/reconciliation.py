@@ -0,0 +1,227 @@
+import logging
+import time
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.db import connection
+from django.utils import timezone
+
+from payment_service.gateway import get_gateway
+from payment_service.models import (
+    Payment,
+    ReconciliationRun,
+    StripeSessionSnapshot,
+)
+from payment_service.transitions import expire_sessions, pay_sessions
+
+logger = logging.getLogger(__name__)
+
+PAGE_SIZE = 100
+INSERT_BATCH_SIZE = 1000
+DIFF_BATCH_SIZE = 500
+MAX_SAMPLES = 20
+WINDOW = timedelta(hours=1)
+# Checkout sessions stay open for 24 hours, so one created two days ago has
+# settled in Stripe for at least a day.
+LOOKBACK = timedelta(days=2)
+
+PAID_IN_STRIPE = "paid_in_stripe"
+EXPIRED_IN_STRIPE = "expired_in_stripe"
+UNKNOWN_SESSION = "unknown_session"
+PAID_LOCALLY_ONLY = "paid_locally_only"
+PAID_AFTER_EXPIRY = "paid_after_expiry"
+AMOUNT_MISMATCH = "amount_mismatch"
+
+DIFF_SQL = """
+    SELECT s.id, s.session_id, s.status, s.payment_status, p.status,
+           CASE WHEN s.amount_total <> CAST(ROUND(p.money_to_pay * 100) AS INTEGER)
+                THEN 1 ELSE 0 END
+    FROM {snapshot} s
+    LEFT JOIN {payment} p ON p.session_id = s.session_id
+    WHERE s.run_id = %s AND s.id > %s AND (
+        p.id IS NULL
+        OR (p.status = %s AND (s.payment_status = 'paid' OR s.status = 'expired'))
+        OR (p.status = %s AND s.payment_status <> 'paid')
+        OR (p.status = %s AND s.payment_status = 'paid')
+        OR (p.status = %s
+            AND s.amount_total <> CAST(ROUND(p.money_to_pay * 100) AS INTEGER))
+    )
+    ORDER BY s.id
+    LIMIT %s
+"""
+
+
+def iter_sessions(window_start, window_end, window=WINDOW, page_size=PAGE_SIZE):
+    """
+    Yield the Checkout sessions Stripe created in [window_start, window_end).
+
+    The range is walked in `window` steps and each step is paged with
+    `starting_after`, so only one page is held at a time. Every page goes
+    through the gateway and is retried on its own.
+    """
+    gateway = get_gateway()
+    start = window_start
+    while start < window_end:
+        end = min(start + window, window_end)
+        params = {
+            "created": {"gte": int(start.timestamp()), "lt": int(end.timestamp())},
+            "limit": page_size,
+        }
+        while True:
+            page = gateway.list_checkout_sessions(**params)
+            yield from page.data
+            if not page.has_more or not page.data:
+                break
+            params["starting_after"] = page.data[-1].id
+        start = end
+
+
+def stage_sessions(run, sessions, batch_size=INSERT_BATCH_SIZE):
+    """
+    Copy listed sessions into the run's snapshot rows in batches.
+
+    Returns:
+    - int: Number of sessions staged.
+    """
+    staged, batch = 0, []
+    for session in sessions:
+        batch.append(
+            StripeSessionSnapshot(
+                run=run,
+                session_id=session["id"],
+                status=session["status"] or "",
+                payment_status=session["payment_status"] or "",
+                amount_total=session["amount_total"],
+                created=datetime.fromtimestamp(session["created"], tz=dt_timezone.utc),
+            )
+        )
+        if len(batch) >= batch_size:
+            StripeSessionSnapshot.objects.bulk_create(batch)
+            staged += len(batch)
+            batch = []
+    StripeSessionSnapshot.objects.bulk_create(batch)
+    return staged + len(batch)
+
+
+def iter_drift(run, batch_size=DIFF_BATCH_SIZE):
+    """
+    Yield batches of (session_id, category) for snapshots that disagree
+    with their local payment.
+
+    One LEFT JOIN of the snapshot rows with `Payment` on `session_id` does
+    the comparison in the database; it is paged by snapshot id so memory
+    stays bounded however many sessions were staged.
+    """
+    sql = DIFF_SQL.format(
+        snapshot=StripeSessionSnapshot._meta.db_table,
+        payment=Payment._meta.db_table,
+    )
+    last_id = 0
+    while True:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                sql,
+                [
+                    run.pk,
+                    last_id,
+                    Payment.StatusChoices.PENDING,
+                    Payment.StatusChoices.PAID,
+                    Payment.StatusChoices.EXPIRED,
+                    Payment.StatusChoices.PENDING,
+                    batch_size,
+                ],
+            )
+            rows = cursor.fetchall()
+        if not rows:
+            return
+        last_id = rows[-1][0]
+        yield [_classify(*row[1:]) for row in rows]
+
+
+def _classify(session_id, status, payment_status, local_status, amount_differs):
+    if local_status is None:
+        return session_id, UNKNOWN_SESSION
+    if local_status == Payment.StatusChoices.PENDING:
+        if payment_status == "paid":
+            return session_id, PAID_IN_STRIPE
+        if status == "expired":
+            return session_id, EXPIRED_IN_STRIPE
+        return session_id, AMOUNT_MISMATCH
+    if local_status == Payment.StatusChoices.PAID:
+        return session_id, PAID_LOCALLY_ONLY
+    return session_id, PAID_AFTER_EXPIRY
+
+
+def reconcile_payments(since=None, until=None, window=WINDOW, dry_run=False):
+    """
+    Compare Stripe Checkout sessions with local payments and fix the drift.
+
+    Sessions created in [since, until) are listed from Stripe into
+    snapshot rows, diffed against `Payment` in the database and then:
+
+    - pending payments Stripe reports paid are paid, through the same
+      transition as webhooks, so inventory and messages follow;
+    - payments expired locally whose session was paid after all are paid
+      the same way;
+    - pending payments of expired sessions are expired;
+    - anything else (sessions without a payment, paid-only-locally, amount
+      mismatches) is only reported.
+
+    Args:
+    - since (datetime): Start of the window, `LOOKBACK` ago by default.
+    - until (datetime): End of the window, now by default.
+    - window (timedelta): Size of the steps the range is listed in.
+    - dry_run (bool): Report the drift without correcting it.
+
+    Returns:
+    - ReconciliationRun: The finished run, with its report.
+    """
+    until = until or timezone.now()
+    since = since or until - LOOKBACK
+    run = ReconciliationRun.objects.create(
+        window_start=since, window_end=until, dry_run=dry_run
+    )
+    started = time.perf_counter()
+    drift, samples, corrected = Counter(), defaultdict(list), Counter()
+    try:
+        sessions = stage_sessions(run, iter_sessions(since, until, window))
+        for batch in iter_drift(run):
+            by_category = defaultdict(list)
+            for session_id, category in batch:
+                by_category[category].append(session_id)
+            for category, session_ids in by_category.items():
+                drift[category] += len(session_ids)
+                room = MAX_SAMPLES - len(samples[category])
+                samples[category].extend(session_ids[:room])
+            if not dry_run:
+                _correct(by_category, corrected)
+    except Exception as error:
+        run.status = ReconciliationRun.StatusChoices.FAILED
+        run.report = {"error": str(error)}
+        raise
+    else:
+        run.status = ReconciliationRun.StatusChoices.DONE
+        run.report = {
+            "sessions": sessions,
+            "drift": dict(drift),
+            "corrected": dict(corrected),
+            "samples": dict(samples),
+            "duration_ms": round((time.perf_counter() - started) * 1000, 1),
+        }
+        logger.info("Stripe reconciliation finished: %s", run.report)
+    finally:
+        run.finished_at = timezone.now()
+        run.save(update_fields=["status", "report", "finished_at"])
+        run.snapshots.all().delete()
+    return run
+
+
+def _correct(by_category, corrected):
+    paid = by_category.get(PAID_IN_STRIPE, []) + by_category.get(PAID_AFTER_EXPIRY, [])
+    if paid:
+        result = pay_sessions(paid)
+        corrected["paid"] += len(result.paid)
+        corrected["sold_out"] += len(result.sold_out)
+    if by_category.get(EXPIRED_IN_STRIPE):
+        result = expire_sessions(by_category[EXPIRED_IN_STRIPE])
+        corrected["expired"] += len(result.expired)
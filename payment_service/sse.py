@@ -0,0 +1,263 @@
+import asyncio
+import json
+import logging
+import re
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from urllib.parse import parse_qs
+
+import redis.asyncio
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from rest_framework_simplejwt.tokens import AccessToken
+
+from payment_service.models import Payment
+from payment_service.status_events import CHANNEL_PREFIX
+
+logger = logging.getLogger(__name__)
+
+EVENTS_PATH = re.compile(r"^/api/payments/(?P<payment_id>\d+)/events/?$")
+HEARTBEAT_INTERVAL = 15
+RECHECK_INTERVAL = 60
+MAX_STREAM_DURATION = 10 * 60
+LONG_POLL_TIMEOUT = 25
+RECONNECT_DELAY = 1
+RETRY_MS = 3000
+
+
+class StatusHub:
+    """
+    Fans payment status messages out to the clients waiting in this process.
+
+    One Redis connection pattern-subscribes to every payment channel and
+    hands each message to the queues of that payment's watchers, so a
+    waiting client costs a queue, not a Redis connection. The subscription
+    starts with the first watcher and is dropped when the last one leaves.
+    Without a URL, only `dispatch` calls reach watchers.
+    """
+
+    def __init__(self, url=None):
+        self.url = url
+        self._watchers = defaultdict(set)
+        self._listener = None
+
+    @asynccontextmanager
+    async def watch(self, payment_id):
+        queue = asyncio.Queue()
+        self._watchers[payment_id].add(queue)
+        if self.url and (self._listener is None or self._listener.done()):
+            self._listener = asyncio.ensure_future(self._listen())
+        try:
+            yield queue
+        finally:
+            self._watchers[payment_id].discard(queue)
+            if not self._watchers[payment_id]:
+                del self._watchers[payment_id]
+            if not self._watchers and self._listener is not None:
+                self._listener.cancel()
+                self._listener = None
+
+    def dispatch(self, payment_id, status):
+        for queue in self._watchers.get(payment_id, ()):
+            queue.put_nowait(status)
+
+    async def _listen(self):
+        while self._watchers:
+            try:
+                client = redis.asyncio.Redis.from_url(self.url)
+                async with client, client.pubsub() as pubsub:
+                    await pubsub.psubscribe(f"{CHANNEL_PREFIX}*")
+                    async for message in pubsub.listen():
+                        if message["type"] == "pmessage":
+                            self._handle(message["data"])
+            except (redis.RedisError, OSError) as error:
+                logger.warning("Payment status subscription lost: %s", error)
+                await asyncio.sleep(RECONNECT_DELAY)
+
+    def _handle(self, raw):
+        try:
+            data = json.loads(raw)
+            payment_id, status = data["id"], data["status"]
+        except (ValueError, TypeError, KeyError):
+            logger.warning("Ignoring malformed payment status message: %r", raw)
+            return
+        self.dispatch(payment_id, status)
+
+
+def _token(scope):
+    for name, value in scope["headers"]:
+        if name == b"authorization":
+            parts = value.decode("latin-1").split()
+            if len(parts) == 2 and parts[0] in jwt_settings.AUTH_HEADER_TYPES:
+                return parts[1]
+    # EventSource can't send headers, so browsers pass the token in the URL.
+    return parse_qs(scope["query_string"].decode()).get("token", [None])[0]
+
+
+def _authenticated_user_id(scope):
+    raw = _token(scope)
+    if not raw:
+        return None
+    try:
+        return AccessToken(raw)[jwt_settings.USER_ID_CLAIM]
+    except (TokenError, KeyError):
+        return None
+
+
+@sync_to_async
+def _visible_status(payment_id, user_id):
+    """Status of the payment if the user may see it, else None."""
+    row = Payment.objects.filter(pk=payment_id).values_list("user_id", "status")
+    row = row.first()
+    if row is None:
+        return None
+    owner_id, status = row
+    if str(owner_id) != str(user_id) and not (
+        get_user_model().objects.filter(pk=user_id, is_staff=True).exists()
+    ):
+        return None
+    return status
+
+
+@sync_to_async
+def _current_status(payment_id):
+    return (
+        Payment.objects.filter(pk=payment_id).values_list("status", flat=True).first()
+    )
+
+
+class PaymentStatusEvents:
+    """
+    ASGI middleware serving `GET /api/payments/<id>/events/` without Django.
+
+    Clients accepting `text/event-stream` get Server-Sent Events: the
+    current status right away, then every change, until the payment leaves
+    Pending. Other clients get a long poll that answers with the status as
+    soon as it is no longer Pending, or after `LONG_POLL_TIMEOUT` seconds.
+
+    Changes arrive through `StatusHub` from Redis pub/sub, so a waiting
+    client holds no thread and touches the database only when it connects
+    and every `RECHECK_INTERVAL` seconds, in case a message was lost.
+    Authentication uses the same JWT access tokens as the API, from the
+    `Authorization` header or the `token` query parameter.
+
+    Every other request is passed to the wrapped application.
+    """
+
+    def __init__(self, app, hub=None):
+        self.app = app
+        self.hub = hub or StatusHub(settings.PAYMENT_EVENTS_REDIS_URL)
+
+    async def __call__(self, scope, receive, send):
+        match = scope["type"] == "http" and EVENTS_PATH.match(scope["path"])
+        if not match or scope["method"] != "GET":
+            return await self.app(scope, receive, send)
+
+        payment_id = int(match["payment_id"])
+        user_id = _authenticated_user_id(scope)
+        if user_id is None:
+            return await _send_json(
+                send, 401, {"detail": "Authentication credentials were not provided."}
+            )
+
+        async with self.hub.watch(payment_id) as queue:
+            # Watch first, then read: a change in between is still queued.
+            status = await _visible_status(payment_id, user_id)
+            if status is None:
+                return await _send_json(send, 404, {"detail": "Not found."})
+
+            accept = dict(scope["headers"]).get(b"accept", b"")
+            if b"text/event-stream" in accept:
+                await self._stream(payment_id, status, queue, receive, send)
+            else:
+                await self._long_poll(payment_id, status, queue, send)
+
+    async def _stream(self, payment_id, status, queue, receive, send):
+        await send(
+            {
+                "type": "http.response.start",
+                "status": 200,
+                "headers": [
+                    (b"content-type", b"text/event-stream"),
+                    (b"cache-control", b"no-cache"),
+                    (b"x-accel-buffering", b"no"),
+                ],
+            }
+        )
+        await _send_event(send, payment_id, status, retry=RETRY_MS)
+
+        disconnected = asyncio.ensure_future(_wait_for_disconnect(receive))
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + MAX_STREAM_DURATION
+        recheck_at = loop.time() + RECHECK_INTERVAL
+        try:
+            while status == Payment.StatusChoices.PENDING and loop.time() < deadline:
+                changed = await _next_status(queue, disconnected, HEARTBEAT_INTERVAL)
+                if disconnected.done():
+                    return
+                if changed is None and loop.time() >= recheck_at:
+                    recheck_at = loop.time() + RECHECK_INTERVAL
+                    changed = await _current_status(payment_id)
+                if changed is None or changed == status:
+                    await send(
+                        {
+                            "type": "http.response.body",
+                            "body": b": keep-alive\n\n",
+                            "more_body": True,
+                        }
+                    )
+                    continue
+                status = changed
+                await _send_event(send, payment_id, status)
+            await send({"type": "http.response.body", "body": b""})
+        finally:
+            disconnected.cancel()
+
+    async def _long_poll(self, payment_id, status, queue, send):
+        if status == Payment.StatusChoices.PENDING:
+            try:
+                status = await asyncio.wait_for(queue.get(), LONG_POLL_TIMEOUT)
+            except asyncio.TimeoutError:
+                status = await _current_status(payment_id)
+        await _send_json(send, 200, {"id": payment_id, "status": status})
+
+
+async def _next_status(queue, disconnected, timeout):
+    getter = asyncio.ensure_future(queue.get())
+    done, _ = await asyncio.wait(
+        {getter, disconnected}, timeout=timeout, return_when=asyncio.FIRST_COMPLETED
+    )
+    if getter in done:
+        return getter.result()
+    getter.cancel()
+    return None
+
+
+async def _wait_for_disconnect(receive):
+    while (await receive())["type"] != "http.disconnect":
+        pass
+
+
+async def _send_event(send, payment_id, status, retry=None):
+    data = json.dumps({"id": payment_id, "status": status})
+    body = f"retry: {retry}\n" if retry else ""
+    body += f"event: status\ndata: {data}\n\n"
+    await send({"type": "http.response.body", "body": body.encode(), "more_body": True})
+
+
+async def _send_json(send, status, payload):
+    body = json.dumps(payload).encode()
+    await send(
+        {
+            "type": "http.response.start",
+            "status": status,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+            ],
+        }
+    )
+    await send({"type": "http.response.body", "body": body})
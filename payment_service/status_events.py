@@ -0,0 +1,52 @@
+import json
+import logging
+
+import redis
+from django.conf import settings
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
+
+CHANNEL_PREFIX = "payments:status:"
+
+_client = None
+
+
+def channel(payment_id):
+    return f"{CHANNEL_PREFIX}{payment_id}"
+
+
+def _redis():
+    global _client
+    if _client is None:
+        _client = redis.Redis.from_url(
+            settings.PAYMENT_EVENTS_REDIS_URL,
+            socket_connect_timeout=1,
+            socket_timeout=1,
+        )
+    return _client
+
+
+def publish_statuses(payment_ids, status):
+    """
+    Publish a status change of payments to clients watching them.
+
+    Delivery is best effort: watchers re-read the status periodically, so
+    a lost message only delays them.
+    """
+    try:
+        pipeline = _redis().pipeline(transaction=False)
+        for payment_id in payment_ids:
+            pipeline.publish(
+                channel(payment_id), json.dumps({"id": payment_id, "status": status})
+            )
+        pipeline.execute()
+    except redis.RedisError as error:
+        logger.warning("Could not publish payment status changes: %s", error)
+
+
+def status_changed(payment_ids, status):
+    """Publish the status change once the current transaction commits."""
+    payment_ids = list(payment_ids)
+    if payment_ids:
+        transaction.on_commit(lambda: publish_statuses(payment_ids, status))
@@ -1,98 +1,122 @@
-from datetime import datetime
+from datetime import datetime, timezone
 
-import stripe
 from django.urls import reverse
 
 from payment_service.calculation_of_the_amount_to_be_paid import (
     calculating_total_sum_for_begin_of_borrowing,
     calculating_sum_of_fine,
 )
+from payment_service.gateway import get_gateway
 
 
-def create_initial_session(borrowing, request):
+def checkout_urls(borrowing, request, success_view="payments:payment-success"):
     """
-    Creates a Stripe Checkout session for initial borrowing payment.
+    Build absolute success and cancel URLs for a borrowing's checkout.
 
     Args:
-    - borrowing: Borrowing object for which the payment is created.
-    - request: HTTP request object.
+    - borrowing: Borrowing object the payment belongs to.
+    - request: HTTP request object, used for the host name.
+    - success_view (str): URL name of the success endpoint.
+
+    Returns:
+    - tuple: (success_url, cancel_url)
     """
-    session = stripe.checkout.Session.create(
-        payment_method_types=["card"],
-        line_items=[
-            {
-                "price_data": {
-                    "currency": "usd",
-                    "product_data": {
-                        "name": borrowing.book_id.title,
-                    },
-                    "unit_amount": calculating_total_sum_for_begin_of_borrowing(
-                        borrowing.book_id.daily_fee, borrowing.expected_return_date
-                    ),
-                },
-                "quantity": 1,
-            }
-        ],
-        mode="payment",
-        success_url=request.build_absolute_uri(
-            reverse("payments:payment-success", kwargs={"borrowing_id": borrowing.id})
+    return (
+        request.build_absolute_uri(
+            reverse(success_view, kwargs={"borrowing_id": borrowing.id})
         ),
-        cancel_url=request.build_absolute_uri(
+        request.build_absolute_uri(
             reverse("payments:payment-cancel", kwargs={"borrowing_id": borrowing.id})
         ),
     )
-    return session
 
 
-def create_fine_session(borrowing, request):
+def create_checkout_session(
+    product_name, unit_amount, success_url, cancel_url, idempotency_key=None
+):
     """
-    Creates a Stripe Checkout session for fine payment related to overdue borrowing.
+    Creates a Stripe Checkout session for a single line item.
 
     Args:
-    - borrowing: Borrowing object for which the fine payment is created.
-    - request: HTTP request object.
+    - product_name (str): Name shown on the Stripe checkout page.
+    - unit_amount (int): Amount to pay in cents.
+    - success_url (str): Where Stripe redirects after a successful payment.
+    - cancel_url (str): Where Stripe redirects if the user cancels.
+    - idempotency_key (str): Makes retries of the same request safe.
+
+    Raises:
+    - PaymentGatewayUnavailable: If Stripe is down or too slow.
     """
-    session = stripe.checkout.Session.create(
+    return get_gateway().create_checkout_session(
         payment_method_types=["card"],
         line_items=[
             {
                 "price_data": {
                     "currency": "usd",
                     "product_data": {
-                        "name": "Fine for overdue of " + borrowing.book_id.title,
+                        "name": product_name,
                     },
-                    "unit_amount": calculating_sum_of_fine(
-                        borrowing.book_id.daily_fee,
-                        borrowing.expected_return_date,
-                        borrowing.actual_return,
-                    ),
+                    "unit_amount": unit_amount,
                 },
                 "quantity": 1,
             }
         ],
         mode="payment",
-        success_url=request.build_absolute_uri(
-            reverse(
-                "payments:payment-success-fine", kwargs={"borrowing_id": borrowing.id}
-            )
-        ),
-        cancel_url=request.build_absolute_uri(
-            reverse("payments:payment-cancel", kwargs={"borrowing_id": borrowing.id})
-        ),
+        success_url=success_url,
+        cancel_url=cancel_url,
+        idempotency_key=idempotency_key,
     )
-    return session
 
 
-def check_session_status(session_id):
-    stripe_session = stripe.checkout.Session.retrieve(
-        session_id
+def initial_payment_amount(borrowing):
+    """Amount in cents charged when a borrowing starts."""
+    return calculating_total_sum_for_begin_of_borrowing(
+        borrowing.book_id.daily_fee, borrowing.expected_return_date
+    )
+
+
+def create_initial_session(borrowing, request):
+    """
+    Creates a Stripe Checkout session for initial borrowing payment.
+
+    Args:
+    - borrowing: Borrowing object for which the payment is created.
+    - request: HTTP request object.
+    """
+    return create_checkout_session(
+        borrowing.book_id.title,
+        initial_payment_amount(borrowing),
+        *checkout_urls(borrowing, request),
+    )
+
+
+def create_fine_session(borrowing, request):
+    """
+    Creates a Stripe Checkout session for fine payment related to overdue borrowing.
+
+    The idempotency key covers the return date and amount: a return retried
+    the same day reuses the session, one retried on a later day asks for the
+    larger fine instead of clashing with the earlier request.
+
+    Args:
+    - borrowing: Borrowing object for which the fine payment is created.
+    - request: HTTP request object.
+    """
+    amount = calculating_sum_of_fine(
+        borrowing.book_id.daily_fee,
+        borrowing.expected_return_date,
+        borrowing.actual_return,
+    )
+    return create_checkout_session(
+        "Fine for overdue of " + borrowing.book_id.title,
+        amount,
+        *checkout_urls(borrowing, request, "payments:payment-success-fine"),
+        idempotency_key=(
+            f"fine-session-{borrowing.id}-{borrowing.actual_return}-{amount}"
+        ),
     )
 
-    expires_at_timestamp = stripe_session.get("expires_at")
-    expires_at_datetime = datetime.utcfromtimestamp(expires_at_timestamp)
-    current_time = datetime.utcnow()
 
-    if current_time < expires_at_datetime:
-        return False
-    else:
-        return True
\ No newline at end of file
+def session_expires_at(session):
+    """Return when a Stripe Checkout session expires, as an aware datetime."""
+    return datetime.fromtimestamp(session["expires_at"], tz=timezone.utc)
@@ -1,19 +1,114 @@
-import os
+import logging
+import time
 
 import stripe
 from celery import shared_task
-from .models import Payment
-from notifications.messages import notify_invalid_session
-from .stripe_helper import check_session_status
+from notifications import outbox
+from notifications.messages import expired_session_text
+from .expiry import (
+    expire_overdue_payments,
+    expired_session_recipients,
+    reconcile_untracked_payments,
+)
+from .gateway import PaymentGatewayUnavailable
+from .pricing import accrued_fines
+from .reconciliation import reconcile_payments
+from .outbox import MAX_ATTEMPTS, process_checkout_session, sweep_checkout_sessions
+from .webhooks import process_pending_events
 
-stripe.api_key = os.environ.get("STRIPE_SECRET_API_KEY")
+logger = logging.getLogger(__name__)
 
 
 @shared_task
 def check_and_notify_expired_sessions():
-    sessions_to_check = Payment.objects.filter(status=Payment.StatusChoices.PENDING)
-    for session in sessions_to_check:
-        if check_session_status(session.session_id):
-            session.status = Payment.StatusChoices.EXPIRED
-            session.save()
-            notify_invalid_session(session.borrowing.user_id)
+    """
+    Asynchronous task to expire pending payments and notify their users.
+
+    Expiry is decided from the locally stored `expires_at`; Stripe is only
+    asked about the few pending payments that have none. Each affected
+    user gets one message, queued in the notification outbox so it shares
+    the dispatcher's rate limits with every other message.
+
+    Returns:
+    - dict: Run duration and counts, also logged.
+    """
+    started = time.perf_counter()
+    stats = {"reconciled": reconcile_untracked_payments()}
+
+    stats["expired"], user_ids = expire_overdue_payments()
+    recipients = expired_session_recipients(user_ids)
+    stats["users"] = len(user_ids)
+    stats["without_telegram"] = len(user_ids) - len(recipients)
+    messages = [
+        (chat_id, expired_session_text(username)) for chat_id, username in recipients
+    ]
+    stats["queued"] = len(outbox.enqueue_many(messages, kind="expired_session"))
+
+    stats["duration_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    logger.info("Expired payment sessions check finished: %s", stats)
+    return stats
+
+
+@shared_task(bind=True, max_retries=MAX_ATTEMPTS)
+def process_checkout_session_outbox(self, outbox_id):
+    """
+    Asynchronous task to open the Stripe Checkout session for a new payment,
+    retried with exponential backoff while Stripe is failing.
+    """
+    try:
+        return process_checkout_session(outbox_id)
+    except PaymentGatewayUnavailable as error:
+        countdown = error.retry_after or 2**self.request.retries
+        raise self.retry(exc=error, countdown=countdown)
+    except stripe.error.StripeError as error:
+        raise self.retry(exc=error, countdown=2**self.request.retries)
+
+
+@shared_task
+def sweep_checkout_session_outbox():
+    """
+    Periodic task re-queueing checkout sessions whose dispatch was lost.
+    """
+    return sweep_checkout_sessions()
+
+
+@shared_task
+def process_stripe_events():
+    """
+    Asynchronous task applying received Stripe webhook events in batches,
+    queued by the webhook endpoint and also run periodically as a fallback.
+    """
+    return process_pending_events()
+
+
+@shared_task
+def report_accrued_fines(limit=10):
+    """
+    Periodic task logging the fines accrued by overdue borrowings,
+    with the users owing the most.
+
+    Returns:
+    - dict: The report, amounts as strings.
+    """
+    report = accrued_fines(limit=limit)
+    logger.info(
+        "Accrued fines as of %s: %s across %s borrowings of %s users",
+        report["as_of"],
+        report["total"],
+        report["borrowings"],
+        report["users"],
+    )
+    report["as_of"] = report["as_of"].isoformat()
+    report["total"] = str(report["total"])
+    for user in report["per_user"]:
+        user["amount"] = str(user["amount"])
+    return report
+
+
+@shared_task
+def reconcile_stripe_payments():
+    """
+    Periodic task comparing recent Stripe Checkout sessions with local
+    payments and correcting the ones Stripe already paid or expired.
+    """
+    return reconcile_payments().report
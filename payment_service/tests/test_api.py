@@ -1,4 +1,8 @@
+from unittest import mock
+
 from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.test import TestCase
 
@@ -7,6 +11,8 @@ from rest_framework import status
 
 from book_service.models import Book
 from borrowing_service.models import Borrowing
+from config.testing import QueryBudgetMixin
+from payment_service.gateway import PaymentGatewayUnavailable
 from payment_service.models import Payment
 
 
@@ -37,6 +43,13 @@ class PaymentAPITests(TestCase):
             session_id=1,
         )
 
+        gateway = mock.patch("payment_service.views.get_gateway")
+        self.gateway = gateway.start().return_value
+        self.gateway.retrieve_checkout_session.return_value = {
+            "payment_status": "paid"
+        }
+        self.addCleanup(gateway.stop)
+
     def test_payment_list(self):
         response_get = self.client.get(reverse("payments:payment-list"))
         response_post = self.client.post(reverse("payments:payment-list"))
@@ -44,10 +57,27 @@ class PaymentAPITests(TestCase):
         self.assertEqual(response_get.status_code, status.HTTP_200_OK)
         self.assertEqual(response_post.status_code, status.HTTP_403_FORBIDDEN)
 
-        self.assertEqual(len(response_get.data), 1)
+        self.assertEqual(len(response_get.data["results"]), 1)
         self.assertEqual(
-            response_get.data[0]["borrowing"], self.payment.borrowing.id
+            response_get.data["results"][0]["borrowing"], self.payment.borrowing.id
+        )
+
+    def test_payment_copies_user_and_borrow_date(self):
+        self.assertEqual(self.payment.user, self.user)
+        self.assertEqual(self.payment.borrow_date, self.borrowing.borrow_date)
+
+        other = get_user_model().objects.create_user(
+            email="other@user.com", password="testpass"
         )
+        self.borrowing.user_id = other
+        self.borrowing.save()
+        self.payment.refresh_from_db()
+        self.assertEqual(self.payment.user, other)
+
+    def test_payment_list_does_not_join_borrowing(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse("payments:payment-list"))
+        self.assertNotIn("borrowing_service_borrowing", queries[-1]["sql"])
 
     def test_success_view(self):
         response = self.client.get(
@@ -65,6 +95,49 @@ class PaymentAPITests(TestCase):
         self.book.refresh_from_db()
         self.assertEqual(self.book.inventory, 1)
 
+    def test_success_view_is_idempotent(self):
+        url = reverse("payments:payment-success", args=[self.payment.borrowing_id])
+        self.client.get(url)
+        response = self.client.get(url)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.inventory, 1)
+
+    def test_success_view_checks_the_session_with_stripe(self):
+        self.gateway.retrieve_checkout_session.return_value = {
+            "payment_status": "unpaid"
+        }
+        url = reverse("payments:payment-success", args=[self.payment.borrowing_id])
+
+        response = self.client.get(url)
+
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.gateway.retrieve_checkout_session.assert_called_once_with("1")
+        self.payment.refresh_from_db()
+        self.assertEqual(self.payment.status, Payment.StatusChoices.PENDING)
+
+        self.gateway.retrieve_checkout_session.side_effect = (
+            PaymentGatewayUnavailable("down")
+        )
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.inventory, 2)
+
+    def test_success_view_sold_out(self):
+        Book.objects.filter(pk=self.book.pk).update(inventory=0)
+        response = self.client.get(
+            reverse(
+                "payments:payment-success",
+                args=[self.payment.borrowing_id]
+            )
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.inventory, 0)
+
     def test_success_fine_view(self):
         borrowing = Borrowing.objects.create(
             book_id=self.book,
@@ -78,7 +151,7 @@ class PaymentAPITests(TestCase):
             money_to_pay=10,
             type=Payment.TypeChoices.FINE,
             session_url="http://sessionurl.com",
-            session_id=1,
+            session_id=2,
         )
 
         response = self.client.get(
@@ -92,7 +165,7 @@ class PaymentAPITests(TestCase):
 
         payment.refresh_from_db()
         self.assertEqual(payment.status, Payment.StatusChoices.PAID)
-        self.assertEqual(payment.type, Payment.TypeChoices.PAYMENT)
+        self.assertEqual(payment.type, Payment.TypeChoices.FINE)
 
         self.book.refresh_from_db()
         self.assertEqual(self.book.inventory, 3)
@@ -112,3 +185,45 @@ class PaymentAPITests(TestCase):
 
         self.book.refresh_from_db()
         self.assertEqual(self.book.inventory, 2)
+
+
+class PaymentQueryBudgetTests(QueryBudgetMixin, TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email="test@user.com", password="testpass"
+        )
+        self.client.force_authenticate(self.user)
+        self.book = Book.objects.create(title="Test Book", inventory=2, daily_fee=1)
+
+    def add_payments(self, count):
+        for _ in range(count):
+            borrowing = Borrowing.objects.create(
+                book_id=self.book,
+                expected_return_date="2020-01-01",
+                user_id=self.user,
+            )
+            self.payment = Payment.objects.create(
+                borrowing=borrowing,
+                status=Payment.StatusChoices.PAID,
+                money_to_pay=0,
+                type=Payment.TypeChoices.PAYMENT,
+                session_url="http://testurl.com",
+                session_id=1,
+            )
+
+    def test_list(self):
+        self.assertQueryBudget(
+            1,
+            lambda: self.client.get(reverse("payments:payment-list")),
+            grow=self.add_payments,
+        )
+
+    def test_retrieve(self):
+        self.add_payments(1)
+        self.assertQueryBudget(
+            1,
+            lambda: self.client.get(
+                reverse("payments:payment-detail", args=[self.payment.id])
+            ),
+        )
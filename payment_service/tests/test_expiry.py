@@ -0,0 +1,99 @@
+import datetime
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.utils import timezone
+
+from book_service.models import Book
+from borrowing_service.models import Borrowing
+from notifications.messages import expired_session_text
+from notifications.models import Notification, NotificationOutbox
+from payment_service.expiry import EXPIRY_GRACE, reconcile_untracked_payments
+from payment_service.fake_stripe import FakeStripe
+from payment_service.models import Payment
+from payment_service.tasks import check_and_notify_expired_sessions
+
+
+@mock.patch("notifications.outbox.dispatch_notifications")
+class ExpiredSessionsTests(TestCase):
+    def setUp(self):
+        self.book = Book.objects.create(
+            title="Test Book", author="Author", inventory=5, daily_fee=1
+        )
+        self.now = timezone.now()
+
+    def create_payment(self, email, expires_at, session_id="cs_test", chat_id=None):
+        user, _ = get_user_model().objects.get_or_create(email=email)
+        if chat_id:
+            Notification.objects.get_or_create(
+                user=user, chat_id=chat_id, telegram_username=email
+            )
+        borrowing = Borrowing.objects.create(
+            book_id=self.book, expected_return_date="2020-01-01", user_id=user
+        )
+        return Payment.objects.create(
+            borrowing=borrowing,
+            status=Payment.StatusChoices.PENDING,
+            type=Payment.TypeChoices.PAYMENT,
+            money_to_pay=10,
+            session_url="http://testurl.com",
+            session_id=session_id,
+            expires_at=expires_at,
+        )
+
+    def test_expires_only_rows_past_expiry(self, dispatch):
+        past = self.now - EXPIRY_GRACE - datetime.timedelta(minutes=1)
+        expired = [
+            self.create_payment("first@user.com", past, chat_id=1),
+            self.create_payment("first@user.com", past, chat_id=1),
+            self.create_payment("second@user.com", past),
+        ]
+        in_grace = self.create_payment("third@user.com", self.now)
+        open_ = self.create_payment(
+            "third@user.com", self.now + datetime.timedelta(hours=1)
+        )
+
+        with mock.patch("stripe.checkout.Session.retrieve") as retrieve:
+            stats = check_and_notify_expired_sessions()
+        retrieve.assert_not_called()
+
+        self.assertEqual(stats["expired"], 3)
+        self.assertEqual(stats["users"], 2)
+        self.assertEqual(stats["without_telegram"], 1)
+        self.assertEqual(stats["queued"], 1)
+        self.assertQuerysetEqual(
+            NotificationOutbox.objects.filter(kind="expired_session").values_list(
+                "chat_id", "text"
+            ),
+            [(1, expired_session_text("first@user.com"))],
+        )
+
+        for payment in expired:
+            payment.refresh_from_db()
+            self.assertEqual(payment.status, Payment.StatusChoices.EXPIRED)
+        for payment in (in_grace, open_):
+            payment.refresh_from_db()
+            self.assertEqual(payment.status, Payment.StatusChoices.PENDING)
+
+    def test_untracked_payments_are_reconciled_with_stripe(self, dispatch):
+        with FakeStripe() as fake:
+            expired = fake.add_session(expires_at=int(self.now.timestamp()) - 3600)
+            paid = fake.add_session(payment_status="paid", status="complete")
+            expired_payment = self.create_payment(
+                "first@user.com", None, session_id=expired["id"]
+            )
+            paid_payment = self.create_payment(
+                "second@user.com", None, session_id=paid["id"]
+            )
+
+            self.assertEqual(reconcile_untracked_payments(), 2)
+            self.assertEqual(reconcile_untracked_payments(), 0)
+            self.assertEqual(fake.requests[("GET", "/v1/checkout/sessions/{id}")], 2)
+
+            check_and_notify_expired_sessions()
+
+        expired_payment.refresh_from_db()
+        paid_payment.refresh_from_db()
+        self.assertEqual(expired_payment.status, Payment.StatusChoices.EXPIRED)
+        self.assertEqual(paid_payment.status, Payment.StatusChoices.PAID)
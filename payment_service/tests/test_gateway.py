@@ -0,0 +1,123 @@
+import time
+
+import stripe
+from django.test import SimpleTestCase
+
+from payment_service.fake_stripe import FakeStripe
+from payment_service.gateway import (
+    CircuitBreaker,
+    PaymentGatewayUnavailable,
+    StripeGateway,
+)
+
+CREATE = ("POST", "/v1/checkout/sessions")
+
+
+class StripeGatewayTests(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.stripe = FakeStripe().start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.stripe.stop()
+        super().tearDownClass()
+
+    def setUp(self):
+        self.stripe.reset()
+        self.stripe.latency = 0
+
+    def gateway(self, **kwargs):
+        kwargs.setdefault("backoff", 0.01)
+        return StripeGateway(**kwargs).install()
+
+    def create(self, gateway, **kwargs):
+        return gateway.create_checkout_session(
+            mode="payment",
+            line_items=[
+                {
+                    "price_data": {
+                        "currency": "usd",
+                        "product_data": {"name": "Book"},
+                        "unit_amount": 100,
+                    },
+                    "quantity": 1,
+                }
+            ],
+            success_url="http://localhost/success/",
+            cancel_url="http://localhost/cancel/",
+            **kwargs,
+        )
+
+    def test_retries_reuse_the_idempotency_key(self):
+        gateway = self.gateway(max_retries=2)
+        self.stripe.fail_next(2)
+
+        session = self.create(gateway)
+
+        self.assertEqual(self.stripe.requests[CREATE], 3)
+        self.assertEqual(list(self.stripe.sessions), [session.id])
+
+    def test_connections_are_reused(self):
+        gateway = self.gateway()
+        for _ in range(5):
+            self.create(gateway)
+
+        self.assertEqual(self.stripe.connections, 1)
+
+    def test_timeout(self):
+        gateway = self.gateway(timeout=(1, 0.05), max_retries=0)
+        self.stripe.latency = 0.2
+
+        with self.assertRaises(PaymentGatewayUnavailable):
+            self.create(gateway)
+
+    def test_request_errors_are_not_retried(self):
+        gateway = self.gateway(max_retries=2)
+
+        with self.assertRaises(stripe.error.InvalidRequestError):
+            gateway.retrieve_checkout_session("cs_test_missing")
+
+        self.assertEqual(sum(self.stripe.requests.values()), 1)
+        self.assertEqual(gateway.breaker.failures, 0)
+
+    def test_circuit_breaker_fails_fast_and_recovers(self):
+        gateway = self.gateway(
+            max_retries=0,
+            breaker=CircuitBreaker(failure_threshold=2, reset_timeout=0.1),
+        )
+        self.stripe.fail_next(2)
+        for _ in range(2):
+            with self.assertRaises(PaymentGatewayUnavailable):
+                self.create(gateway)
+
+        with self.assertRaises(PaymentGatewayUnavailable) as error:
+            self.create(gateway)
+        self.assertTrue(error.exception.circuit_open)
+        self.assertEqual(self.stripe.requests[CREATE], 2)
+        self.assertEqual(gateway.breaker.state, "open")
+
+        time.sleep(0.1)
+        self.assertEqual(gateway.breaker.state, "half-open")
+        self.create(gateway)
+        self.assertEqual(gateway.breaker.state, "closed")
+
+    def test_unexpected_trial_error_does_not_stick_half_open(self):
+        gateway = self.gateway(
+            max_retries=0,
+            breaker=CircuitBreaker(failure_threshold=1, reset_timeout=0.05),
+        )
+        self.stripe.fail_next(1)
+        with self.assertRaises(PaymentGatewayUnavailable):
+            self.create(gateway)
+        time.sleep(0.05)
+
+        def broken(*args, **kwargs):
+            raise ValueError("bad params")
+
+        with self.assertRaises(ValueError):
+            gateway.call(broken)
+        self.assertEqual(gateway.breaker.state, "half-open")
+        self.create(gateway)
+        self.assertEqual(gateway.breaker.state, "closed")
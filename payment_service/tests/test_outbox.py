@@ -0,0 +1,186 @@
+import datetime
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from book_service.models import Book, InventoryReservation
+from payment_service import outbox
+from payment_service.fake_stripe import FakeStripe
+from payment_service.gateway import PaymentGatewayUnavailable, StripeGateway
+from payment_service.models import CheckoutSessionOutbox, Payment
+
+
+@mock.patch("borrowing_service.signals.send_admin_borrowing_message")
+class CheckoutSessionOutboxTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.stripe = FakeStripe().start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.stripe.stop()
+        super().tearDownClass()
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email="test@user.com", password="testpass"
+        )
+        self.client.force_authenticate(self.user)
+        self.book = Book.objects.create(
+            title="Test Book",
+            author="Test Author",
+            cover=Book.CoverChoices.HARD,
+            inventory=2,
+            daily_fee=0.5,
+        )
+        self.stripe.reset()
+        gateway = mock.patch(
+            "payment_service.gateway._gateway", StripeGateway(max_retries=0)
+        )
+        gateway.start()
+        self.addCleanup(gateway.stop)
+
+    def borrow(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            response = self.client.post(
+                reverse("borrowings:borrowing-list"),
+                {
+                    "book_id": self.book.id,
+                    "expected_return_date": timezone.now().date()
+                    + datetime.timedelta(days=3),
+                },
+            )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        return response.data["id"], callbacks
+
+    def checkout(self, borrowing_id):
+        return self.client.get(
+            reverse("borrowings:borrowing-checkout", args=[borrowing_id])
+        )
+
+    def test_create_borrowing_does_not_call_stripe(self, _):
+        with mock.patch.object(outbox, "dispatch_checkout_session") as dispatch:
+            borrowing_id, callbacks = self.borrow()
+            self.assertEqual(self.stripe.sessions, {})
+
+            payment = Payment.objects.get(borrowing_id=borrowing_id)
+            self.assertEqual(payment.session_url, "")
+            self.assertEqual(payment.money_to_pay, 2)
+            self.assertEqual(
+                payment.checkout_outbox.status,
+                CheckoutSessionOutbox.StatusChoices.PENDING,
+            )
+
+            dispatch.assert_not_called()
+            for callback in callbacks:
+                callback()
+            dispatch.assert_called_once_with(payment.checkout_outbox.id)
+
+        response = self.checkout(borrowing_id)
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+
+    @mock.patch("borrowing_service.signals.send_user_payment_message")
+    def test_worker_creates_session_once(self, send_message, _):
+        borrowing_id, _ = self.borrow()
+        payment = Payment.objects.get(borrowing_id=borrowing_id)
+
+        session_id = outbox.process_checkout_session(payment.checkout_outbox.id)
+        self.assertIsNone(outbox.process_checkout_session(payment.checkout_outbox.id))
+
+        payment.refresh_from_db()
+        self.assertEqual(payment.session_id, session_id)
+        self.assertEqual(
+            payment.expires_at.timestamp(),
+            self.stripe.sessions[session_id]["expires_at"],
+        )
+        self.assertEqual(list(self.stripe.sessions), [session_id])
+        self.assertEqual(self.stripe.sessions[session_id]["amount_total"], 200)
+        send_message.assert_called_once()
+
+        response = self.checkout(borrowing_id)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["session_url"], payment.session_url)
+
+    def test_retry_reuses_session_after_lost_response(self, _):
+        borrowing_id, _ = self.borrow()
+        entry = Payment.objects.get(borrowing_id=borrowing_id).checkout_outbox
+        first = outbox.process_checkout_session(entry.id)
+
+        # The worker died after Stripe answered: the entry is retried.
+        CheckoutSessionOutbox.objects.filter(pk=entry.id).update(
+            status=CheckoutSessionOutbox.StatusChoices.PENDING
+        )
+        self.assertEqual(outbox.process_checkout_session(entry.id), first)
+        self.assertEqual(len(self.stripe.sessions), 1)
+
+    def test_stripe_failure_returns_entry_to_pending_then_fails(self, _):
+        borrowing_id, _ = self.borrow()
+        entry = Payment.objects.get(borrowing_id=borrowing_id).checkout_outbox
+
+        self.stripe.fail_next(outbox.MAX_ATTEMPTS)
+        with self.assertRaises(PaymentGatewayUnavailable):
+            outbox.process_checkout_session(entry.id)
+        entry.refresh_from_db()
+        self.assertEqual(entry.status, CheckoutSessionOutbox.StatusChoices.PENDING)
+        self.assertEqual(entry.attempts, 1)
+        self.assertIn("Injected failure", entry.last_error)
+
+        for _ in range(outbox.MAX_ATTEMPTS - 1):
+            with self.assertRaises(PaymentGatewayUnavailable):
+                outbox.process_checkout_session(entry.id)
+        entry.refresh_from_db()
+        self.assertEqual(entry.status, CheckoutSessionOutbox.StatusChoices.FAILED)
+
+        response = self.checkout(borrowing_id)
+        self.assertEqual(response.status_code, status.HTTP_502_BAD_GATEWAY)
+
+    @override_settings(INVENTORY_RESERVATION_TTL=datetime.timedelta(minutes=30))
+    @mock.patch("payment_service.transitions.queue_expired_session_messages")
+    def test_exhausted_retries_expire_the_payment(self, notify, _):
+        borrowing_id, _ = self.borrow()
+        payment = Payment.objects.get(borrowing_id=borrowing_id)
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.inventory, 1)
+
+        self.stripe.fail_next(outbox.MAX_ATTEMPTS)
+        with self.captureOnCommitCallbacks(execute=True):
+            for _ in range(outbox.MAX_ATTEMPTS):
+                with self.assertRaises(PaymentGatewayUnavailable):
+                    outbox.process_checkout_session(payment.checkout_outbox.id)
+
+        payment.refresh_from_db()
+        self.book.refresh_from_db()
+        self.assertEqual(payment.status, Payment.StatusChoices.EXPIRED)
+        self.assertEqual(self.book.inventory, 2)
+        self.assertFalse(
+            InventoryReservation.objects.filter(borrowing_id=borrowing_id).exists()
+        )
+        notify.assert_called_once_with([self.user.id])
+        # The failed payment no longer blocks the next borrowing.
+        self.borrow()
+
+    def test_sweep_requeues_lost_entries(self, _):
+        borrowing_id, _ = self.borrow()
+        entry = Payment.objects.get(borrowing_id=borrowing_id).checkout_outbox
+        CheckoutSessionOutbox.objects.filter(pk=entry.id).update(
+            status=CheckoutSessionOutbox.StatusChoices.PROCESSING,
+            updated_at=timezone.now() - outbox.PROCESSING_TIMEOUT * 2,
+        )
+
+        with mock.patch.object(outbox, "dispatch_checkout_session") as dispatch:
+            self.assertEqual(outbox.sweep_checkout_sessions(), 0)
+            entry.refresh_from_db()
+            self.assertEqual(entry.status, CheckoutSessionOutbox.StatusChoices.PENDING)
+
+            CheckoutSessionOutbox.objects.filter(pk=entry.id).update(
+                updated_at=timezone.now() - outbox.DISPATCH_GRACE * 2
+            )
+            self.assertEqual(outbox.sweep_checkout_sessions(), 1)
+            dispatch.assert_called_once_with(entry.id)
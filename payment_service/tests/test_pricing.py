@@ -0,0 +1,144 @@
+import datetime
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from book_service.models import Book
+from borrowing_service.models import Borrowing
+from payment_service.calculation_of_the_amount_to_be_paid import (
+    calculating_sum_of_fine,
+    calculating_total_sum_for_begin_of_borrowing,
+)
+from payment_service.pricing import accrued_fines, initial_fees
+from payment_service.tasks import report_accrued_fines
+
+AS_OF = datetime.date(2024, 3, 31)
+
+
+class PricingTests(TestCase):
+    def setUp(self):
+        self.books = [
+            Book.objects.create(
+                title=f"Book {fee}", author="Author", inventory=5, daily_fee=fee
+            )
+            for fee in ("0.29", "0.05", "1.33", "2.00")
+        ]
+        self.users = [
+            get_user_model().objects.create_user(f"user{index}@test.com", "pass1234")
+            for index in range(3)
+        ]
+
+    def borrow(self, user, book, days_late, returned=None):
+        return Borrowing.objects.create(
+            book_id=book,
+            user_id=user,
+            expected_return_date=AS_OF - datetime.timedelta(days=days_late),
+            actual_return=returned,
+        )
+
+    def test_per_row_functions_use_exact_cents(self):
+        self.assertEqual(
+            calculating_total_sum_for_begin_of_borrowing(
+                0.29, datetime.date(2024, 1, 1), today=datetime.date(2024, 1, 1)
+            ),
+            29,
+        )
+        self.assertEqual(
+            calculating_sum_of_fine(
+                Decimal("1.33"), datetime.date(2024, 1, 1), datetime.date(2024, 1, 4)
+            ),
+            598,
+        )
+
+    def test_accrued_fines_match_per_row_fines(self):
+        expected = {user.id: 0 for user in self.users}
+        for index in range(40):
+            user = self.users[index % 3]
+            book = self.books[index % 4]
+            borrowing = self.borrow(user, book, days_late=index % 7)
+            if borrowing.expected_return_date < AS_OF:
+                expected[user.id] += calculating_sum_of_fine(
+                    book.daily_fee, borrowing.expected_return_date, AS_OF
+                )
+        self.borrow(self.users[0], self.books[3], 5, returned=AS_OF)
+
+        report = accrued_fines(as_of=AS_OF)
+
+        self.assertEqual(report["borrowings"], 40 - 6)
+        self.assertEqual(report["total"], Decimal(sum(expected.values())) / 100)
+        self.assertEqual(
+            {user["user_id"]: user["amount"] for user in report["per_user"]},
+            {user_id: Decimal(cents) / 100 for user_id, cents in expected.items()},
+        )
+        amounts = [user["amount"] for user in report["per_user"]]
+        self.assertEqual(amounts, sorted(amounts, reverse=True))
+
+    def test_accrued_fines_queries_do_not_grow_with_rows(self):
+        for days_late in range(1, 30):
+            self.borrow(self.users[0], self.books[days_late % 4], days_late)
+        with self.assertNumQueries(1):
+            accrued_fines(as_of=AS_OF)
+
+    def test_initial_fees_match_per_row_function(self):
+        borrowings = [
+            self.borrow(self.users[0], book, days_late=-days)
+            for days, book in enumerate(self.books)
+        ]
+        fees = initial_fees(Borrowing.objects.all(), today=AS_OF)
+        self.assertEqual(
+            fees,
+            {
+                borrowing.id: calculating_total_sum_for_begin_of_borrowing(
+                    borrowing.book_id.daily_fee,
+                    borrowing.expected_return_date,
+                    today=AS_OF,
+                )
+                for borrowing in borrowings
+            },
+        )
+
+    def test_report_task_returns_serializable_report(self):
+        self.borrow(self.users[0], self.books[3], 2)
+        report = report_accrued_fines()
+        self.assertEqual(report["total"], str(accrued_fines()["total"]))
+        self.assertEqual(report["users"], 1)
+
+
+class AccruedFinesViewTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.url = reverse("payments:payment-accrued-fines")
+        book = Book.objects.create(
+            title="Book", author="Author", inventory=5, daily_fee="1.00"
+        )
+        user = get_user_model().objects.create_user("user@test.com", "pass1234")
+        Borrowing.objects.create(
+            book_id=book,
+            user_id=user,
+            expected_return_date=AS_OF - datetime.timedelta(days=2),
+        )
+        self.admin = get_user_model().objects.create_superuser(
+            "admin@test.com", "pass1234"
+        )
+        self.user = user
+
+    def test_admin_only(self):
+        self.client.force_authenticate(self.user)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_accrued_fines_as_of(self):
+        self.client.force_authenticate(self.admin)
+        response = self.client.get(self.url, {"as_of": AS_OF.isoformat()})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["total"], Decimal("3.00"))
+        self.assertEqual(response.data["per_user"][0]["email"], "user@test.com")
+
+    def test_invalid_as_of(self):
+        self.client.force_authenticate(self.admin)
+        response = self.client.get(self.url, {"as_of": "yesterday"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
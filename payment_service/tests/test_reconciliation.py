@@ -0,0 +1,167 @@
+import datetime
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.utils import timezone
+
+from book_service.models import Book
+from borrowing_service.models import Borrowing
+from payment_service.fake_stripe import FakeStripe
+from payment_service.gateway import PaymentGatewayUnavailable, StripeGateway
+from payment_service.models import (
+    Payment,
+    ReconciliationRun,
+    StripeSessionSnapshot,
+)
+from payment_service.reconciliation import iter_sessions, reconcile_payments
+
+
+class ReconciliationTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.stripe = FakeStripe().start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.stripe.stop()
+        super().tearDownClass()
+
+    def setUp(self):
+        self.stripe.reset()
+        gateway = mock.patch(
+            "payment_service.gateway._gateway", StripeGateway(max_retries=0)
+        )
+        gateway.start()
+        self.addCleanup(gateway.stop)
+        for message in ("send_admin_borrowing_message", "send_user_payment_message"):
+            patcher = mock.patch(f"borrowing_service.signals.{message}")
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        self.user = get_user_model().objects.create_user("test@user.com", "pass1234")
+        self.book = Book.objects.create(
+            title="Test Book", author="Author", inventory=5, daily_fee=1
+        )
+        self.now = timezone.now()
+        self.created = int((self.now - datetime.timedelta(hours=3)).timestamp())
+
+    def session(self, **fields):
+        fields.setdefault("amount_total", 1000)
+        return self.stripe.add_session(created=self.created, **fields)
+
+    def payment(self, session, status=Payment.StatusChoices.PENDING, money="10"):
+        borrowing = Borrowing.objects.create(
+            book_id=self.book,
+            user_id=self.user,
+            expected_return_date=self.now.date() + datetime.timedelta(days=3),
+        )
+        return Payment.objects.create(
+            borrowing=borrowing,
+            status=status,
+            type=Payment.TypeChoices.PAYMENT,
+            money_to_pay=money,
+            session_url=session["url"],
+            session_id=session["id"],
+        )
+
+    def test_corrects_and_reports_drift(self):
+        in_sync = self.payment(self.session())
+        paid = self.payment(self.session(status="complete", payment_status="paid"))
+        expired = self.payment(self.session(status="expired"))
+        paid_locally = self.payment(self.session(), status=Payment.StatusChoices.PAID)
+        paid_late = self.payment(
+            self.session(status="complete", payment_status="paid"),
+            status=Payment.StatusChoices.EXPIRED,
+        )
+        mismatch = self.payment(self.session(amount_total=1500))
+        unknown = self.session()
+
+        run = reconcile_payments(until=self.now)
+
+        self.assertEqual(run.status, ReconciliationRun.StatusChoices.DONE)
+        self.assertEqual(run.report["sessions"], 7)
+        self.assertEqual(
+            run.report["drift"],
+            {
+                "paid_in_stripe": 1,
+                "expired_in_stripe": 1,
+                "paid_locally_only": 1,
+                "paid_after_expiry": 1,
+                "amount_mismatch": 1,
+                "unknown_session": 1,
+            },
+        )
+        self.assertEqual(
+            run.report["corrected"], {"paid": 2, "sold_out": 0, "expired": 1}
+        )
+        self.assertEqual(run.report["samples"]["unknown_session"], [unknown["id"]])
+        self.assertEqual(
+            run.report["samples"]["amount_mismatch"], [mismatch.session_id]
+        )
+
+        for payment, expected in (
+            (in_sync, Payment.StatusChoices.PENDING),
+            (paid, Payment.StatusChoices.PAID),
+            (expired, Payment.StatusChoices.EXPIRED),
+            (paid_locally, Payment.StatusChoices.PAID),
+            (paid_late, Payment.StatusChoices.PAID),
+        ):
+            payment.refresh_from_db()
+            self.assertEqual(payment.status, expected)
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.inventory, 3)
+        self.assertFalse(StripeSessionSnapshot.objects.exists())
+
+    def test_dry_run_only_reports(self):
+        paid = self.payment(self.session(status="complete", payment_status="paid"))
+
+        run = reconcile_payments(until=self.now, dry_run=True)
+
+        self.assertEqual(run.report["drift"], {"paid_in_stripe": 1})
+        self.assertEqual(run.report["corrected"], {})
+        paid.refresh_from_db()
+        self.assertEqual(paid.status, Payment.StatusChoices.PENDING)
+
+    def test_sessions_outside_the_range_are_ignored(self):
+        self.stripe.add_session(
+            created=int((self.now - datetime.timedelta(days=3)).timestamp())
+        )
+        run = reconcile_payments(until=self.now)
+        self.assertEqual(run.report["sessions"], 0)
+
+    def test_lists_by_window_and_page(self):
+        for hours in range(1, 4):
+            for _ in range(25):
+                self.stripe.add_session(
+                    created=int(
+                        (self.now - datetime.timedelta(hours=hours)).timestamp()
+                    )
+                )
+
+        sessions = list(
+            iter_sessions(
+                self.now - datetime.timedelta(hours=4),
+                self.now,
+                window=datetime.timedelta(hours=1),
+                page_size=10,
+            )
+        )
+
+        self.assertEqual(len({session.id for session in sessions}), 75)
+        self.assertEqual(len(sessions), 75)
+        # 4 windows: 3 with 25 sessions in 3 pages each, one empty page.
+        self.assertEqual(self.stripe.requests[("GET", "/v1/checkout/sessions")], 10)
+
+    def test_failed_listing_marks_the_run_failed(self):
+        self.session()
+        self.stripe.fail_next(1)
+
+        with self.assertRaises(PaymentGatewayUnavailable):
+            reconcile_payments(until=self.now)
+
+        run = ReconciliationRun.objects.get()
+        self.assertEqual(run.status, ReconciliationRun.StatusChoices.FAILED)
+        self.assertIn("error", run.report)
+        self.assertFalse(StripeSessionSnapshot.objects.exists())
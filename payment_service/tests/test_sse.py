@@ -0,0 +1,232 @@
+import asyncio
+import json
+from unittest import mock
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, TestCase
+from rest_framework_simplejwt.tokens import AccessToken
+
+from book_service.models import Book
+from borrowing_service.models import Borrowing
+from payment_service.models import Payment
+from payment_service.sse import PaymentStatusEvents, StatusHub
+from payment_service.transitions import pay_sessions
+
+
+class ASGIClient:
+    """Drives one request through an ASGI app and records what it sends."""
+
+    def __init__(self, app, path, token=None, accept=b"text/event-stream"):
+        headers = [(b"accept", accept)]
+        if token:
+            headers.append((b"authorization", f"Bearer {token}".encode()))
+        self.scope = {
+            "type": "http",
+            "method": "GET",
+            "path": path,
+            "query_string": b"",
+            "headers": headers,
+        }
+        self.app = app
+        self.messages = []
+        self.disconnect = asyncio.Event()
+
+    async def receive(self):
+        await self.disconnect.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(self, message):
+        self.messages.append(message)
+
+    def start(self):
+        return asyncio.ensure_future(self.app(self.scope, self.receive, self.send))
+
+    async def wait_for_messages(self, count):
+        for _ in range(100):
+            if len(self.messages) >= count:
+                return
+            await asyncio.sleep(0.01)
+        raise AssertionError(f"Got {len(self.messages)} messages, expected {count}")
+
+    @property
+    def status(self):
+        return self.messages[0]["status"]
+
+    @property
+    def events(self):
+        body = b"".join(m.get("body", b"") for m in self.messages[1:]).decode()
+        return [
+            json.loads(line[len("data: ") :])["status"]
+            for line in body.splitlines()
+            if line.startswith("data: ")
+        ]
+
+
+class FakePubSub:
+    def __init__(self):
+        self.messages = asyncio.Queue()
+        self.patterns = []
+        self.closed = False
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.closed = True
+
+    async def psubscribe(self, pattern):
+        self.patterns.append(pattern)
+
+    async def listen(self):
+        while True:
+            yield await self.messages.get()
+
+    def publish(self, data):
+        self.messages.put_nowait({"type": "pmessage", "data": data})
+
+
+class FakeRedis:
+    def __init__(self):
+        self._pubsub = FakePubSub()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        pass
+
+    def pubsub(self):
+        return self._pubsub
+
+
+class StatusHubTests(SimpleTestCase):
+    def setUp(self):
+        self.redis = FakeRedis()
+        patcher = mock.patch("redis.asyncio.Redis.from_url", return_value=self.redis)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.hub = StatusHub("redis://test")
+
+    async def wait_for_subscription(self):
+        for _ in range(100):
+            if self.redis._pubsub.patterns:
+                return
+            await asyncio.sleep(0.01)
+        raise AssertionError("The hub never subscribed")
+
+    async def test_malformed_messages_do_not_stop_the_listener(self):
+        async with self.hub.watch(7) as queue:
+            await self.wait_for_subscription()
+            for data in (b"not json", b"[]", b'{"id": 7}'):
+                self.redis._pubsub.publish(data)
+            self.redis._pubsub.publish(json.dumps({"id": 7, "status": "Paid"}))
+
+            with self.assertLogs("payment_service.sse", "WARNING") as logs:
+                self.assertEqual(await asyncio.wait_for(queue.get(), 1), "Paid")
+            self.assertEqual(len(logs.records), 3)
+            self.assertFalse(self.hub._listener.done())
+
+    async def test_last_watcher_leaving_drops_the_subscription(self):
+        async with self.hub.watch(7):
+            async with self.hub.watch(8):
+                await self.wait_for_subscription()
+            listener = self.hub._listener
+            self.assertFalse(listener.done())
+
+        with self.assertRaises(asyncio.CancelledError):
+            await listener
+        self.assertIsNone(self.hub._listener)
+        self.assertTrue(self.redis._pubsub.closed)
+
+
+@mock.patch("borrowing_service.signals.send_admin_borrowing_message")
+class PaymentStatusEventsTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user("test@user.com", "pass1234")
+        book = Book.objects.create(
+            title="Test Book", author="Author", inventory=5, daily_fee=1
+        )
+        borrowing = Borrowing.objects.create(
+            book_id=book, user_id=self.user, expected_return_date="2030-01-01"
+        )
+        self.payment = Payment.objects.create(
+            borrowing=borrowing,
+            status=Payment.StatusChoices.PENDING,
+            type=Payment.TypeChoices.PAYMENT,
+            money_to_pay=10,
+            session_url="",
+            session_id="cs_test",
+        )
+        self.token = str(AccessToken.for_user(self.user))
+        self.path = f"/api/payments/{self.payment.id}/events/"
+        self.hub = StatusHub()
+        self.django_app = mock.AsyncMock()
+        self.app = PaymentStatusEvents(self.django_app, hub=self.hub)
+
+    async def test_streams_status_until_paid(self, _):
+        client = ASGIClient(self.app, self.path, self.token)
+        request = client.start()
+
+        await client.wait_for_messages(2)
+        self.assertEqual(client.status, 200)
+        self.assertEqual(client.events, ["Pending"])
+
+        self.hub.dispatch(self.payment.id, "Paid")
+        await asyncio.wait_for(request, 1)
+
+        self.assertEqual(client.events, ["Pending", "Paid"])
+        self.assertFalse(client.messages[-1].get("more_body", False))
+        self.assertFalse(self.hub._watchers)
+
+    async def test_finished_payment_closes_right_away(self, _):
+        await sync_to_async(Payment.objects.filter(pk=self.payment.pk).update)(
+            status=Payment.StatusChoices.EXPIRED
+        )
+        client = ASGIClient(self.app, self.path, self.token)
+        await asyncio.wait_for(client.start(), 1)
+        self.assertEqual(client.events, ["Expired"])
+
+    async def test_client_disconnect_ends_stream(self, _):
+        client = ASGIClient(self.app, self.path, self.token)
+        request = client.start()
+        await client.wait_for_messages(2)
+        client.disconnect.set()
+        await asyncio.wait_for(request, 1)
+        self.assertFalse(self.hub._watchers)
+
+    async def test_long_poll_answers_on_change(self, _):
+        client = ASGIClient(self.app, self.path, self.token, accept=b"*/*")
+        request = client.start()
+        await asyncio.sleep(0.05)
+        self.hub.dispatch(self.payment.id, "Paid")
+        await asyncio.wait_for(request, 1)
+        self.assertEqual(client.status, 200)
+        self.assertEqual(
+            json.loads(client.messages[1]["body"]),
+            {"id": self.payment.id, "status": "Paid"},
+        )
+
+    async def test_requires_token_and_ownership(self, _):
+        client = ASGIClient(self.app, self.path)
+        await client.start()
+        self.assertEqual(client.status, 401)
+
+        other = await sync_to_async(get_user_model().objects.create_user)(
+            "other@user.com", "pass1234"
+        )
+        client = ASGIClient(self.app, self.path, str(AccessToken.for_user(other)))
+        await client.start()
+        self.assertEqual(client.status, 404)
+
+    async def test_other_paths_go_to_django(self, _):
+        client = ASGIClient(self.app, "/api/payments/")
+        await client.start()
+        self.django_app.assert_awaited_once()
+
+    @mock.patch("notifications.outbox.dispatch_notifications")
+    def test_transitions_publish_after_commit(self, dispatch, _):
+        with mock.patch("payment_service.status_events.publish_statuses") as publish:
+            with self.captureOnCommitCallbacks(execute=True):
+                pay_sessions(["cs_test"])
+        publish.assert_called_once_with([self.payment.id], "Paid")
@@ -0,0 +1,264 @@
+import io
+import json
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from book_service.models import Book
+from borrowing_service.models import Borrowing
+from notifications import routing
+from notifications.messages import ADMIN_CHAT_ID
+from notifications.models import Notification, NotificationOutbox
+from payment_service import webhooks
+from payment_service.fake_stripe import FakeStripe, build_event
+from payment_service.models import Payment, StripeEvent
+
+SECRET = "whsec_test"
+WEBHOOK_URL = reverse("payments:stripe-webhook")
+
+
+@override_settings(STRIPE_WEBHOOK_SECRET=SECRET)
+@mock.patch("payment_service.views.schedule_event_processing")
+class StripeWebhookTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        routing.clear()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email="test@user.com", password="testpass"
+        )
+        self.book = Book.objects.create(
+            title="Test Book", author="Author", inventory=2, daily_fee=1
+        )
+        self.payment = self.create_payment("cs_test_payment")
+
+    def create_payment(self, session_id, payment_type=Payment.TypeChoices.PAYMENT):
+        borrowing = Borrowing.objects.create(
+            book_id=self.book, expected_return_date="2020-01-01", user_id=self.user
+        )
+        return Payment.objects.create(
+            borrowing=borrowing,
+            status=Payment.StatusChoices.PENDING,
+            type=payment_type,
+            money_to_pay=10,
+            session_url="http://testurl.com",
+            session_id=session_id,
+        )
+
+    def send(self, event, secret=SECRET):
+        payload = json.dumps(event)
+        return self.client.post(
+            WEBHOOK_URL,
+            data=payload,
+            content_type="application/json",
+            HTTP_STRIPE_SIGNATURE=webhooks.sign_payload(payload, secret),
+        )
+
+    def completed(self, session_id, payment_status="paid"):
+        return build_event(
+            "checkout.session.completed",
+            {"id": session_id, "payment_status": payment_status},
+        )
+
+    def test_event_is_stored_once(self, schedule):
+        event = self.completed("cs_test_payment")
+
+        response = self.send(event)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse(response.data["duplicate"])
+
+        response = self.send(event)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.data["duplicate"])
+
+        self.assertEqual(StripeEvent.objects.count(), 1)
+        schedule.assert_called_once()
+
+    def test_invalid_signature_is_rejected(self, schedule):
+        response = self.send(self.completed("cs_test_payment"), secret="whsec_other")
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(StripeEvent.objects.exists())
+
+    def test_paid_transitions_apply_once(self, _):
+        fine = self.create_payment("cs_test_fine", Payment.TypeChoices.FINE)
+        self.send(self.completed("cs_test_payment"))
+        self.send(self.completed("cs_test_fine"))
+        self.send(self.completed("cs_test_unknown"))
+
+        stats = webhooks.process_pending_events()
+        self.assertEqual(stats["events"], 3)
+        self.assertEqual(stats["paid"], 2)
+
+        # A second delivery of the same payment under a new event id.
+        self.send(self.completed("cs_test_payment"))
+        webhooks.process_pending_events()
+
+        self.payment.refresh_from_db()
+        fine.refresh_from_db()
+        self.book.refresh_from_db()
+        self.assertEqual(self.payment.status, Payment.StatusChoices.PAID)
+        self.assertEqual(fine.status, Payment.StatusChoices.PAID)
+        self.assertEqual(fine.type, Payment.TypeChoices.FINE)
+        self.assertEqual(self.book.inventory, 2)
+        self.assertFalse(
+            StripeEvent.objects.exclude(
+                status=StripeEvent.StatusChoices.PROCESSED
+            ).exists()
+        )
+
+    @mock.patch("notifications.outbox.dispatch_notifications")
+    @mock.patch("notifications.messages.session.post")
+    def test_paid_batch_queues_messages_without_sending(self, post, dispatch, _):
+        Notification.objects.create(
+            user=self.user, telegram_username="reader", chat_id=7
+        )
+        self.create_payment("cs_test_fine", Payment.TypeChoices.FINE)
+        self.send(self.completed("cs_test_payment"))
+        self.send(self.completed("cs_test_fine"))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            webhooks.process_pending_events()
+
+        self.assertQuerysetEqual(
+            NotificationOutbox.objects.filter(chat_id=7, kind__endswith="_paid")
+            .order_by("kind")
+            .values_list("kind", flat=True),
+            ["fine_paid", "payment_paid"],
+        )
+        post.assert_not_called()
+        dispatch.assert_called()
+
+    @mock.patch("notifications.outbox.dispatch_notifications")
+    def test_paid_after_sell_out_is_reported_for_refund(self, dispatch, _):
+        Notification.objects.create(
+            user=self.user, telegram_username="reader", chat_id=7
+        )
+        Book.objects.filter(pk=self.book.pk).update(inventory=0)
+        self.send(self.completed("cs_test_payment"))
+
+        stats = webhooks.process_pending_events()
+
+        self.assertEqual((stats["paid"], stats["sold_out"]), (0, 1))
+        self.assertEqual(
+            set(
+                NotificationOutbox.objects.filter(kind="sold_out").values_list(
+                    "chat_id", flat=True
+                )
+            ),
+            {7, ADMIN_CHAT_ID},
+        )
+        admin_message = NotificationOutbox.objects.get(
+            kind="sold_out", chat_id=ADMIN_CHAT_ID
+        )
+        self.assertIn("cs_test_payment", admin_message.text)
+
+    def test_completion_after_local_expiry_is_paid(self, _):
+        Payment.objects.filter(pk=self.payment.pk).update(
+            status=Payment.StatusChoices.EXPIRED
+        )
+        self.send(self.completed("cs_test_payment"))
+
+        stats = webhooks.process_pending_events()
+
+        self.assertEqual(stats["paid"], 1)
+        self.payment.refresh_from_db()
+        self.book.refresh_from_db()
+        self.assertEqual(self.payment.status, Payment.StatusChoices.PAID)
+        self.assertEqual(self.book.inventory, 1)
+
+        # A late expiry event doesn't undo it.
+        self.send(build_event("checkout.session.expired", {"id": "cs_test_payment"}))
+        webhooks.process_pending_events()
+        self.payment.refresh_from_db()
+        self.assertEqual(self.payment.status, Payment.StatusChoices.PAID)
+
+    def test_unpaid_completion_and_expiry(self, _):
+        self.send(self.completed("cs_test_payment", payment_status="unpaid"))
+        webhooks.process_pending_events()
+        self.payment.refresh_from_db()
+        self.assertEqual(self.payment.status, Payment.StatusChoices.PENDING)
+
+        self.send(build_event("checkout.session.expired", {"id": "cs_test_payment"}))
+        webhooks.process_pending_events()
+        self.payment.refresh_from_db()
+        self.assertEqual(self.payment.status, Payment.StatusChoices.EXPIRED)
+
+    def test_failed_batch_is_retried_then_replayed(self, _):
+        self.send(self.completed("cs_test_payment"))
+        event = StripeEvent.objects.get()
+
+        with mock.patch.object(
+            webhooks, "process_events", side_effect=RuntimeError("boom")
+        ), self.assertLogs(webhooks.logger, "ERROR"):
+            for _ in range(webhooks.MAX_ATTEMPTS):
+                webhooks.process_pending_events()
+        event.refresh_from_db()
+        self.assertEqual(event.status, StripeEvent.StatusChoices.FAILED)
+        self.assertEqual(event.attempts, webhooks.MAX_ATTEMPTS)
+        self.assertEqual(event.last_error, "boom")
+
+        call_command("replay_stripe_events", stdout=io.StringIO())
+        event.refresh_from_db()
+        self.payment.refresh_from_db()
+        self.assertEqual(event.status, StripeEvent.StatusChoices.PROCESSED)
+        self.assertEqual(self.payment.status, Payment.StatusChoices.PAID)
+
+    def test_poison_event_does_not_hold_back_its_batch(self, _):
+        process_events = webhooks.process_events
+
+        def fail_on_poison(events):
+            if any(
+                event.payload["data"]["object"]["id"] == "cs_poison" for event in events
+            ):
+                raise RuntimeError("poison")
+            return process_events(events)
+
+        self.send(self.completed("cs_poison"))
+        self.send(self.completed("cs_test_payment"))
+
+        with mock.patch.object(
+            webhooks, "process_events", side_effect=fail_on_poison
+        ), self.assertLogs(webhooks.logger, "ERROR"):
+            stats = webhooks.process_pending_events()
+            self.assertEqual(stats["paid"], 1)
+            for _ in range(webhooks.MAX_ATTEMPTS - 1):
+                webhooks.process_pending_events()
+
+        self.payment.refresh_from_db()
+        self.assertEqual(self.payment.status, Payment.StatusChoices.PAID)
+        poison = StripeEvent.objects.get(payload__data__object__id="cs_poison")
+        self.assertEqual(poison.status, StripeEvent.StatusChoices.FAILED)
+        self.assertEqual(poison.attempts, webhooks.MAX_ATTEMPTS)
+
+    def test_replay_fetches_missed_events_from_stripe(self, _):
+        with FakeStripe() as fake:
+            session = fake.add_session(amount_total=1000)
+            Payment.objects.filter(pk=self.payment.pk).update(session_id=session["id"])
+            fake.complete(session["id"])
+
+            call_command(
+                "replay_stripe_events",
+                "--from-stripe",
+                f"--since={timezone.now().date().isoformat()}",
+                stdout=io.StringIO(),
+            )
+
+        self.payment.refresh_from_db()
+        self.assertEqual(self.payment.status, Payment.StatusChoices.PAID)
+
+    def test_success_redirect_does_not_mark_paid(self, _):
+        response = self.client.get(
+            reverse("payments:payment-success", args=[self.payment.borrowing_id])
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.payment.refresh_from_db()
+        self.assertEqual(self.payment.status, Payment.StatusChoices.PENDING)
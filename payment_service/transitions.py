@@ -0,0 +1,157 @@
+import logging
+from collections import Counter
+from dataclasses import dataclass, field
+
+from django.db import transaction
+from django.utils import timezone
+
+from book_service.inventory import checkout_copy, release_reservation, return_copy
+from notifications.messages import (
+    queue_expired_session_messages,
+    queue_paid_messages,
+    queue_sold_out_messages,
+)
+from payment_service.models import Payment
+from payment_service.status_events import status_changed
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class TransitionResult:
+    paid: list = field(default_factory=list)
+    sold_out: list = field(default_factory=list)
+    expired: list = field(default_factory=list)
+
+
+def _lock(statuses, **filters):
+    # `of=("self",)` keeps Postgres from also locking the joined book rows.
+    return list(
+        Payment.objects.select_for_update(of=("self",))
+        .select_related("borrowing__book_id", "borrowing__user_id")
+        .filter(status__in=statuses, **filters)
+    )
+
+
+def _lock_pending(**filters):
+    return _lock([Payment.StatusChoices.PENDING], **filters)
+
+
+def pay_sessions(session_ids):
+    """
+    Mark the payments of the given paid Stripe sessions as paid.
+
+    Stripe is the authority here, so expired payments are paid as well:
+    local expiry gives up on a session after `EXPIRY_GRACE`, but it can
+    still complete, e.g. a late webhook or a payment settling slowly.
+
+    Args:
+    - session_ids (iterable): Stripe Checkout session IDs.
+
+    Returns:
+    - TransitionResult
+    """
+    with transaction.atomic():
+        return _apply_paid(
+            _lock(
+                [Payment.StatusChoices.PENDING, Payment.StatusChoices.EXPIRED],
+                session_id__in=list(session_ids),
+            )
+        )
+
+
+def _apply_paid(payments):
+    """
+    Apply PENDING (or EXPIRED) -> PAID to locked, still unpaid payments.
+
+    Only rows that were unpaid under the lock are touched, so a payment
+    confirmed twice (webhook redelivery, a reloaded success page) changes
+    inventory once. An expired payment's reservation is usually gone, so
+    its copy comes from the shelf, or it is reported as sold out. Regular payments hand out the borrowed copy, paid
+    fines put the returned copy back, one UPDATE per book. Telegram
+    messages are queued in the notification outbox in the same
+    transaction; a payment whose book sold out meanwhile is reported to
+    its user and to the admins for a refund, whichever path confirmed it.
+    """
+    result = TransitionResult()
+    if not payments:
+        return result
+
+    fines = [
+        payment for payment in payments if payment.type == Payment.TypeChoices.FINE
+    ]
+    regular = [
+        payment for payment in payments if payment.type != Payment.TypeChoices.FINE
+    ]
+
+    # Amount and type stay as charged, revenue rollups are built from them.
+    Payment.objects.filter(pk__in=[payment.pk for payment in payments]).update(
+        status=Payment.StatusChoices.PAID, updated_at=timezone.now()
+    )
+
+    status_changed([payment.pk for payment in payments], Payment.StatusChoices.PAID)
+
+    for payment in regular:
+        if checkout_copy(payment.borrowing):
+            result.paid.append(payment)
+        else:
+            logger.warning("Payment %s paid, but its book is sold out", payment.pk)
+            result.sold_out.append(payment)
+
+    for book_id, count in Counter(
+        payment.borrowing.book_id_id for payment in fines
+    ).items():
+        return_copy(book_id, count)
+    result.paid.extend(fines)
+
+    queue_paid_messages(
+        [
+            payment.borrowing
+            for payment in result.paid
+            if payment.type != Payment.TypeChoices.FINE
+        ]
+    )
+    queue_paid_messages([payment.borrowing for payment in fines], fine=True)
+    queue_sold_out_messages(result.sold_out)
+    return result
+
+
+def expire_sessions(session_ids):
+    """
+    Mark the pending payments of expired Stripe sessions as expired.
+
+    Returns:
+    - TransitionResult
+    """
+    with transaction.atomic():
+        return _expire(_lock_pending(session_id__in=list(session_ids)))
+
+
+def abandon_checkout(payment_id):
+    """
+    Expire a pending payment whose Checkout session could not be created.
+
+    Without a session the payment can never be paid, nor found by the
+    expiry sweep, so it would keep blocking the user's next borrowing.
+    The copy held for the borrowing goes back on the shelf.
+
+    Returns:
+    - TransitionResult
+    """
+    with transaction.atomic():
+        result = _expire(_lock_pending(pk=payment_id))
+        for payment in result.expired:
+            release_reservation(payment.borrowing_id)
+        return result
+
+
+def _expire(payments):
+    result = TransitionResult(expired=payments)
+    Payment.objects.filter(pk__in=[payment.pk for payment in payments]).update(
+        status=Payment.StatusChoices.EXPIRED, updated_at=timezone.now()
+    )
+    status_changed([payment.pk for payment in payments], Payment.StatusChoices.EXPIRED)
+    queue_expired_session_messages(
+        [payment.borrowing.user_id_id for payment in payments]
+    )
+    return result
@@ -4,13 +4,15 @@ from payment_service.views import (
     PaymentViewSet,
     SuccessView,
     CancelView, 
-    SuccessFineView
+    SuccessFineView,
+    StripeWebhookView,
 )
 
 router = routers.DefaultRouter()
 router.register("", PaymentViewSet)
 
 urlpatterns = [
+    path("webhook/", StripeWebhookView.as_view(), name="stripe-webhook"),
     path("", include(router.urls)),
     path('<int:borrowing_id>/success/', SuccessView.as_view(), name='payment-success'),
     path('<int:borrowing_id>/success-fine/', SuccessFineView.as_view(), name='payment-success-fine'),
@@ -1,18 +1,35 @@
+import datetime
+import logging
+
+import stripe
+from django.conf import settings
+from drf_spectacular.utils import extend_schema, OpenApiParameter
 from rest_framework import mixins, viewsets, status
+from rest_framework.decorators import action
 from rest_framework.generics import get_object_or_404
+from rest_framework.permissions import AllowAny, IsAdminUser
 from rest_framework.views import APIView
 from rest_framework.response import Response
 
-from book_service.models import Book
 from borrowing_service.models import Borrowing
-from notifications.messages import successful_payment_message, successful_fine_payment_message
+from payment_service.gateway import PaymentGatewayUnavailable, get_gateway
 from payment_service.models import Payment
 from payment_service.permissions import IsAdminOrIfAuthenticatedReadOnly
+from payment_service.pricing import accrued_fines
 from payment_service.serializers import (
     PaymentSerializer,
     PaymentListSerializer,
     PaymentDetailSerializer,
 )
+from payment_service.transitions import pay_sessions
+from payment_service.webhooks import (
+    InvalidWebhook,
+    record_event,
+    schedule_event_processing,
+    verify_event,
+)
+
+logger = logging.getLogger(__name__)
 
 
 class PaymentViewSet(
@@ -24,9 +41,7 @@ class PaymentViewSet(
     API endpoint that allows listing and retrieving payments.
     """
 
-    queryset = Payment.objects.select_related("borrowing").order_by(
-        "borrowing__borrow_date"
-    )
+    queryset = Payment.objects.order_by("borrow_date", "id")
     serializer_class = PaymentSerializer
     permission_classes = [
         IsAdminOrIfAuthenticatedReadOnly,
@@ -44,12 +59,12 @@ class PaymentViewSet(
         """
         queryset = self.queryset
 
-        if self.action == "list":
-            if not self.request.user.is_staff:
-                queryset = queryset.filter(borrowing_id__user_id=self.request.user)
-
         if self.action == "retrieve":
-            queryset = queryset.order_by("borrowing__borrow_date")
+            queryset = queryset.select_related("borrowing__book_id")
+
+        if self.action == "list" and not self.request.user.is_staff:
+            # One range scan on payment_user_date_id_idx, no Borrowing join.
+            queryset = queryset.filter(user=self.request.user)
 
         return queryset
 
@@ -62,58 +77,148 @@ class PaymentViewSet(
 
         return PaymentSerializer
 
+    @extend_schema(
+        parameters=[
+            OpenApiParameter(
+                "as_of",
+                type=str,
+                description="Date fines are computed for (YYYY-MM-DD), today by default",
+            ),
+            OpenApiParameter(
+                "limit",
+                type=int,
+                description="Number of users with the highest fines to list",
+            ),
+        ]
+    )
+    @action(
+        methods=["GET"],
+        detail=False,
+        url_path="accrued-fines",
+        permission_classes=[IsAdminUser],
+    )
+    def accrued_fines(self, request):
+        """
+        Fines accrued so far by all overdue borrowings not yet returned,
+        in total and per user.
+        """
+        try:
+            as_of = request.query_params.get("as_of")
+            as_of = datetime.date.fromisoformat(as_of) if as_of else None
+            limit = int(request.query_params.get("limit", 100))
+        except ValueError:
+            return Response(
+                {"error": "as_of must be a YYYY-MM-DD date and limit an integer."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        return Response(accrued_fines(as_of=as_of, limit=max(limit, 0)))
 
-class SuccessView(APIView):
+
+def pay_confirmed_sessions(borrowing, payment_type):
     """
-    API endpoint for processing successful regular payments.
+    Pay the borrowing's pending payments whose session Stripe reports paid.
+
+    Used by the success redirects when webhooks are not configured. The
+    redirect is not signed, so all it does is make us ask Stripe.
+
+    Raises:
+    - PaymentGatewayUnavailable: If Stripe can't be asked right now.
+
+    Returns:
+    - TransitionResult
     """
+    session_ids = (
+        borrowing.payments.filter(
+            type=payment_type, status=Payment.StatusChoices.PENDING
+        )
+        .exclude(session_id="")
+        .values_list("session_id", flat=True)
+    )
+    paid = []
+    for session_id in session_ids:
+        try:
+            session = get_gateway().retrieve_checkout_session(session_id)
+        except stripe.error.StripeError as error:
+            logger.warning("Could not check session %s: %s", session_id, error)
+            continue
+        if session.get("payment_status") == "paid":
+            paid.append(session_id)
+    return pay_sessions(paid)
 
-    def get(self, request, borrowing_id):
-        borrowing = Borrowing.objects.get(id=borrowing_id)
-        payment = Payment.objects.get(borrowing=borrowing)
 
-        payment.status = Payment.StatusChoices.PAID
-        payment.money_to_pay = 0
-        payment.save()
+def payments_unavailable_response():
+    return Response(
+        {"error": "Payments are temporarily unavailable, please retry."},
+        status=status.HTTP_503_SERVICE_UNAVAILABLE,
+    )
 
-        book = Book.objects.get(borrowings=borrowing_id)
-        book.inventory -= 1
-        book.save()
 
-        successful_payment_message(borrowing)
+def webhook_pending_response(borrowing, payment_type):
+    """
+    Answer a Stripe success redirect with the payment status.
 
+    The redirect is not signed, so it never marks anything paid itself;
+    webhooks or `pay_confirmed_sessions` do.
+    """
+    paid = not borrowing.payments.filter(
+        type=payment_type, status=Payment.StatusChoices.PENDING
+    ).exists()
+    if paid:
         return Response(
-            {"message": "Payment was successfully processed"}, status=status.HTTP_200_OK
+            {"message": "Payment was successfully processed"},
+            status=status.HTTP_200_OK,
         )
+    return Response(
+        {"message": "Payment is being confirmed"}, status=status.HTTP_202_ACCEPTED
+    )
 
 
-class SuccessFineView(APIView):
+class SuccessView(APIView):
     """
-    API endpoint for processing successful fine payments.
+    API endpoint for processing successful regular payments.
+
+    When Stripe webhooks are not configured, the payment is marked paid
+    once Stripe confirms its session was paid; repeating the request has
+    no further effect.
     """
 
     def get(self, request, borrowing_id):
-        borrowing = Borrowing.objects.get(id=borrowing_id)
+        borrowing = get_object_or_404(Borrowing, id=borrowing_id)
+        if not settings.STRIPE_WEBHOOK_SECRET:
+            try:
+                result = pay_confirmed_sessions(borrowing, Payment.TypeChoices.PAYMENT)
+            except PaymentGatewayUnavailable:
+                return payments_unavailable_response()
+            if result.sold_out:
+                return Response(
+                    {
+                        "error": "Payment received, but no copies of the book are "
+                        "left. Please contact our support."
+                    },
+                    status=status.HTTP_409_CONFLICT,
+                )
 
-        payment = Payment.objects.get(
-            borrowing=borrowing, type=Payment.TypeChoices.FINE
-        )
+        return webhook_pending_response(borrowing, Payment.TypeChoices.PAYMENT)
 
-        payment.status = Payment.StatusChoices.PAID
-        payment.type = Payment.TypeChoices.PAYMENT
-        payment.money_to_pay = 0
-        payment.save()
 
-        book = Book.objects.get(borrowings=borrowing_id)
-        book.inventory += 1
-        book.save()
+class SuccessFineView(APIView):
+    """
+    API endpoint for processing successful fine payments.
 
-        successful_fine_payment_message(borrowing)
+    When Stripe webhooks are not configured, the fine is marked paid once
+    Stripe confirms its session was paid; repeating the request has no
+    further effect.
+    """
 
-        return Response(
-            {"message": "Payment for FINE was successfully processed"},
-            status=status.HTTP_200_OK,
-        )
+    def get(self, request, borrowing_id):
+        borrowing = get_object_or_404(Borrowing, id=borrowing_id)
+        if not settings.STRIPE_WEBHOOK_SECRET:
+            try:
+                pay_confirmed_sessions(borrowing, Payment.TypeChoices.FINE)
+            except PaymentGatewayUnavailable:
+                return payments_unavailable_response()
+
+        return webhook_pending_response(borrowing, Payment.TypeChoices.FINE)
 
 
 class CancelView(APIView):
@@ -125,3 +230,31 @@ class CancelView(APIView):
         return Response(
             {"message": "Payment can be paid later"}, status=status.HTTP_400_BAD_REQUEST
         )
+
+
+class StripeWebhookView(APIView):
+    """
+    API endpoint receiving signed Stripe webhook events.
+
+    Events are stored once per Stripe event id and applied in batches by
+    a worker, so Stripe gets its answer after a single insert.
+    """
+
+    authentication_classes = ()
+    permission_classes = (AllowAny,)
+
+    def post(self, request):
+        try:
+            event = verify_event(
+                request.body, request.META.get("HTTP_STRIPE_SIGNATURE")
+            )
+        except InvalidWebhook as error:
+            return Response({"error": str(error)}, status=status.HTTP_400_BAD_REQUEST)
+
+        created = record_event(event)
+        if created:
+            schedule_event_processing()
+
+        return Response(
+            {"received": True, "duplicate": not created}, status=status.HTTP_200_OK
+        )
@@ -0,0 +1,242 @@
+import json
+import logging
+import time
+
+import stripe
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from payment_service.models import StripeEvent
+from payment_service.transitions import expire_sessions, pay_sessions
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 500
+SCHEDULE_KEY = "stripe-events:scheduled"
+SCHEDULE_DELAY = 1
+MAX_ATTEMPTS = 5
+SIGNATURE_TOLERANCE = 300
+PAID_EVENTS = (
+    "checkout.session.completed",
+    "checkout.session.async_payment_succeeded",
+)
+EXPIRED_EVENTS = (
+    "checkout.session.expired",
+    "checkout.session.async_payment_failed",
+)
+
+
+class InvalidWebhook(Exception):
+    pass
+
+
+def verify_event(payload, signature):
+    """
+    Check the `Stripe-Signature` header and decode the event.
+
+    Args:
+    - payload (bytes): Raw request body, exactly as Stripe sent it.
+    - signature (str): Value of the `Stripe-Signature` header.
+
+    Returns:
+    - dict: The decoded event.
+
+    Raises:
+    - InvalidWebhook: If the signature or payload is invalid.
+    """
+    try:
+        payload = payload.decode()
+        stripe.WebhookSignature.verify_header(
+            payload,
+            signature or "",
+            settings.STRIPE_WEBHOOK_SECRET,
+            tolerance=SIGNATURE_TOLERANCE,
+        )
+        event = json.loads(payload)
+    except (stripe.error.SignatureVerificationError, ValueError) as error:
+        raise InvalidWebhook(str(error)) from error
+    if not isinstance(event, dict) or not event.get("id") or not event.get("type"):
+        raise InvalidWebhook("Not a Stripe event")
+    return event
+
+
+def sign_payload(payload, secret, timestamp=None):
+    """Build a `Stripe-Signature` header, for tests and the webhook generator."""
+    timestamp = int(timestamp or time.time())
+    signature = stripe.WebhookSignature._compute_signature(
+        f"{timestamp}.{payload}", secret
+    )
+    return f"t={timestamp},v1={signature}"
+
+
+def record_event(event):
+    """
+    Store a verified event unless it was already received.
+
+    Returns:
+    - bool: False for a redelivered event.
+    """
+    try:
+        with transaction.atomic():
+            StripeEvent.objects.create(
+                event_id=event["id"], type=event["type"], payload=event
+            )
+    except IntegrityError:
+        return False
+    return True
+
+
+def schedule_event_processing():
+    """
+    Queue a batch run, at most one per `SCHEDULE_DELAY` seconds.
+
+    Events arriving while a run is queued are picked up by that run, so a
+    burst of webhooks becomes a few batches instead of a task per event.
+    If the broker is down the events stay pending for the periodic run.
+    """
+    from payment_service.tasks import process_stripe_events
+
+    if not cache.add(SCHEDULE_KEY, True, timeout=SCHEDULE_DELAY):
+        return
+    try:
+        process_stripe_events.apply_async(countdown=SCHEDULE_DELAY)
+    except Exception:
+        cache.delete(SCHEDULE_KEY)
+        logger.warning("Could not queue Stripe event processing", exc_info=True)
+
+
+def _session_ids(events, types):
+    return {
+        event.payload["data"]["object"]["id"]
+        for event in events
+        if event.type in types
+        and (
+            event.type != "checkout.session.completed"
+            or event.payload["data"]["object"].get("payment_status") == "paid"
+        )
+    }
+
+
+def process_events(events):
+    """
+    Apply a batch of events with one payment transition per event type.
+
+    A `checkout.session.completed` event only counts as paid when its
+    `payment_status` is "paid"; delayed payment methods confirm with
+    `async_payment_succeeded` later. Other event types are acknowledged
+    and ignored.
+
+    Returns:
+    - dict: Number of payments paid, sold out and expired.
+    """
+    paid = pay_sessions(_session_ids(events, PAID_EVENTS))
+    expired = expire_sessions(_session_ids(events, EXPIRED_EVENTS))
+    return {
+        "paid": len(paid.paid),
+        "sold_out": len(paid.sold_out),
+        "expired": len(expired.expired),
+    }
+
+
+def process_pending_events(batch_size=BATCH_SIZE):
+    """
+    Drain pending events in batches.
+
+    Each batch is claimed with `SKIP LOCKED`, so parallel workers never
+    share events, and applied and marked processed in the same
+    transaction, so a crashed worker leaves its batch pending. A failing
+    batch is applied again event by event, so only the events that fail on
+    their own go back to pending, or to failed after `MAX_ATTEMPTS`;
+    failed events can be retried with `replay_stripe_events`.
+
+    Returns:
+    - dict: Totals over all batches.
+    """
+    stats = {"events": 0, "batches": 0, "paid": 0, "sold_out": 0, "expired": 0}
+    started = time.perf_counter()
+    while True:
+        events = []
+        try:
+            with transaction.atomic():
+                events = list(
+                    StripeEvent.objects.select_for_update(skip_locked=True)
+                    .filter(status=StripeEvent.StatusChoices.PENDING)
+                    .order_by("received_at", "id")
+                    .only("id", "type", "payload", "attempts")[:batch_size]
+                )
+                if not events:
+                    break
+                applied = process_events(events)
+                StripeEvent.objects.filter(
+                    pk__in=[event.pk for event in events]
+                ).update(
+                    status=StripeEvent.StatusChoices.PROCESSED,
+                    processed_at=timezone.now(),
+                )
+        except Exception:
+            logger.exception("Stripe event batch failed, retrying event by event")
+            processed, applied = _process_one_by_one(events)
+            if not processed:
+                # Nothing went through, e.g. the database is down: stop here
+                # rather than burn the attempts of every pending event.
+                break
+            events = processed
+        stats["batches"] += 1
+        stats["events"] += len(events)
+        for key, value in applied.items():
+            stats[key] += value
+    stats["duration_ms"] = round((time.perf_counter() - started) * 1000)
+    logger.info("Stripe events processed: %s", stats)
+    return stats
+
+
+def _process_one_by_one(events):
+    """
+    Apply the events of a failed batch each in its own transaction.
+
+    A poison event then only fails itself: it goes back to pending, or to
+    failed after `MAX_ATTEMPTS`, while the rest of the batch is applied.
+
+    Returns:
+    - tuple: (processed events, totals as returned by `process_events`)
+    """
+    processed = []
+    totals = {"paid": 0, "sold_out": 0, "expired": 0}
+    for event in events:
+        try:
+            with transaction.atomic():
+                locked = (
+                    StripeEvent.objects.select_for_update(skip_locked=True)
+                    .filter(pk=event.pk, status=StripeEvent.StatusChoices.PENDING)
+                    .exists()
+                )
+                if not locked:
+                    continue
+                applied = process_events([event])
+                StripeEvent.objects.filter(pk=event.pk).update(
+                    status=StripeEvent.StatusChoices.PROCESSED,
+                    processed_at=timezone.now(),
+                )
+        except Exception as error:
+            logger.exception("Stripe event %s failed", event.pk)
+            _release([event], error)
+            continue
+        processed.append(event)
+        for key, value in applied.items():
+            totals[key] += value
+    return processed, totals
+
+
+def _release(events, error):
+    retry = [event.pk for event in events if event.attempts + 1 < MAX_ATTEMPTS]
+    failed = [event.pk for event in events if event.attempts + 1 >= MAX_ATTEMPTS]
+    for ids, status in (
+        (retry, StripeEvent.StatusChoices.PENDING),
+        (failed, StripeEvent.StatusChoices.FAILED),
+    ):
+        StripeEvent.objects.filter(pk__in=ids).update(
+            status=status, attempts=F("attempts") + 1, last_error=str(error)
+        )